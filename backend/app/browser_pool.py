@@ -0,0 +1,393 @@
+"""
+Пул headless-браузеров для Selenium-скрапера: тёплые драйверы с отдельными профилями и портами,
+перезапуск после N страниц или роста памяти, блокировка тяжёлых ресурсов через DevTools
+"""
+import asyncio
+import os
+import queue
+import shutil
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+
+CHROMIUM_BINARY = os.getenv("CHROMIUM_BINARY", "/usr/bin/chromium")
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
+# Browsers kept warm at once; also the number of pages scraped in parallel
+SELENIUM_POOL_SIZE = int(os.getenv("SELENIUM_POOL_SIZE", "2"))
+# A browser is restarted after this many checkouts or once its process tree exceeds the RSS limit
+SELENIUM_MAX_PAGES_PER_DRIVER = int(os.getenv("SELENIUM_MAX_PAGES_PER_DRIVER", "50"))
+SELENIUM_MAX_RSS_MB = float(os.getenv("SELENIUM_MAX_RSS_MB", "1024"))
+# Seconds to wait for a free browser before giving up
+SELENIUM_ACQUIRE_TIMEOUT = float(os.getenv("SELENIUM_ACQUIRE_TIMEOUT", "300"))
+# Seconds a cancelled scrape gets to stop on its own before its browser is killed
+SELENIUM_CANCEL_GRACE = float(os.getenv("SELENIUM_CANCEL_GRACE", "5"))
+
+# Requests the card scraper never needs: images, media, fonts, trackers and ads
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8", "*.ts", "*.m4s", "*.mp3", "*.aac",
+]
+BLOCKED_DOMAINS = [
+    domain.strip()
+    for domain in os.getenv(
+        "SELENIUM_BLOCKED_DOMAINS",
+        "mc.yandex.ru,an.yandex.ru,yandex.ru/ads,google-analytics.com,googletagmanager.com,"
+        "doubleclick.net,top-fwz1.mail.ru,ad.mail.ru,vk.com/rtrg,ads.adfox.ru,tns-counter.ru,"
+        "mediascope.net,sentry.io",
+    ).split(",")
+    if domain.strip()
+]
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+
+class ScrapeCancelled(Exception):
+    """Raised inside a browser job once the coroutine awaiting it was cancelled."""
+
+
+def check_cancelled(cancelled: threading.Event | None):
+    """Call between blocking browser steps of a job started by DriverPool.run."""
+    if cancelled is not None and cancelled.is_set():
+        raise ScrapeCancelled()
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _process_tree_rss_mb(root_pid: int) -> float:
+    """Resident memory of a process and all its descendants, from /proc (0 where unavailable)."""
+    parents = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0.0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, fields after it are fixed
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents[int(entry)] = ppid
+
+    tree = {root_pid}
+    changed = True
+    while changed:
+        changed = False
+        for pid, ppid in parents.items():
+            if ppid in tree and pid not in tree:
+                tree.add(pid)
+                changed = True
+
+    total_kb = 0
+    for pid in tree:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+def block_heavy_resources(driver, patterns=None):
+    """Drop images, media, fonts and third-party trackers at the network layer (Chrome DevTools)."""
+    patterns = list(BLOCKED_URL_PATTERNS if patterns is None else patterns)
+    patterns += [f"*{domain}*" for domain in BLOCKED_DOMAINS]
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    # Applied to every document before its own scripts run, unlike execute_script after get()
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+        "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})",
+    })
+
+
+def create_chrome_driver(profile_dir: str, port: int, performance_log: bool = False):
+    """Headless Chromium with its own profile directory and DevTools port, heavy resources blocked.
+
+    ``performance_log`` records DevTools network events for the scraper's XHR
+    capture. Only turn it on when the log is read on every page, since Chrome
+    keeps the entries until they are fetched.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    options.binary_location = CHROMIUM_BINARY
+    for argument in (
+        "--headless=new",
+        "--no-sandbox",
+        "--disable-dev-shm-usage",
+        "--disable-gpu",
+        "--disable-software-rasterizer",
+        "--disable-extensions",
+        "--disable-crash-reporter",
+        "--disable-setuid-sandbox",
+        "--disable-blink-features=AutomationControlled",
+        "--blink-settings=imagesEnabled=false",
+        "--autoplay-policy=user-gesture-required",
+        "--window-size=1920,1080",
+        f"--user-data-dir={profile_dir}/profile",
+        f"--data-path={profile_dir}/data",
+        f"--disk-cache-dir={profile_dir}/cache",
+        f"--crash-dumps-dir={profile_dir}/crashpad",
+        f"--remote-debugging-port={port}",
+        f"user-agent={USER_AGENT}",
+    ):
+        options.add_argument(argument)
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    if performance_log:
+        # Network events of the page's own XHRs, read back by the scraper's XHR capture mode
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.media_stream": 2,
+    })
+
+    driver = webdriver.Chrome(service=Service(CHROMEDRIVER_PATH), options=options)
+    try:
+        block_heavy_resources(driver)
+    except Exception:
+        driver.quit()
+        raise
+    return driver
+
+
+class PooledDriver:
+    """A pooled browser plus its private profile directory and usage counters."""
+
+    def __init__(self, driver, profile_dir: str, port: int):
+        self.driver = driver
+        self.profile_dir = profile_dir
+        self.port = port
+        self.pages = 0
+
+    def rss_mb(self) -> float:
+        process = getattr(getattr(self.driver, "service", None), "process", None)
+        return _process_tree_rss_mb(process.pid) if process is not None else 0.0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:  # noqa: BLE001
+            print(f"[browser_pool] Error closing browser: {e}")
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class DriverPool:
+    """Thread-safe pool of at most ``size`` warm browsers.
+
+    ``with pool.driver() as driver:`` checks out an idle browser (starting
+    one if needed) and blocks while all ``size`` are busy. Every browser gets
+    its own profile directory and DevTools port, so several scrapes can run
+    side by side on one host. A browser is quit on return after
+    ``max_pages`` checkouts, when its process tree grows past
+    ``max_rss_mb``, or when the scrape using it raised.
+
+    A pool created with ``shares_with=other`` takes its ``size`` and slots
+    from ``other``: the two together run at most ``size`` browsers, and an
+    idle browser of one is quit to make room for a new one in the other.
+
+    Async code runs browser jobs through ``await pool.run(fn, ...)``: the job
+    runs on the pool's own threads (one per browser), so blocking WebDriver
+    calls never stall the event loop.
+    """
+
+    def __init__(self, size: int = SELENIUM_POOL_SIZE, max_pages: int = SELENIUM_MAX_PAGES_PER_DRIVER,
+                 max_rss_mb: float = SELENIUM_MAX_RSS_MB, factory=create_chrome_driver,
+                 acquire_timeout: float = SELENIUM_ACQUIRE_TIMEOUT, shares_with: "DriverPool | None" = None):
+        self.size = shares_with.size if shares_with is not None else max(1, size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.factory = factory
+        self.acquire_timeout = acquire_timeout
+        # Most recently returned first, so the warmest browser is reused
+        self._idle: queue.LifoQueue[PooledDriver] = queue.LifoQueue()
+        if shares_with is not None:
+            self._slots, self._group = shares_with._slots, shares_with._group
+        else:
+            self._slots, self._group = threading.BoundedSemaphore(self.size), []
+        # Pools drawing on the same slots, this one included
+        self._group.append(self)
+        self._lock = threading.Lock()
+        self._all: set[PooledDriver] = set()
+        self._executor: ThreadPoolExecutor | None = None
+        self.started = 0
+        self.recycled = 0
+        self.cancelled = 0
+
+    def _start(self) -> PooledDriver:
+        profile_dir = tempfile.mkdtemp(prefix="rutube-chrome-")
+        port = _free_port()
+        try:
+            driver = self.factory(profile_dir, port)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        pooled = PooledDriver(driver, profile_dir, port)
+        with self._lock:
+            self._all.add(pooled)
+            self.started += 1
+        return pooled
+
+    def _discard(self, pooled: PooledDriver):
+        with self._lock:
+            self._all.discard(pooled)
+            self.recycled += 1
+        pooled.quit()
+
+    def _make_room(self):
+        """Quit idle browsers of pools sharing the slots until a new one fits within ``size``."""
+        for peer in self._group:
+            while peer is not self and sum(len(p._all) for p in self._group) >= self.size:
+                try:
+                    pooled = peer._idle.get_nowait()
+                except queue.Empty:
+                    break
+                peer._discard(pooled)
+
+    def _worn_out(self, pooled: PooledDriver) -> bool:
+        if pooled.pages >= self.max_pages:
+            return True
+        return bool(self.max_rss_mb) and pooled.rss_mb() > self.max_rss_mb
+
+    @contextmanager
+    def driver(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No browser became free within {self.acquire_timeout}s")
+        try:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                self._make_room()
+                pooled = self._start()
+            try:
+                yield pooled.driver
+            except ScrapeCancelled:
+                # Stopped between steps: the browser itself is fine
+                self._idle.put(pooled)
+                raise
+            except BaseException:
+                # The page may be left in any state; start clean next time
+                self._discard(pooled)
+                raise
+            pooled.pages += 1
+            if self._worn_out(pooled):
+                self._discard(pooled)
+            else:
+                self._idle.put(pooled)
+        finally:
+            self._slots.release()
+
+    def _executor_for_jobs(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="selenium")
+            return self._executor
+
+    async def run(self, fn, *args, cancel_grace: float = SELENIUM_CANCEL_GRACE, **kwargs):
+        """Run ``fn(driver, cancelled, *args, **kwargs)`` with a pooled browser on a worker thread.
+
+        At most ``size`` jobs hold a browser at once; the rest wait for a
+        free one without blocking the event loop. If the awaiting coroutine
+        is cancelled, ``cancelled`` (a threading.Event) is set so the job
+        can stop at its next check_cancelled(); a job still running after
+        ``cancel_grace`` seconds has its browser quit under it.
+        """
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+        checked_out = []
+
+        def job():
+            check_cancelled(cancelled)
+            with self.driver() as driver:
+                checked_out.append(driver)
+                check_cancelled(cancelled)
+                return fn(driver, cancelled, *args, **kwargs)
+
+        future = loop.run_in_executor(self._executor_for_jobs(), job)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancelled.set()
+            with self._lock:
+                self.cancelled += 1
+            # Nobody awaits the job's outcome any more
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            done, _ = await asyncio.wait([future], timeout=cancel_grace)
+            if not done and checked_out:
+                print("[browser_pool] Cancelled scrape did not stop in time, closing its browser")
+                try:
+                    # Fails the blocked WebDriver call; the pool then discards the browser
+                    await asyncio.to_thread(checked_out[0].quit)
+                except Exception as e:  # noqa: BLE001
+                    print(f"[browser_pool] Error closing browser: {e}")
+            raise
+
+    def close(self):
+        """Quit every browser, idle or not."""
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        with self._lock:
+            browsers, self._all = list(self._all), set()
+        for pooled in browsers:
+            pooled.quit()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": len(self._all),
+                "idle": self._idle.qsize(),
+                "started": self.started,
+                "recycled": self.recycled,
+                "cancelled": self.cancelled,
+            }
+
+
+# Keyed by ``performance_log``: browsers with and without DevTools network logging
+_shared_pools: dict[bool, DriverPool] = {}
+
+
+def get_driver_pool(performance_log: bool = False) -> DriverPool:
+    """Return the process-wide browser pool (created lazily).
+
+    Browsers for XHR capture (``performance_log=True``) get a pool of their
+    own, so DOM scraping never runs on a browser that keeps a network log.
+    Both pools share one set of SELENIUM_POOL_SIZE slots, so together they
+    never run more browsers than that.
+    """
+    pool = _shared_pools.get(performance_log)
+    if pool is None:
+        factory = partial(create_chrome_driver, performance_log=True) if performance_log else create_chrome_driver
+        shares_with = next(iter(_shared_pools.values()), None)
+        pool = _shared_pools[performance_log] = DriverPool(factory=factory, shares_with=shares_with)
+    return pool
+
+
+def close_driver_pool():
+    while _shared_pools:
+        _, pool = _shared_pools.popitem()
+        pool.close()
@@ -0,0 +1,61 @@
+"""
+Контрольные точки импорта: возобновление с последней записанной страницы
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+
+from app.ingest import _insert
+from app.models import ImportCheckpoint
+from app.sync_state import as_utc
+
+
+async def get_checkpoint(db, resource_type: str, rutube_id: str, page_size: int) -> ImportCheckpoint | None:
+    """Checkpoint of an unfinished import, or None if there is nothing to resume.
+
+    A checkpoint written with another page size is ignored: its page cursor
+    would point at different items.
+    """
+    result = await db.execute(
+        select(ImportCheckpoint).where(
+            ImportCheckpoint.resource_type == resource_type,
+            ImportCheckpoint.rutube_id == rutube_id,
+        )
+    )
+    checkpoint = result.scalar_one_or_none()
+    if checkpoint is None or checkpoint.page_size != page_size:
+        return None
+    return checkpoint
+
+
+async def save_checkpoint(db, resource_type: str, rutube_id: str, *, next_page: int, page_size: int,
+                          committed_items: int, newest_item_at: datetime | None = None,
+                          full_resync: bool = False):
+    """Record progress in the current transaction, so it commits together with the batch. Does not commit.
+
+    A single INSERT ... ON CONFLICT DO UPDATE, so two writers of the same
+    resource never fail on the unique key.
+    """
+    values = {
+        'next_page': next_page,
+        'page_size': page_size,
+        'committed_items': committed_items,
+        'newest_item_at': as_utc(newest_item_at),
+        'full_resync': full_resync,
+    }
+    stmt = _insert(db, ImportCheckpoint).values(resource_type=resource_type, rutube_id=rutube_id, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['resource_type', 'rutube_id'],
+        set_={**values, 'updated_at': func.now()},
+    )
+    await db.execute(stmt)
+
+
+async def clear_checkpoint(db, resource_type: str, rutube_id: str):
+    """Drop the checkpoint once the import has finished. Does not commit."""
+    await db.execute(
+        delete(ImportCheckpoint).where(
+            ImportCheckpoint.resource_type == resource_type,
+            ImportCheckpoint.rutube_id == rutube_id,
+        )
+    )
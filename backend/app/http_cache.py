@@ -0,0 +1,197 @@
+"""
+Дисковый кэш ответов Rutube API с условной перепроверкой (ETag / Last-Modified)
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from urllib.parse import urlencode
+
+
+HTTP_CACHE_ENABLED = os.getenv("RUTUBE_HTTP_CACHE", "0") not in ("0", "false", "False", "")
+HTTP_CACHE_DIR = os.getenv("RUTUBE_HTTP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "vuetube-rutube-cache"))
+# Seconds a response is served without asking upstream (unless Cache-Control says otherwise)
+HTTP_CACHE_TTL = int(os.getenv("RUTUBE_HTTP_CACHE_TTL", "600"))
+# Total size of the cache directory; the least recently written entries are removed beyond it
+HTTP_CACHE_MAX_BYTES = int(os.getenv("RUTUBE_HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Entries not written or revalidated for this many seconds are removed, even with validators
+HTTP_CACHE_MAX_AGE = int(os.getenv("RUTUBE_HTTP_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+# The directory is swept on the first store and then after every this many stores
+HTTP_CACHE_PRUNE_EVERY = int(os.getenv("RUTUBE_HTTP_CACHE_PRUNE_EVERY", "200"))
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def cache_key(url: str, params: dict | None = None) -> str:
+    """Cache key for a GET request: the absolute URL plus sorted query params."""
+    if not params:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}{urlencode(sorted(params.items()))}"
+
+
+def _ttl_from_headers(headers, default: int) -> int | None:
+    """Freshness lifetime in seconds; None means the response must not be stored."""
+    cache_control = (headers.get('Cache-Control') or '').lower()
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    return int(match.group(1)) if match else default
+
+
+class HTTPResponseCache:
+    """Stores 200 responses as gzip files, one per URL.
+
+    A fresh entry is served without any request. A stale entry that came
+    with an ETag or Last-Modified is revalidated with If-None-Match /
+    If-Modified-Since, so an unchanged resource costs a 304 with no body.
+    Stale entries without validators are dropped.
+
+    The directory is bounded: store() periodically removes entries older
+    than ``max_age`` and then the least recently written ones until the
+    total size fits in ``max_bytes``.
+    """
+
+    def __init__(self, directory: str = HTTP_CACHE_DIR, ttl: int = HTTP_CACHE_TTL,
+                 max_bytes: int = HTTP_CACHE_MAX_BYTES, max_age: int = HTTP_CACHE_MAX_AGE,
+                 prune_every: int = HTTP_CACHE_PRUNE_EVERY):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.prune_every = max(1, prune_every)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json.gz")
+
+    def _read(self, path: str) -> dict | None:
+        # File layout: one line of JSON metadata, then the raw response body
+        try:
+            with gzip.open(path, 'rb') as f:
+                entry = json.loads(f.readline())
+                entry['body'] = f.read()
+            return entry
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def _write(self, path: str, entry: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {k: v for k, v in entry.items() if k != 'body'}
+        # Write-then-rename so concurrent readers never see a partial file
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with gzip.open(tmp, 'wb', compresslevel=6) as f:
+            f.write(json.dumps(meta).encode() + b"\n")
+            f.write(entry['body'])
+        os.replace(tmp, path)
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _prune(self) -> int:
+        """Remove expired and then the oldest entries until the directory fits the limits."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    async def lookup(self, key: str) -> dict | None:
+        """Cached entry for ``key`` (fresh or revalidatable), or None on a miss."""
+        path = self._path(key)
+        entry = await asyncio.to_thread(self._read, path)
+        if entry is None or entry.get('key') != key:
+            self.misses += 1
+            return None
+        if self.is_fresh(entry):
+            self.hits += 1
+            return entry
+        if not (entry.get('etag') or entry.get('last_modified')):
+            await asyncio.to_thread(self._remove, path)
+            self.misses += 1
+            return None
+        return entry
+
+    @staticmethod
+    def is_fresh(entry: dict) -> bool:
+        return entry.get('expires_at', 0) > time.time()
+
+    @staticmethod
+    def conditional_headers(entry: dict | None) -> dict:
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    async def store(self, key: str, body: bytes, headers, stale: dict | None = None) -> None:
+        """Save a 200 response. Pass the ``stale`` entry that failed revalidation so it counts as a miss."""
+        if stale is not None:
+            self.misses += 1
+        ttl = _ttl_from_headers(headers, self.ttl)
+        if ttl is None:
+            return
+        entry = {
+            'key': key,
+            'body': body,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'expires_at': time.time() + ttl,
+        }
+        await asyncio.to_thread(self._write, self._path(key), entry)
+        self.stores += 1
+        if (self.stores - 1) % self.prune_every == 0:
+            self.evictions += await asyncio.to_thread(self._prune)
+
+    async def revalidated(self, key: str, entry: dict, headers) -> dict:
+        """Upstream answered 304: extend the entry's lifetime and keep its body."""
+        self.revalidations += 1
+        ttl = _ttl_from_headers(headers, self.ttl)
+        entry = {
+            **entry,
+            'etag': headers.get('ETag') or entry.get('etag'),
+            'last_modified': headers.get('Last-Modified') or entry.get('last_modified'),
+            'expires_at': time.time() + (ttl or 0),
+        }
+        await asyncio.to_thread(self._write, self._path(key), entry)
+        return entry
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
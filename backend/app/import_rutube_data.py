@@ -1,24 +1,56 @@
 """
-Скрипт для импорта данных из rutube_videos.db в основную таблицу movies
+Потоковый импорт rutube_videos.db в таблицу movies: чтение SQLite порциями,
+загрузка порции во временную таблицу (COPY в PostgreSQL) и одна вставка новых строк
 """
 import asyncio
 import sqlite3
 import os
-from typing import List, Dict
+import time
+from typing import AsyncIterator, Dict, List
 from datetime import datetime
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, Text, exists, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
-from .database import AsyncSessionLocal
+from .database import engine as default_engine
+from .ingest import upsert_channels
 from .models import Movie
-from .schemas import MovieCreate
-
-
-def get_rutube_videos_data(db_path: str = "backend/data/rutube_videos.db") -> List[Dict]:
-    """
-    Извлечение данных из rutube_videos.db
-    """
-    # Проверяем стандартный путь, а также путь в контейнере
+from .normalize import normalize_durations, normalize_views, normalize_years, parse_year
+
+
+# Rows read from SQLite, staged and merged per transaction
+IMPORT_CHUNK_SIZE = int(os.getenv("RUTUBE_IMPORT_CHUNK_SIZE", "5000"))
+# Legacy dumps come from the channel scraper and carry no channel of their own
+LEGACY_CHANNEL_ID = os.getenv("RUTUBE_LEGACY_CHANNEL_ID", os.getenv("RUTUBE_CHANNEL_ID", "32869212"))
+
+STAGE_COLUMNS = (
+    'title', 'year', 'image_url', 'thumbnail_url', 'views', 'added_at', 'source_url', 'duration',
+    'description', 'genre', 'rating', 'is_active', 'channel_id', 'rutube_video_id',
+)
+
+# Per-connection temporary table each chunk is staged into before the merge
+stage_table = Table(
+    "tmp_rutube_import", MetaData(),
+    Column("title", String),
+    Column("year", Integer),
+    Column("image_url", String),
+    Column("thumbnail_url", String),
+    Column("views", Integer),
+    Column("added_at", DateTime),
+    Column("source_url", String),
+    Column("duration", String),
+    Column("description", Text),
+    Column("genre", String),
+    Column("rating", Float),
+    Column("is_active", Boolean),
+    Column("channel_id", Integer),
+    Column("rutube_video_id", String),
+    prefixes=["TEMPORARY"],
+)
+
+
+def find_rutube_videos_db(db_path: str = "backend/data/rutube_videos.db") -> str | None:
+    """Путь к rutube_videos.db: переданный или одно из стандартных мест (локально и в контейнере)."""
     possible_paths = [
         db_path,  # стандартный путь
         "data/rutube_videos.db",  # путь в контейнере относительно /app
@@ -26,189 +58,183 @@ def get_rutube_videos_data(db_path: str = "backend/data/rutube_videos.db") -> Li
         "../data/rutube_videos.db",  # путь из подкаталога app
         "../../data/rutube_videos.db"  # путь из подкаталога app
     ]
-
-    actual_path = None
     for path in possible_paths:
         if os.path.exists(path):
-            actual_path = path
-            break
-
-    if actual_path is None:
-        print(f"База данных {db_path} не найдена. Проверенные пути: {possible_paths}")
-        return []
-
-    print(f"Найдена база данных: {actual_path}")
-
-    conn = sqlite3.connect(actual_path)
-    cursor = conn.cursor()
-    
-    # Получаем все видео из базы
-    cursor.execute("""
-        SELECT 
-            id,
-            title,
-            url,
-            thumbnail_url,
-            duration,
-            views,
-            publication_date_text,
-            source_name,
-            scraped_at
-        FROM videos
-        WHERE source_name IS NOT NULL
-    """)
-    
-    rows = cursor.fetchall()
-    
-    # Преобразуем в список словарей
-    videos = []
-    for row in rows:
-        video = {
-            'external_id': row[0],
-            'title': row[1],
-            'source_url': row[2],
-            'thumbnail_url': row[3],
-            'duration': row[4],
-            'views': row[5],
-            'publication_date_text': row[6],
-            'source_name': row[7],
-            'scraped_at': row[8]
-        }
-        
-        # Пытаемся извлечь год из publication_date_text или scraped_at
-        year = extract_year(video['publication_date_text'] or video['scraped_at'])
-        
-        # Преобразуем строку просмотров в число
-        views_count = parse_views(video['views'])
-        
-        videos.append({
-            'title': video['title'],
-            'year': year,
-            'image_url': video['thumbnail_url'],  # используем thumbnail как основное изображение
-            'thumbnail_url': video['thumbnail_url'],
-            'views': views_count,
-            'added_at': datetime.now(),
-            'source_url': video['source_url'],
-            'duration': video['duration'],
-            'description': f"Видео с {video['source_name']}",
+            return path
+    print(f"База данных {db_path} не найдена. Проверенные пути: {possible_paths}")
+    return None
+
+
+def _rutube_video_id(url: str) -> str | None:
+    if '/video/' not in (url or ''):
+        return None
+    return url.rstrip('/').split('/')[-1] or None
+
+
+def _movie_rows(rows: List[tuple], channel_id: int, added_at: datetime) -> List[Dict]:
+    """Строки movies для порции записей videos из rutube_videos.db; поля нормализуются по колонкам."""
+    _, titles, urls, thumbnails, durations, views, publication_dates, source_names, scraped_ats = zip(*rows)
+    # Год из publication_date_text, иначе из scraped_at
+    fallback_years = normalize_years(scraped_ats)
+    years = [parse_year(text, fallback) for text, fallback in zip(publication_dates, fallback_years)]
+    views = normalize_views(views)
+    durations = normalize_durations(durations)
+    return [
+        {
+            'title': titles[i],
+            'year': years[i],
+            'image_url': thumbnails[i],  # используем thumbnail как основное изображение
+            'thumbnail_url': thumbnails[i],
+            'views': views[i],
+            'added_at': added_at,
+            'source_url': urls[i],
+            'duration': durations[i],
+            'description': f"Видео с {source_names[i]}",
             'genre': "Видео",  # по умолчанию
             'rating': None,  # пока нет рейтинга
-            'is_active': True
-        })
-    
-    conn.close()
-    return videos
-
-
-def extract_year(date_str: str) -> int:
-    """
-    Извлечение года из строки даты
-    """
-    if not date_str:
-        return datetime.now().year
-    
-    # Пробуем разные форматы дат
-    possible_formats = [
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d",
-        "%d.%m.%Y",
-        "%Y"
+            'is_active': True,
+            'channel_id': channel_id,
+            'rutube_video_id': _rutube_video_id(urls[i]),
+        }
+        for i in range(len(rows))
     ]
-    
-    for fmt in possible_formats:
-        try:
-            dt = datetime.strptime(date_str, fmt)
-            return dt.year
-        except ValueError:
-            continue
-    
-    # Если не удалось распознать, возвращаем текущий год
-    return datetime.now().year
 
 
-def parse_views(views_str: str) -> int:
-    """
-    Преобразование строки просмотров в число
+async def iter_rutube_video_chunks(db_path: str, channel_id: int,
+                                   chunk_size: int = IMPORT_CHUNK_SIZE) -> AsyncIterator[List[Dict]]:
+    """Строки movies из rutube_videos.db порциями по ``chunk_size``; в памяти только одна порция.
+
+    Чтение SQLite идёт в отдельном потоке, чтобы не блокировать цикл событий.
     """
-    if not views_str:
-        return 0
-    
-    # Убираем лишние символы и пробуем преобразовать
-    views_str = str(views_str).replace(' ', '').replace(',', '').lower()
-    
-    # Обрабатываем сокращенные обозначения
-    if 'тыс' in views_str or 'k' in views_str:
-        # Убираем 'тыс' или 'k' и умножаем на 100
-        num_str = ''.join(filter(lambda x: x.isdigit() or x == '.', views_str))
-        try:
-            num = float(num_str)
-            return int(num * 100)
-        except ValueError:
-            return 0
-    elif 'млн' in views_str or 'm' in views_str:
-        # Убираем 'млн' или 'm' и умножаем на 1000000
-        num_str = ''.join(filter(lambda x: x.isdigit() or x == '.', views_str))
-        try:
-            num = float(num_str)
-            return int(num * 100000)
-        except ValueError:
-            return 0
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        cursor = conn.cursor()
+        await asyncio.to_thread(cursor.execute, """
+            SELECT 
+                id,
+                title,
+                url,
+                thumbnail_url,
+                duration,
+                views,
+                publication_date_text,
+                source_name,
+                scraped_at
+            FROM videos
+            WHERE source_name IS NOT NULL
+        """)
+        added_at = datetime.now()
+        while True:
+            rows = await asyncio.to_thread(cursor.fetchmany, chunk_size)
+            if not rows:
+                break
+            yield _movie_rows(rows, channel_id, added_at)
+    finally:
+        conn.close()
+
+
+async def _stage(conn, rows: List[Dict]):
+    """Загрузка порции во временную таблицу: COPY для PostgreSQL, пакетный INSERT для остальных."""
+    if conn.dialect.name == 'postgresql':
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            stage_table.name,
+            records=[tuple(row[column] for column in STAGE_COLUMNS) for row in rows],
+            columns=STAGE_COLUMNS,
+        )
     else:
-        # Просто число
-        num_str = ''.join(filter(str.isdigit, views_str))
-        try:
-            return int(num_str)
-        except ValueError:
-            return 0
+        await conn.execute(stage_table.insert(), rows)
+
 
+def _merge_statement():
+    """INSERT ... SELECT из временной таблицы строк, которых ещё нет в movies (по URL и по Rutube ID)."""
+    movies = Movie.__table__
+    staged = select(*(stage_table.c[column] for column in STAGE_COLUMNS)).where(
+        ~exists().where(movies.c.source_url == stage_table.c.source_url),
+        ~exists().where(movies.c.rutube_video_id == stage_table.c.rutube_video_id),
+    )
+    return movies.insert().from_select(list(STAGE_COLUMNS), staged)
 
-async def import_rutube_data_to_movies():
+
+def _dedupe_chunk(rows: List[Dict]) -> List[Dict]:
+    """Первая строка на каждый URL и Rutube ID: повтор внутри порции не должен пройти слияние дважды."""
+    seen_urls, seen_ids, unique = set(), set(), []
+    for row in rows:
+        if not row['source_url'] or row['source_url'] in seen_urls or row['rutube_video_id'] in seen_ids:
+            continue
+        seen_urls.add(row['source_url'])
+        if row['rutube_video_id']:
+            seen_ids.add(row['rutube_video_id'])
+        unique.append(row)
+    return unique
+
+
+async def import_rutube_data_to_movies(db_path: str | None = None, chunk_size: int = IMPORT_CHUNK_SIZE,
+                                       engine: AsyncEngine | None = None) -> Dict:
     """
     Импорт данных из rutube_videos.db в таблицу movies
+
+    Файл читается порциями, каждая порция загружается во временную таблицу
+    и сливается в movies одним INSERT ... SELECT ... WHERE NOT EXISTS в своей
+    транзакции; память не зависит от размера дампа. Повторный запуск
+    добавляет только новые видео. Возвращает счётчики read/inserted/skipped.
     """
-    # Получаем данные из rutube_videos.db
-    # Используем правильный путь к файлу в контейнере
-    import os
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(current_dir, "..", "..", "data", "rutube_videos.db")
-    rutube_videos = get_rutube_videos_data(db_path)
-    
-    if not rutube_videos:
+    engine = engine or default_engine
+    if db_path is None:
+        # Используем правильный путь к файлу в контейнере
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        db_path = os.path.join(current_dir, "..", "..", "data", "rutube_videos.db")
+    actual_path = find_rutube_videos_db(db_path)
+    counts = {'read': 0, 'inserted': 0, 'skipped': 0}
+    if actual_path is None:
         print("Нет данных для импорта из rutube_videos.db")
-        return
-    
-    print(f"Найдено {len(rutube_videos)} видео для импорта")
-    
-    async with AsyncSessionLocal() as db:
-        # Проверяем, есть ли уже фильмы с такими source_url
-        existing_source_urls = []
-        for video in rutube_videos:
-            from sqlalchemy import text
-            existing_movie = await db.execute(
-                text("SELECT id FROM movies WHERE source_url = :source_url"),
-                {"source_url": video['source_url']}
-            )
-            result = existing_movie.fetchone()
-            if result:
-                existing_source_urls.append(video['source_url'])
-        
-        # Фильтруем видео, которые уже существуют
-        new_videos = [v for v in rutube_videos if v['source_url'] not in existing_source_urls]
-        
-        print(f"Новых видео для импорта: {len(new_videos)}")
-        
-        if not new_videos:
-            print("Все видео из rutube_videos.db уже существуют в базе")
-            return
-        
-        # Добавляем новые видео в таблицу movies
-        for video in new_videos:
-            movie = Movie(**video)
-            db.add(movie)
-        
+        return counts
+    print(f"Найдена база данных: {actual_path}")
+
+    # Видео старых дампов привязываются к каналу скрапера
+    async with AsyncSession(engine) as db:
+        channel_ids = await upsert_channels(db, [{
+            'rutube_id': LEGACY_CHANNEL_ID,
+            'title': f"Channel {LEGACY_CHANNEL_ID}",
+            'is_active': True,
+        }])
         await db.commit()
-        print(f"Импортировано {len(new_videos)} новых видео из rutube_videos.db")
+    channel_id = channel_ids[LEGACY_CHANNEL_ID]
+
+    started = time.perf_counter()
+    merge = _merge_statement()
+    async with engine.connect() as conn:
+        await conn.run_sync(stage_table.drop, checkfirst=True)
+        await conn.run_sync(stage_table.create)
+        await conn.commit()
+        try:
+            async for chunk in iter_rutube_video_chunks(actual_path, channel_id, chunk_size):
+                rows = _dedupe_chunk(chunk)
+                if rows:
+                    await _stage(conn, rows)
+                    inserted = (await conn.execute(merge)).rowcount
+                    await conn.execute(stage_table.delete())
+                    await conn.commit()
+                else:
+                    inserted = 0
+                counts['read'] += len(chunk)
+                counts['inserted'] += inserted
+                counts['skipped'] += len(chunk) - inserted
+                elapsed = time.perf_counter() - started
+                print(f"Прочитано {counts['read']}, новых {counts['inserted']}, "
+                      f"{counts['read'] / elapsed:.0f} строк/с")
+        finally:
+            await conn.rollback()
+            await conn.run_sync(stage_table.drop, checkfirst=True)
+            await conn.commit()
+
+    elapsed = time.perf_counter() - started
+    counts['seconds'] = round(elapsed, 3)
+    counts['rows_per_sec'] = round(counts['read'] / elapsed, 1) if elapsed else None
+    print(f"Импортировано {counts['inserted']} новых видео из rutube_videos.db "
+          f"({counts['skipped']} уже были в базе), {counts['rows_per_sec']} строк/с")
+    return counts
 
 
 if __name__ == "__main__":
-    asyncio.run(import_rutube_data_to_movies())
\ No newline at end of file
+    asyncio.run(import_rutube_data_to_movies())
@@ -0,0 +1,223 @@
+"""
+Пакетная запись импортированных данных: INSERT ... ON CONFLICT вместо поштучных SELECT
+"""
+import os
+
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models import Channel, Movie, Playlist, PlaylistMovie
+from app.resolution_cache import ResolutionCache, resolution_cache
+
+
+# Rows per statement; keeps bind parameters well below driver limits
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# Columns refreshed when an already known video is imported again
+MOVIE_UPDATE_COLUMNS = (
+    'title', 'thumbnail_url', 'views', 'description', 'duration', 'genre',
+    'source_url', 'channel_id', 'channel_added_at',
+)
+
+
+def _insert(db, model):
+    """Dialect-specific INSERT that supports ON CONFLICT (PostgreSQL and SQLite)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model.__table__)
+    if dialect == 'sqlite':
+        return sqlite.insert(model.__table__)
+    raise NotImplementedError(f"Bulk upsert is not supported for dialect {dialect!r}")
+
+
+def _batches(rows: list, size: int = INGEST_BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _dedupe(rows: list[dict], key: str) -> list[dict]:
+    """Keep the last row per key: one statement may not touch the same row twice."""
+    return list({row[key]: row for row in rows}.values())
+
+
+async def upsert_channels(db, rows: list[dict], update_columns: tuple = (),
+                          cache: ResolutionCache | None = None) -> dict[str, int]:
+    """Insert missing channels by rutube_id and return {rutube_id: id} for all of them.
+
+    Existing channels keep their data unless ``update_columns`` names the
+    fields to overwrite. Without ``update_columns``, channels already in the
+    resolution cache cost no statement at all.
+    """
+    cache = resolution_cache if cache is None else cache
+    ids = {}
+    pending = []
+    for row in _dedupe(rows, 'rutube_id'):
+        pk = None if update_columns else cache.channels.get(row['rutube_id'])
+        if pk is None:
+            pending.append(row)
+        else:
+            ids[row['rutube_id']] = pk
+
+    for batch in _batches(pending):
+        stmt = _insert(db, Channel)
+        set_ = {col: stmt.excluded[col] for col in update_columns}
+        # No-op update so RETURNING also yields rows that already existed
+        set_ = set_ or {'rutube_id': stmt.excluded.rutube_id}
+        stmt = stmt.values(batch).on_conflict_do_update(index_elements=['rutube_id'], set_=set_)
+        result = await db.execute(stmt.returning(Channel.__table__.c.id, Channel.__table__.c.rutube_id))
+        for pk, rutube_id in result.all():
+            ids[rutube_id] = pk
+            cache.channels.put(rutube_id, pk)
+    return ids
+
+
+async def ensure_playlist(db, row: dict, cache: ResolutionCache | None = None) -> Playlist:
+    """Create the playlist if it does not exist yet and return it."""
+    cache = resolution_cache if cache is None else cache
+    pk = cache.playlists.get(row['rutube_id'])
+    if pk is not None:
+        playlist = await db.get(Playlist, pk)
+        if playlist is not None:
+            return playlist
+
+    stmt = _insert(db, Playlist).values(row).on_conflict_do_nothing(index_elements=['rutube_id'])
+    await db.execute(stmt)
+    result = await db.execute(select(Playlist).where(Playlist.rutube_id == row['rutube_id']))
+    playlist = result.scalar_one()
+    cache.playlists.put(playlist.rutube_id, playlist.id)
+    return playlist
+
+
+async def _existing_videos(db, batch: list[dict], cache: ResolutionCache) -> set[str]:
+    """rutube_video_ids of ``batch`` rows that are already stored.
+
+    One indexed query per batch. It looks up by rutube_video_id only the IDs
+    the resolution cache can neither confirm nor rule out. It always looks
+    up source_url, because the cache is process-wide and may miss rows
+    written elsewhere. Legacy rows stored without a rutube_video_id are
+    matched by URL and get the ID backfilled, so the following ON CONFLICT
+    sees them instead of inserting a duplicate.
+    """
+    existing = set()
+    keys = set()
+    by_url = {}
+    for row in batch:
+        key = row['rutube_video_id']
+        if cache.videos.get(key) is not None:
+            existing.add(key)
+            continue
+        if not cache.definitely_new(key):
+            keys.add(key)
+        if row.get('source_url'):
+            by_url[row['source_url']] = key
+    if not keys and not by_url:
+        return existing
+
+    table = Movie.__table__
+    conditions = []
+    if keys:
+        conditions.append(table.c.rutube_video_id.in_(keys))
+    if by_url:
+        conditions.append(and_(table.c.rutube_video_id.is_(None), table.c.source_url.in_(list(by_url))))
+    result = await db.execute(select(table.c.id, table.c.rutube_video_id, table.c.source_url).where(or_(*conditions)))
+
+    backfill = []
+    for pk, rutube_video_id, source_url in result.all():
+        if rutube_video_id is not None:
+            existing.add(rutube_video_id)
+        elif source_url in by_url and by_url[source_url] not in existing:
+            existing.add(by_url[source_url])
+            backfill.append({'pk': pk, 'video_id': by_url[source_url]})
+    if backfill:
+        await db.execute(
+            update(table).where(table.c.id == bindparam('pk')).values(rutube_video_id=bindparam('video_id')),
+            backfill,
+        )
+    return existing
+
+
+async def upsert_movies(db, rows: list[dict], cache: ResolutionCache | None = None) -> tuple[dict[str, int], int, int]:
+    """Insert or update movies keyed by rutube_video_id.
+
+    Returns ({rutube_video_id: id}, inserted_count, updated_count). Each
+    batch costs at most two statements: one indexed lookup to tell inserts
+    from updates and one multi-row INSERT ... ON CONFLICT DO UPDATE ...
+    RETURNING. The lookup by ID is limited to IDs the resolution cache
+    cannot classify; legacy rows are always looked up by source_url.
+    """
+    cache = resolution_cache if cache is None else cache
+    await cache.warm(db)
+
+    ids = {}
+    inserted = updated = 0
+    table = Movie.__table__
+    for batch in _batches(_dedupe(rows, 'rutube_video_id')):
+        existing_count = len(await _existing_videos(db, batch, cache))
+
+        stmt = _insert(db, Movie).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['rutube_video_id'],
+            set_={col: stmt.excluded[col] for col in MOVIE_UPDATE_COLUMNS},
+        )
+        result = await db.execute(stmt.returning(table.c.id, table.c.rutube_video_id))
+        for pk, rutube_video_id in result.all():
+            ids[rutube_video_id] = pk
+            cache.remember_video(rutube_video_id, pk)
+
+        updated += existing_count
+        inserted += len(batch) - existing_count
+    return ids, inserted, updated
+
+
+async def save_movies(db, rows: list[dict], update_columns: tuple = MOVIE_UPDATE_COLUMNS,
+                      cache: ResolutionCache | None = None) -> dict[str, int]:
+    """Insert new movies and refresh known ones whose ``update_columns`` changed.
+
+    Returns {'inserted', 'updated', 'skipped'} counts. Rows without a
+    rutube_video_id, repeats within ``rows`` and known videos with nothing
+    to change are skipped. Per batch this is at most one existence lookup
+    (see _existing_videos) and one INSERT ... ON CONFLICT DO UPDATE ...
+    WHERE <changed> RETURNING, whatever the table size. Does not commit.
+    """
+    cache = resolution_cache if cache is None else cache
+    await cache.warm(db)
+
+    unique = _dedupe([row for row in rows if row.get('rutube_video_id')], 'rutube_video_id')
+    counts = {'inserted': 0, 'updated': 0, 'skipped': len(rows) - len(unique)}
+    table = Movie.__table__
+    for batch in _batches(unique):
+        existing = await _existing_videos(db, batch, cache)
+
+        stmt = _insert(db, Movie).values(batch)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['rutube_video_id'],
+                set_={col: stmt.excluded[col] for col in update_columns},
+                # Unchanged rows are not rewritten and not returned
+                where=or_(*(table.c[col].is_distinct_from(stmt.excluded[col]) for col in update_columns)),
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=['rutube_video_id'])
+        result = await db.execute(stmt.returning(table.c.id, table.c.rutube_video_id))
+
+        written = 0
+        for pk, rutube_video_id in result.all():
+            written += 1
+            counts['updated' if rutube_video_id in existing else 'inserted'] += 1
+            cache.remember_video(rutube_video_id, pk)
+        counts['skipped'] += len(batch) - written
+    return counts
+
+
+async def link_playlist_movies(db, playlist_id: int, movie_ids) -> int:
+    """Link movies to a playlist, skipping existing links. Returns the number of new links."""
+    rows = [{'playlist_id': playlist_id, 'movie_id': movie_id} for movie_id in dict.fromkeys(movie_ids)]
+    linked = 0
+    table = PlaylistMovie.__table__
+    for batch in _batches(rows):
+        stmt = _insert(db, PlaylistMovie).values(batch).on_conflict_do_nothing(
+            index_elements=['playlist_id', 'movie_id'],
+        )
+        result = await db.execute(stmt.returning(table.c.movie_id))
+        linked += len(result.all())
+    return linked
@@ -0,0 +1,320 @@
+"""
+Фоновая очередь задач импорта: эндпоинты ставят задачу и сразу возвращают её ID
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.database import AsyncSessionLocal
+from app.models import ImportJob
+
+
+# Imports running at the same time in one process
+JOB_CONCURRENCY = int(os.getenv("IMPORT_JOB_CONCURRENCY", "2"))
+# Seconds to let running jobs finish on shutdown before they are interrupted
+JOB_DRAIN_TIMEOUT = float(os.getenv("IMPORT_JOB_DRAIN_TIMEOUT", "30"))
+# Seconds between heartbeats of running jobs (also how often cancel requests are checked)
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("IMPORT_JOB_HEARTBEAT_INTERVAL", "10"))
+# A running job whose heartbeat is older than this belongs to a dead worker and is queued again
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("IMPORT_JOB_HEARTBEAT_TIMEOUT", "60"))
+# Seconds an idle worker waits before looking for jobs queued on other replicas
+JOB_POLL_INTERVAL = float(os.getenv("IMPORT_JOB_POLL_INTERVAL", "2"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class IdempotencyKeyReused(ValueError):
+    """The Idempotency-Key already belongs to a job with a different kind or parameters."""
+
+
+def resource_key(kind: str, rutube_id: str) -> str:
+    """Deduplication key of an import: one active job per Rutube playlist/channel."""
+    return f"{kind}:{rutube_id}"
+
+
+async def get_active_job(db, key: str) -> ImportJob | None:
+    result = await db.execute(
+        select(ImportJob).where(ImportJob.resource_key == key, ImportJob.status.in_(ACTIVE))
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_job_by_idempotency_key(db, key: str) -> ImportJob | None:
+    result = await db.execute(select(ImportJob).where(ImportJob.idempotency_key == key))
+    return result.scalar_one_or_none()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """Persistent import jobs executed by a fixed pool of worker tasks.
+
+    Job state lives in the import_jobs table, which is also the queue:
+    workers on every replica claim queued jobs with SELECT ... FOR UPDATE
+    SKIP LOCKED, stamp them with their ``worker_id`` and keep
+    ``heartbeat_at`` fresh while they run. A running job whose heartbeat
+    has expired belonged to a dead worker and is queued again; imports
+    resume from their checkpoints. ``handlers`` map a job kind to
+    ``async handler(db, params, progress)`` returning the result dict;
+    ``progress(counts)`` adds counters to the job as batches commit.
+    """
+
+    def __init__(self, handlers: dict | None = None, concurrency: int = JOB_CONCURRENCY,
+                 session_factory=AsyncSessionLocal, *, heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL,
+                 heartbeat_timeout: float = JOB_HEARTBEAT_TIMEOUT, poll_interval: float = JOB_POLL_INTERVAL):
+        self.handlers = dict(handlers or {})
+        self.concurrency = max(1, concurrency)
+        self.session_factory = session_factory
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.poll_interval = poll_interval
+        self.worker_id = uuid.uuid4().hex
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+        self._running: dict[str, asyncio.Task] = {}
+        self._draining = False
+
+    async def start(self):
+        """Re-queue jobs of dead workers and start the workers and the heartbeat."""
+        self._draining = False
+        await self._requeue_stale()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._workers.append(asyncio.create_task(self._heartbeat_loop()))
+
+    async def submit(self, kind: str, params: dict, resource_key: str | None = None,
+                     idempotency_key: str | None = None) -> ImportJob:
+        """Queue a job, or return the one that already covers this request.
+
+        A job submitted earlier with the same ``idempotency_key`` is returned
+        as is, finished or not. Otherwise, while a job for ``resource_key``
+        is queued or running, callers attach to it instead of starting a
+        second import of the same resource. Both checks are backed by unique
+        indexes, so concurrent submits on any replica end up on one job.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._draining:
+            raise RuntimeError("Job queue is shutting down")
+        async with self.session_factory() as db:
+            existing = await self._existing(db, kind, params, resource_key, idempotency_key)
+            if existing is not None:
+                return existing
+            job = ImportJob(id=uuid.uuid4().hex, kind=kind, status=QUEUED, params=params, progress={},
+                            resource_key=resource_key, idempotency_key=idempotency_key)
+            db.add(job)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # A concurrent submit inserted the same resource or key first
+                await db.rollback()
+                existing = await self._existing(db, kind, params, resource_key, idempotency_key)
+                if existing is None:
+                    raise
+                return existing
+            await db.refresh(job)
+        # Local workers need not wait for their next poll; any replica may still claim it
+        self._wakeup.set()
+        return job
+
+    @staticmethod
+    async def _existing(db, kind: str, params: dict, resource_key: str | None,
+                        idempotency_key: str | None) -> ImportJob | None:
+        if idempotency_key:
+            job = await get_job_by_idempotency_key(db, idempotency_key)
+            if job is not None:
+                if job.kind != kind or job.params != params:
+                    raise IdempotencyKeyReused("Idempotency-Key was already used for a different request")
+                return job
+        if resource_key:
+            return await get_active_job(db, resource_key)
+        return None
+
+    async def get(self, job_id: str) -> ImportJob | None:
+        async with self.session_factory() as db:
+            return await db.get(ImportJob, job_id)
+
+    async def cancel(self, job_id: str) -> ImportJob | None:
+        """Cancel a queued or running job. Finished jobs are returned unchanged.
+
+        A queued job is cancelled in the database. A running one gets
+        ``cancel_requested``, which the worker running it (on any replica)
+        picks up on its next heartbeat; if that worker is this process, the
+        job is interrupted right away.
+        """
+        if not await self._update(job_id, {QUEUED}, status=CANCELLED, finished_at=_now()):
+            await self._update(job_id, {RUNNING}, cancel_requested=True)
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        return await self.get(job_id)
+
+    async def drain(self, timeout: float = JOB_DRAIN_TIMEOUT):
+        """Stop taking jobs, give running ones ``timeout`` seconds, then interrupt them.
+
+        Interrupted jobs go back to 'queued' and are picked up by the next worker.
+        """
+        self._draining = True
+        running = list(self._running.values())
+        if running:
+            await asyncio.wait(running, timeout=timeout)
+        for task in self._running.values():
+            task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._running.values(), *self._workers, return_exceptions=True)
+        self._workers = []
+        # A worker stopped between claiming a job and starting it leaves the job running under our id
+        async with self.session_factory() as db:
+            await db.execute(
+                update(ImportJob).where(ImportJob.status == RUNNING, ImportJob.worker_id == self.worker_id)
+                .values(status=QUEUED, worker_id=None, heartbeat_at=None)
+            )
+            await db.commit()
+
+    async def _update(self, job_id: str, only_if: set[str] | None = None, owned: bool = False, **values) -> bool:
+        """Update job columns; with ``only_if``, only while the job is in one of those states.
+
+        With ``owned``, only while this queue's worker holds the job, so a
+        worker whose job was re-queued after a missed heartbeat cannot
+        overwrite the state written by its new owner.
+        """
+        async with self.session_factory() as db:
+            stmt = update(ImportJob).where(ImportJob.id == job_id)
+            if only_if:
+                stmt = stmt.where(ImportJob.status.in_(only_if))
+            if owned:
+                stmt = stmt.where(ImportJob.worker_id == self.worker_id)
+            result = await db.execute(stmt.values(**values))
+            await db.commit()
+            return result.rowcount > 0
+
+    async def _requeue_stale(self):
+        """Queue again running jobs whose worker stopped sending heartbeats."""
+        expired = _now() - timedelta(seconds=self.heartbeat_timeout)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(ImportJob)
+                .where(ImportJob.status == RUNNING,
+                       or_(ImportJob.heartbeat_at.is_(None), ImportJob.heartbeat_at < expired))
+                .values(status=QUEUED, worker_id=None, heartbeat_at=None)
+            )
+            await db.commit()
+        if result.rowcount:
+            print(f"[jobs] Re-queued {result.rowcount} job(s) with an expired heartbeat")
+            self._wakeup.set()
+
+    async def _claim(self) -> ImportJob | None:
+        """Take the oldest queued job for this worker, or None if there is none."""
+        async with self.session_factory() as db:
+            # SKIP LOCKED lets workers on other replicas claim the next job instead of waiting
+            # (SQLite ignores it; there the status check in the UPDATE settles a race)
+            job_id = await db.scalar(
+                select(ImportJob.id).where(ImportJob.status == QUEUED)
+                .order_by(ImportJob.created_at).limit(1).with_for_update(skip_locked=True)
+            )
+            if job_id is None:
+                return None
+            now = _now()
+            result = await db.execute(
+                update(ImportJob).where(ImportJob.id == job_id, ImportJob.status == QUEUED)
+                .values(status=RUNNING, worker_id=self.worker_id, heartbeat_at=now, started_at=now,
+                        error=None, cancel_requested=False)
+            )
+            await db.commit()
+            if result.rowcount == 0:
+                return None
+            return await db.get(ImportJob, job_id)
+
+    async def _worker(self):
+        while not self._draining:
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:  # noqa: BLE001
+                print(f"[jobs] Error claiming a job: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except Exception as e:  # noqa: BLE001
+                print(f"[jobs] Error running job {job.id}: {e}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._heartbeat()
+                await self._requeue_stale()
+            except Exception as e:  # noqa: BLE001
+                print(f"[jobs] Heartbeat failed: {e}")
+
+    async def _heartbeat(self):
+        """Mark this worker's jobs alive and interrupt the ones somebody asked to cancel."""
+        job_ids = list(self._running)
+        if not job_ids:
+            return
+        async with self.session_factory() as db:
+            await db.execute(
+                update(ImportJob)
+                .where(ImportJob.id.in_(job_ids), ImportJob.worker_id == self.worker_id)
+                .values(heartbeat_at=_now())
+            )
+            result = await db.execute(
+                select(ImportJob.id).where(ImportJob.id.in_(job_ids), ImportJob.cancel_requested.is_(True))
+            )
+            cancelled = result.scalars().all()
+            await db.commit()
+        for job_id in cancelled:
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+
+    async def _run(self, job: ImportJob):
+        job_id = job.id
+        counters = dict(job.progress or {})
+
+        async def progress(counts: dict):
+            for key, value in counts.items():
+                counters[key] = counters.get(key, 0) + value
+            await self._update(job_id, {RUNNING}, owned=True, progress=dict(counters))
+
+        async def execute():
+            # Final state is written inside the task, so cancel() sees it as soon as the task is done
+            try:
+                async with self.session_factory() as db:
+                    result = await self.handlers[job.kind](db, job.params, progress)
+            except asyncio.CancelledError:
+                if self._draining:
+                    await self._update(job_id, {RUNNING}, owned=True, status=QUEUED, worker_id=None,
+                                       heartbeat_at=None)
+                else:
+                    await self._update(job_id, {RUNNING}, owned=True, status=CANCELLED, finished_at=_now())
+                raise
+            except Exception as e:  # noqa: BLE001
+                await self._update(job_id, {RUNNING}, owned=True, status=FAILED, error=str(e), finished_at=_now())
+                return
+            await self._update(job_id, {RUNNING}, owned=True, status=SUCCEEDED, result=result, finished_at=_now())
+
+        task = asyncio.create_task(execute())
+        self._running[job_id] = task
+        try:
+            await asyncio.gather(task, return_exceptions=True)
+        finally:
+            self._running.pop(job_id, None)
@@ -0,0 +1,158 @@
+"""
+Распределённые блокировки: аренды на Redis (только один процесс/реплика держит аренду)
+и блокировки импорта отдельного ресурса через advisory-блокировки PostgreSQL
+"""
+import asyncio
+import hashlib
+import os
+import weakref
+from contextlib import asynccontextmanager
+
+from redis.exceptions import LockError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+
+LEASE_PREFIX = os.getenv("REDIS_LEASE_PREFIX", "vuetube:lease:")
+# Seconds an import waits for another import of the same resource before giving up
+RESOURCE_LOCK_TIMEOUT = float(os.getenv("RESOURCE_LOCK_TIMEOUT", "900"))
+# Seconds between attempts to take a resource lock that is held elsewhere
+RESOURCE_LOCK_POLL_INTERVAL = float(os.getenv("RESOURCE_LOCK_POLL_INTERVAL", "1"))
+
+
+class ResourceLockTimeout(TimeoutError):
+    """Another import of the same resource held its lock for longer than the timeout."""
+
+
+class RedisLease:
+    """Non-blocking lease on a Redis key that expires unless renewed.
+
+    ``acquire()`` returns False right away when another process holds the
+    lease. While held, it is renewed every ``ttl / 3`` seconds, so a crashed
+    holder frees it after at most ``ttl`` seconds.
+    """
+
+    def __init__(self, redis_client, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self._lock = redis_client.lock(f"{LEASE_PREFIX}{name}", timeout=ttl, blocking=False)
+        self._renewer: asyncio.Task | None = None
+
+    async def acquire(self) -> bool:
+        if not await self._lock.acquire(blocking=False):
+            return False
+        self._renewer = asyncio.create_task(self._renew())
+        return True
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self._lock.reacquire()
+            except LockError as e:
+                print(f"[lease] Lost lease {self.name}: {e}")
+                return
+
+    async def release(self):
+        if self._renewer is not None:
+            self._renewer.cancel()
+            await asyncio.gather(self._renewer, return_exceptions=True)
+            self._renewer = None
+        try:
+            await self._lock.release()
+        except LockError:
+            # Already expired or taken over; nothing to release
+            pass
+
+    async def __aenter__(self) -> bool:
+        return await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+
+# Per-resource locks of this process, for databases without advisory locks (SQLite in tests and dev)
+_local_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+def advisory_key(key: str) -> int:
+    """Signed 64-bit advisory lock id of ``key``; stable across processes, unlike hash()."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+# Unpooled engines for advisory lock connections, one per database URL
+_lock_engines: dict = {}
+
+
+def _lock_engine(engine):
+    """Engine whose connections hold advisory locks.
+
+    NullPool keeps lock connections out of the application's pool, so held
+    locks cannot exhaust it, and closes every connection on release, so a
+    lock whose unlock failed dies with its connection instead of staying
+    behind in a pooled one.
+    """
+    lock_engine = _lock_engines.get(engine.url)
+    if lock_engine is None:
+        lock_engine = _lock_engines[engine.url] = create_async_engine(engine.url, poolclass=NullPool)
+    return lock_engine
+
+
+@asynccontextmanager
+async def resource_lock(engine, key: str, timeout: float | None = None):
+    """Hold the exclusive lock of one import resource (e.g. "playlist:<id>"), waiting for it if taken.
+
+    On PostgreSQL this is a session-level advisory lock on a connection of
+    its own, so it spans every batch commit of an import and serializes
+    imports of the resource across all entry points and replicas. It is
+    taken with pg_try_advisory_lock, retried every
+    RESOURCE_LOCK_POLL_INTERVAL seconds without holding a connection, and
+    ResourceLockTimeout is raised after ``timeout`` seconds
+    (RESOURCE_LOCK_TIMEOUT). Other databases get a lock local to the process.
+    """
+    timeout = RESOURCE_LOCK_TIMEOUT if timeout is None else timeout
+    if engine.dialect.name != 'postgresql':
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = asyncio.Lock()
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise ResourceLockTimeout(f"Timed out waiting for the lock of {key}") from None
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    lock_id = advisory_key(key)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        conn = await _lock_engine(engine).connect()
+        try:
+            locked = await conn.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id})
+            await conn.commit()
+        except BaseException:
+            await conn.close()
+            raise
+        if locked:
+            break
+        await conn.close()
+        if loop.time() >= deadline:
+            raise ResourceLockTimeout(f"Timed out waiting for the lock of {key}")
+        await asyncio.sleep(RESOURCE_LOCK_POLL_INTERVAL)
+
+    try:
+        yield
+    finally:
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+            await conn.commit()
+        except BaseException:
+            # The lock may still be held: drop the connection so the server releases it
+            await conn.invalidate()
+            raise
+        finally:
+            await conn.close()
@@ -1,9 +1,10 @@
 import asyncio
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from typing import List
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,6 +14,13 @@ from .database import get_db, engine
 from .models import Base
 from . import crud, schemas
 from .rutube_api_scraper import run_api_scraper, import_rutube_playlist_videos, import_rutube_channel
+from .resolution_cache import resolution_cache
+from .rutube_client import get_rutube_client, open_rutube_client, close_rutube_client
+from .jobs import IdempotencyKeyReused, JobQueue, resource_key
+from .locks import RedisLease
+from .scheduler import CronSchedule, ScheduledJob, Scheduler
+from .refresh_planner import RefreshPlanner
+from .browser_pool import close_driver_pool
 import re
 from urllib.parse import urlparse
 
@@ -24,8 +32,99 @@ load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 
-# Приложение FastAPI должно быть создано ДО регистрации обработчиков событий
-app = FastAPI(title="VueExpert Backend", version="0.1.0")
+# Клиент Redis
+redis_client = redis.from_url(
+    f"redis://{REDIS_HOST}:{REDIS_PORT}",
+    encoding="utf-8",
+    decode_responses=True,
+)
+
+# Планировщик Rutube скрапера: cron-расписание (UTC), случайная задержка до SCRAPE_JITTER_SECONDS
+SCRAPE_SCHEDULE = os.getenv("SCRAPE_SCHEDULE", "0 3 * * *")
+SCRAPE_JITTER_SECONDS = float(os.getenv("SCRAPE_JITTER_SECONDS", "900"))
+SCRAPE_LIMIT = int(os.getenv("SCRAPE_LIMIT", "100"))
+# Обход всех известных каналов и плейлистов: кого пора обновить, решает RefreshPlanner
+REFRESH_SCHEDULE = os.getenv("REFRESH_SCHEDULE", "*/10 * * * *")
+
+
+async def _scheduled_scrape():
+    await run_api_scraper(limit=SCRAPE_LIMIT, client=get_rutube_client())
+
+
+refresh_planner = RefreshPlanner()
+
+
+# Запуск выполняет только реплика, взявшая аренду в Redis; время последнего запуска хранится в БД
+scheduler = Scheduler(
+    [
+        ScheduledJob("rutube_scrape", CronSchedule(SCRAPE_SCHEDULE), _scheduled_scrape, jitter=SCRAPE_JITTER_SECONDS),
+        ScheduledJob("catalog_refresh", CronSchedule(REFRESH_SCHEDULE), refresh_planner.run),
+    ],
+    lease_factory=lambda name, ttl: RedisLease(redis_client, name, ttl),
+)
+
+
+# Фоновые задачи импорта: эндпоинты только ставят задачу в очередь
+async def _run_playlist_import(db, params: dict, progress):
+    return await import_rutube_playlist_videos(
+        db,
+        params["rutube_playlist_url"],
+        params["playlist_id"],
+        params["limit"],
+        full_resync=params["full_resync"],
+        progress=progress,
+    )
+
+
+async def _run_channel_import(db, params: dict, progress):
+    return await import_rutube_channel(
+        db,
+        params["rutube_channel_url"],
+        params["channel_id"],
+        params["channel_videos_limit"],
+        params["scan_playlists"],
+        params["per_playlist_limit"],
+        full_resync=params["full_resync"],
+        progress=progress,
+    )
+
+
+job_queue = JobQueue({"playlist": _run_playlist_import, "channel": _run_channel_import})
+
+
+async def _submit_import(kind: str, rutube_id: str, params: dict, idempotency_key: str | None):
+    # Одновременные запросы на один ресурс получают одну и ту же задачу
+    try:
+        return await job_queue.submit(kind, params, resource_key=resource_key(kind, rutube_id),
+                                      idempotency_key=idempotency_key)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # Общий пул соединений к Rutube API на всё время жизни приложения
+    rutube_client = await open_rutube_client()
+    app.state.rutube_client = rutube_client
+    # Периодический скрапинг по расписанию
+    await scheduler.start()
+    # Воркеры импорта; незавершённые задачи из прошлого запуска продолжаются
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        # Даём текущим импортам завершиться, остальные вернутся в очередь
+        await job_queue.drain()
+        await close_rutube_client()
+        # Браузеры Selenium-скрапера, если он запускался в этом процессе
+        await asyncio.to_thread(close_driver_pool)
+
+
+# Приложение FastAPI создаётся с lifespan, который владеет фоновыми задачами и клиентом Rutube
+app = FastAPI(title="VueExpert Backend", version="0.1.0", lifespan=lifespan)
 
 # Создаем подприложение для API
 api_router = APIRouter()
@@ -42,43 +141,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Клиент Redis
-redis_client = redis.from_url(
-    f"redis://{REDIS_HOST}:{REDIS_PORT}",
-    encoding="utf-8",
-    decode_responses=True,
-)
-
-# Создание таблиц при запуске приложения
-# Планировщик ежедневного запуска Rutube скрапера
-
-_scrape_task: asyncio.Task | None = None
-
-async def _daily_scrape_loop():
-    while True:
-        try:
-            # Запускаем скрапинг 100 элементов
-            await run_api_scraper(limit=100)
-        except Exception as e:  # noqa: BLE001
-            print(f"[scraper] Error during scheduled run: {e}")
-        # Ждём ~24 часа
-        await asyncio.sleep(24 * 60 * 60)
-
-@app.on_event("startup")
-async def startup_event():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    # Запускаем фоновую задачу ежедневного скрапинга
-    global _scrape_task
-    loop = asyncio.get_event_loop()
-    _scrape_task = loop.create_task(_daily_scrape_loop())
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    global _scrape_task
-    if _scrape_task and not _scrape_task.done():
-        _scrape_task.cancel()
-
 
 @api_router.get("/health")
 async def health() -> dict:
@@ -140,13 +202,18 @@ async def read_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends
 
 # Ручной запуск скрапера
 @api_router.post("/scrape/rutube")
-async def trigger_rutube_scraper(limit: int = 100):
+async def trigger_rutube_scraper(limit: int = 100, full_resync: bool = False):
     try:
-        count = await run_api_scraper(limit=limit)
+        count = await run_api_scraper(limit=limit, full_resync=full_resync)
         return {"status": "ok", "scraped": count}
     except Exception as e:  # noqa: BLE001
         raise HTTPException(status_code=500, detail=f"Scraper error: {e}")
 
+@api_router.get("/scrape/rutube/stats")
+async def rutube_client_stats() -> dict:
+    """Статистика клиента Rutube API (темп запросов, время ожидания лимитера) и кэша ID."""
+    return {**get_rutube_client().stats(), "resolution_cache": resolution_cache.stats()}
+
 # Эндпоинты для работы с фильмами
 @api_router.post("/movies/", response_model=schemas.Movie)
 async def create_movie(movie: schemas.MovieCreate, db: AsyncSession = Depends(get_db)):
@@ -333,13 +400,20 @@ def extract_channel_id_from_url(url: str) -> str | None:
     return match.group(1) if match else None
 
 
-@api_router.post("/playlists/import")
+@api_router.post("/playlists/import", status_code=202, response_model=schemas.ImportJob)
 async def import_playlist(
     rutube_playlist_url: str,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    full_resync: bool = False,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
-    """Импорт плейлиста из Rutube"""
+    """Поставить импорт плейлиста из Rutube в очередь; ход выполнения — GET /jobs/{id}.
+
+    Плейлист каждый раз проходится целиком (до limit видео): раньше по водяному знаку
+    останавливается только список видео канала, поэтому full_resync для плейлиста ничего не меняет.
+    Пока импорт этого плейлиста не завершён, повторные запросы возвращают ту же задачу;
+    запрос с уже использованным Idempotency-Key возвращает задачу первого запроса.
+    """
     # Валидация URL
     if not validate_rutube_playlist_url(rutube_playlist_url):
         raise HTTPException(
@@ -355,28 +429,27 @@ async def import_playlist(
             detail="Could not extract playlist ID from URL"
         )
 
-    try:
-        # Запуск импорта
-        result = await import_rutube_playlist_videos(
-            db,
-            rutube_playlist_url,
-            playlist_id,
-            limit
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Import error: {str(e)}")
+    return await _submit_import("playlist", playlist_id, {
+        "rutube_playlist_url": rutube_playlist_url,
+        "playlist_id": playlist_id,
+        "limit": limit,
+        "full_resync": full_resync,
+    }, idempotency_key)
 
 
-@api_router.post("/channels/import")
+@api_router.post("/channels/import", status_code=202, response_model=schemas.ImportJob)
 async def import_channel(
     rutube_channel_url: str,
     channel_videos_limit: int = 0,
     scan_playlists: bool = True,
     per_playlist_limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    full_resync: bool = False,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
-    """Импорт/создание канала по URL Rutube. Опционально импорт последних видео (import_limit > 0)."""
+    """Поставить импорт/создание канала по URL Rutube в очередь. Опционально импорт последних видео (channel_videos_limit > 0).
+
+    Дубликаты объединяются так же, как у /playlists/import.
+    """
     if not validate_rutube_channel_url(rutube_channel_url):
         raise HTTPException(
             status_code=400,
@@ -387,18 +460,32 @@ async def import_channel(
     if not channel_id:
         raise HTTPException(status_code=400, detail="Could not extract channel ID from URL")
 
-    try:
-        result = await import_rutube_channel(
-            db,
-            rutube_channel_url,
-            channel_id,
-            channel_videos_limit if channel_videos_limit and channel_videos_limit > 0 else None,
-            scan_playlists,
-            per_playlist_limit,
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Channel import error: {str(e)}")
+    return await _submit_import("channel", channel_id, {
+        "rutube_channel_url": rutube_channel_url,
+        "channel_id": channel_id,
+        "channel_videos_limit": channel_videos_limit if channel_videos_limit and channel_videos_limit > 0 else None,
+        "scan_playlists": scan_playlists,
+        "per_playlist_limit": per_playlist_limit,
+        "full_resync": full_resync,
+    }, idempotency_key)
+
+
+@api_router.get("/jobs/{job_id}", response_model=schemas.ImportJob)
+async def get_job(job_id: str):
+    """Состояние фоновой задачи импорта: статус, счётчики прогресса, результат или ошибка."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@api_router.post("/jobs/{job_id}/cancel", response_model=schemas.ImportJob)
+async def cancel_job(job_id: str):
+    """Отменить задачу в очереди или прервать выполняющуюся."""
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 # Подключаем маршруты к основному приложению с префиксом /api и без префикса для совместимости тестов
 app.include_router(api_router, prefix="/api")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey
+from sqlalchemy import JSON, Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -35,7 +35,7 @@ class Movie(Base):
     views = Column(Integer, default=0)           # Количество просмотров
     added_at = Column(DateTime, default=func.now()) # Дата добавления в систему
     channel_added_at = Column(DateTime(timezone=True), nullable=True, index=True) # Дата публикации на Rutube
-    source_url = Column(String)                  # Исходный URL
+    source_url = Column(String, index=True)      # Исходный URL
     duration = Column(String)                    # Длительность
     description = Column(Text)                   # Описание
     genre = Column(String)                       # Жанр
@@ -84,6 +84,81 @@ class PlaylistMovie(Base):
     movie_id = Column(Integer, ForeignKey("movies.id"), primary_key=True)
 
 
+class SyncState(Base):
+    __tablename__ = "sync_states"
+    __table_args__ = (UniqueConstraint("resource_type", "rutube_id", name="uq_sync_states_resource"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    resource_type = Column(String, nullable=False)               # "channel" или "playlist"
+    rutube_id = Column(String, nullable=False)                   # Rutube ID канала/плейлиста
+    newest_item_at = Column(DateTime(timezone=True), nullable=True)  # Самый новый created_ts среди импортированных видео
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)  # Последняя успешная синхронизация
+    last_full_sync_at = Column(DateTime(timezone=True), nullable=True)  # Последняя полная пересинхронизация
+    last_new_items = Column(Integer, default=0)                  # Сколько новых видео принесла последняя синхронизация
+
+
+# Прогресс незавершённого импорта; строка удаляется, когда импорт дошёл до конца
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+    __table_args__ = (UniqueConstraint("resource_type", "rutube_id", name="uq_import_checkpoints_resource"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    resource_type = Column(String, nullable=False)               # "channel" или "playlist"
+    rutube_id = Column(String, nullable=False)
+    next_page = Column(Integer, nullable=False, default=1)       # Первая ещё не записанная страница
+    page_size = Column(Integer, nullable=False)                  # Курсор страниц имеет смысл только при том же размере
+    committed_items = Column(Integer, nullable=False, default=0)  # Видео, записанных до next_page
+    newest_item_at = Column(DateTime(timezone=True), nullable=True)  # Для водяного знака после завершения
+    full_resync = Column(Boolean, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ScheduledRun(Base):
+    __tablename__ = "scheduled_runs"
+
+    name = Column(String, primary_key=True)                      # Имя задачи планировщика
+    last_run_at = Column(DateTime(timezone=True), nullable=True)  # Начало последнего запуска (на любой реплике)
+    last_finished_at = Column(DateTime(timezone=True), nullable=True)
+    last_status = Column(String, nullable=True)                  # "running", "succeeded" или "failed"
+    last_error = Column(Text, nullable=True)
+
+
+# Запросы к API, потраченные обновлениями каталога за час; общий счётчик всех реплик
+class RefreshBudget(Base):
+    __tablename__ = "refresh_budget"
+
+    hour_start = Column(DateTime(timezone=True), primary_key=True)  # Начало часа (UTC)
+    requests = Column(Integer, nullable=False, default=0)
+
+
+# Не больше одной незавершённой задачи на ресурс: повторный запрос присоединяется к ней
+_ACTIVE_JOB_STATUSES = "status IN ('queued', 'running')"
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    __table_args__ = (
+        Index("uq_import_jobs_active_resource", "resource_key", unique=True,
+              postgresql_where=text(_ACTIVE_JOB_STATUSES), sqlite_where=text(_ACTIVE_JOB_STATUSES)),
+    )
+
+    id = Column(String, primary_key=True)                        # uuid4 hex, возвращается клиенту
+    kind = Column(String, nullable=False)                        # "playlist" или "channel"
+    status = Column(String, nullable=False, default="queued", index=True)  # queued/running/succeeded/failed/cancelled
+    resource_key = Column(String, nullable=True)                 # "playlist:<rutube id>" / "channel:<rutube id>"
+    idempotency_key = Column(String, nullable=True, unique=True, index=True)  # Заголовок Idempotency-Key запроса
+    params = Column(JSON, nullable=False)                        # Аргументы импорта из запроса
+    progress = Column(JSON, nullable=True)                       # Счётчики по мере записи пакетов
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    worker_id = Column(String, nullable=True)                    # Воркер (процесс), выполняющий задачу
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # Последний признак жизни этого воркера
+    cancel_requested = Column(Boolean, nullable=False, default=False)  # Отмена выполняющейся задачи (с любой реплики)
+
+
 # Update Movie model to include reverse relationships
 Movie.playlists = relationship("Playlist", secondary="playlist_movies", back_populates="movies")
 Movie.channel = relationship("Channel", back_populates="movies")
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Общая нормализация полей видео для всех путей импорта (API, скрапер страницы, дамп SQLite):
+просмотры, год, дата публикации и длительность. Пакетный API по колонкам, кэш частых значений,
+NumPy для числовых колонок, если он установлен
+"""
+import os
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # optional: columns are converted in pure Python without NumPy
+    np = None
+
+
+# Numeric columns at least this long are converted with NumPy when it is installed
+NUMPY_MIN_BATCH = int(os.getenv("NORMALIZE_NUMPY_MIN_BATCH", "2048"))
+# Distinct raw strings remembered per field across batches
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "65536"))
+
+_SPACES = re.compile(r"\s+")  # also no-break and narrow spaces
+_VIEWS = re.compile(r"(\d+(?:[.,]\d+)*)(тыс|млн|млрд|k|m|b|к|м)?", re.IGNORECASE)
+_THOUSANDS_GROUPS = re.compile(r"\d{1,3}(?:[.,]\d{3})+")
+_YEAR = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+_CLOCK = re.compile(r"^(?:(\d+):)?(\d{1,2}):(\d{2})$")
+_MULTIPLIERS = {
+    'тыс': 1_000, 'k': 1_000, 'к': 1_000,
+    'млн': 1_000_000, 'm': 1_000_000, 'м': 1_000_000,
+    'млрд': 1_000_000_000, 'b': 1_000_000_000,
+}
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _views_from_text(text: str) -> int:
+    # "12 345 просмотров", "1,2 тыс.", "2.5M views"
+    match = _VIEWS.search(_SPACES.sub('', text))
+    if not match:
+        return 0
+    number, unit = match.groups()
+    try:
+        if unit:
+            return int(round(float(number.replace(',', '.')) * _MULTIPLIERS[unit.lower()]))
+        if _THOUSANDS_GROUPS.fullmatch(number):
+            return int(number.replace(',', '').replace('.', ''))
+        return int(float(number.replace(',', '.')))
+    except ValueError:
+        return 0
+
+
+def parse_views(value) -> int:
+    """View count from an API number or a page text; 0 when there is none."""
+    if value is None or isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return max(int(value), 0)
+    return _views_from_text(str(value))
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _year_from_text(text: str) -> int | None:
+    match = _YEAR.search(text)
+    return int(match.group(0)) if match else None
+
+
+def parse_year(value, default: int | None = None) -> int:
+    """Year of a date, ISO timestamp or free-form date text; ``default`` (current year) otherwise."""
+    if isinstance(value, (datetime, date)):
+        return value.year
+    year = _year_from_text(str(value)) if value not in (None, '') else None
+    if year is not None:
+        return year
+    return default if default is not None else datetime.now().year
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _datetime_from_text(text: str) -> datetime | None:
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def parse_datetime(value) -> datetime | None:
+    """Datetime from an ISO timestamp (Rutube created_ts); None when it is missing or malformed."""
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    return _datetime_from_text(str(value))
+
+
+def _clock(seconds: int) -> str:
+    hours, rest = divmod(max(seconds, 0), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _duration_from_text(text: str) -> str:
+    text = text.strip()
+    if text.isdigit():
+        return _clock(int(text))
+    match = _CLOCK.match(text)
+    if match:
+        hours, minutes, secs = (int(part or 0) for part in match.groups())
+        return _clock(hours * 3600 + minutes * 60 + secs)
+    return "00:00:00"
+
+
+def format_duration(value) -> str:
+    """HH:MM:SS from seconds (API) or a "M:SS" / "H:MM:SS" label (page); "00:00:00" when unknown."""
+    if not value or isinstance(value, bool):
+        return "00:00:00"
+    if isinstance(value, (int, float)):
+        return _clock(int(value))
+    return _duration_from_text(str(value))
+
+
+def _column(values, convert) -> list:
+    """``convert`` applied once per distinct value of a column."""
+    converted = {}
+    out = []
+    for value in values:
+        try:
+            result = converted[value]
+        except KeyError:
+            result = converted[value] = convert(value)
+        except TypeError:  # unhashable
+            result = convert(value)
+        out.append(result)
+    return out
+
+
+def _all_ints(values) -> bool:
+    return all(type(v) is int for v in values)
+
+
+def _numpy_ints(values):
+    """int64 array of a long all-int column, or None to take the pure Python path."""
+    if np is None or len(values) < NUMPY_MIN_BATCH or not _all_ints(values):
+        return None
+    return np.asarray(values, dtype=np.int64)
+
+
+def normalize_views(values) -> list[int]:
+    """``parse_views`` of a column."""
+    values = list(values)
+    array = _numpy_ints(values)
+    if array is not None:
+        return np.clip(array, 0, None).tolist()
+    if _all_ints(values):
+        # API counts are mostly distinct, so remembering them costs more than it saves
+        return [v if v > 0 else 0 for v in values]
+    return _column(values, parse_views)
+
+
+def normalize_years(values, default: int | None = None) -> list[int]:
+    """``parse_year`` of a column, with the default resolved once."""
+    default = default if default is not None else datetime.now().year
+    return _column(values, lambda value: parse_year(value, default))
+
+
+def normalize_datetimes(values) -> list[datetime | None]:
+    """``parse_datetime`` of a column."""
+    return _column(values, parse_datetime)
+
+
+def normalize_durations(values) -> list[str]:
+    """``format_duration`` of a column."""
+    values = list(values)
+    array = _numpy_ints(values)
+    if array is not None:
+        hours, rest = np.divmod(np.clip(array, 0, None), 3600)
+        minutes, secs = np.divmod(rest, 60)
+        parts = [np.char.zfill(part.astype(str), 2) for part in (hours, minutes, secs)]
+        return np.char.add(np.char.add(np.char.add(parts[0], ':'), np.char.add(parts[1], ':')), parts[2]).tolist()
+    return _column(values, format_duration)
@@ -0,0 +1,72 @@
+"""
+Конвейер импорта: загрузка страниц и запись в БД идут одновременно через ограниченную очередь
+"""
+import asyncio
+import os
+
+from app.rutube_paging import Page
+
+
+# Pages buffered between the fetcher and the DB writer; a full queue pauses fetching
+PIPELINE_QUEUE_PAGES = int(os.getenv("RUTUBE_PIPELINE_QUEUE_PAGES", "8"))
+# Items the writer accumulates before one write + commit
+PIPELINE_WRITE_BATCH = int(os.getenv("RUTUBE_PIPELINE_WRITE_BATCH", "200"))
+
+_DONE = object()
+
+
+async def stream_to_writer(pages, write_batch, *, queue_size: int = PIPELINE_QUEUE_PAGES,
+                           batch_size: int = PIPELINE_WRITE_BATCH) -> list:
+    """Feed pages from the async iterator ``pages`` to ``write_batch(items)``.
+
+    Fetching runs in a separate task and hands pages over through a bounded
+    queue, so the network keeps working while a batch is being written and
+    at most ``queue_size`` pages plus one batch are held in memory.
+    ``write_batch`` is awaited with at least ``batch_size`` items (the last
+    call may get fewer) and is expected to commit. Batches always end on a
+    page boundary and are passed as a Page numbered after their last page,
+    so the writer can persist a resume cursor in the same transaction.
+    Returns the list of its results. A fetch error is re-raised after the
+    batches before it have been written; a write error stops fetching.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    fetch_error: BaseException | None = None
+
+    async def produce():
+        nonlocal fetch_error
+        try:
+            async for page in pages:
+                if page:
+                    await queue.put(page)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            fetch_error = e
+        await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    results = []
+    buffer = Page()
+    try:
+        while True:
+            page = await queue.get()
+            if page is _DONE:
+                break
+            buffer.extend(page)
+            buffer.number = getattr(page, 'number', None)
+            if len(buffer) >= batch_size:
+                batch, buffer = buffer, Page()
+                results.append(await write_batch(batch))
+        if buffer:
+            results.append(await write_batch(buffer))
+    finally:
+        if not producer.done():
+            producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        aclose = getattr(pages, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    if fetch_error is not None:
+        raise fetch_error
+    return results
@@ -0,0 +1,157 @@
+"""
+Адаптивный ограничитель частоты запросов (token bucket на каждый upstream-хост)
+"""
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+
+RATE_INITIAL = float(os.getenv("RUTUBE_RATE_INITIAL", "5"))      # requests per second
+RATE_MIN = float(os.getenv("RUTUBE_RATE_MIN", "0.5"))
+RATE_MAX = float(os.getenv("RUTUBE_RATE_MAX", "25"))
+RATE_BURST = float(os.getenv("RUTUBE_RATE_BURST", "5"))
+RATE_INCREASE_STEP = float(os.getenv("RUTUBE_RATE_INCREASE_STEP", "0.25"))
+RATE_DECREASE_FACTOR = float(os.getenv("RUTUBE_RATE_DECREASE_FACTOR", "0.5"))
+
+RETRY_BACKOFF_BASE = float(os.getenv("RUTUBE_RETRY_BACKOFF_BASE", "0.5"))
+RETRY_BACKOFF_MAX = float(os.getenv("RUTUBE_RETRY_BACKOFF_MAX", "30"))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None,
+                  base: float = RETRY_BACKOFF_BASE, cap: float = RETRY_BACKOFF_MAX) -> float:
+    """Exponential backoff with full jitter; Retry-After is a floor, not a ceiling."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay += min(retry_after, cap)
+    return delay
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate follows AIMD.
+
+    Every healthy response adds ``increase_step`` req/s (up to ``max_rate``);
+    a 429/5xx or transport error multiplies the rate by ``decrease_factor``
+    (down to ``min_rate``) and, when the server sent Retry-After, blocks the
+    whole host until that moment. Time spent waiting is accumulated in
+    ``throttled_seconds`` so the limits can be tuned from real numbers.
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_INITIAL,
+        *,
+        burst: float = RATE_BURST,
+        min_rate: float = RATE_MIN,
+        max_rate: float = RATE_MAX,
+        increase_step: float = RATE_INCREASE_STEP,
+        decrease_factor: float = RATE_DECREASE_FACTOR,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.requests = 0
+        self.throttle_events = 0
+        self.throttled_seconds = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent to this host."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.requests += 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                self.throttled_seconds += wait
+                await asyncio.sleep(wait)
+
+    async def sleep(self, seconds: float):
+        """Back off before a retry; counted as throttled time."""
+        if seconds > 0:
+            self.throttled_seconds += seconds
+            await asyncio.sleep(seconds)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after: float | None = None):
+        self.throttle_events += 1
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        # Drain the bucket so the burst does not hammer a struggling host
+        self._tokens = min(self._tokens, 0.0)
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def stats(self) -> dict:
+        return {
+            'rate': round(self.rate, 3),
+            'requests': self.requests,
+            'throttle_events': self.throttle_events,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+        }
+
+
+class HostRateLimiters:
+    """One AdaptiveRateLimiter per upstream host."""
+
+    def __init__(self, **limiter_kwargs):
+        self._limiter_kwargs = limiter_kwargs
+        self._limiters: dict[str, AdaptiveRateLimiter] = {}
+
+    def for_url(self, url: str) -> AdaptiveRateLimiter:
+        host = urlparse(url).netloc
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = AdaptiveRateLimiter(**self._limiter_kwargs)
+        return limiter
+
+    def stats(self) -> dict:
+        return {host: limiter.stats() for host, limiter in self._limiters.items()}
+
+    @property
+    def throttled_seconds(self) -> float:
+        return sum(limiter.throttled_seconds for limiter in self._limiters.values())
+
+    @property
+    def requests(self) -> int:
+        return sum(limiter.requests for limiter in self._limiters.values())
@@ -0,0 +1,246 @@
+"""
+Адаптивное обновление каталога: каждый канал и плейлист перепроверяется с частотой,
+зависящей от темпа новых загрузок и популярности, в пределах общего бюджета запросов
+"""
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, delete, func, select
+
+from app import sync_state
+from app.database import AsyncSessionLocal
+from app.ingest import _insert
+from app.jobs import get_active_job, resource_key
+from app.models import Channel, Movie, Playlist, PlaylistMovie, RefreshBudget, SyncState
+from app.rutube_api_scraper import import_rutube_channel, import_rutube_playlist_videos
+from app.rutube_client import RutubeClient
+from app.rutube_paging import PAGE_SIZE
+from app.sync_state import as_utc
+
+
+# Rutube API requests all scheduled refreshes may spend per hour
+REFRESH_REQUESTS_PER_HOUR = int(os.getenv("REFRESH_REQUESTS_PER_HOUR", "600"))
+# Bounds for the interval between two refreshes of one channel/playlist
+REFRESH_MIN_INTERVAL_HOURS = float(os.getenv("REFRESH_MIN_INTERVAL_HOURS", "1"))
+REFRESH_MAX_INTERVAL_HOURS = float(os.getenv("REFRESH_MAX_INTERVAL_HOURS", "168"))
+# Upload rate is measured over videos published in this many recent days
+REFRESH_RATE_WINDOW_DAYS = int(os.getenv("REFRESH_RATE_WINDOW_DAYS", "30"))
+# Most videos one refresh fetches (bounds the first sync of a never-synced resource)
+REFRESH_VIDEO_LIMIT = int(os.getenv("REFRESH_VIDEO_LIMIT", "100"))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def refresh_interval(uploads_per_day: float, views: int) -> timedelta:
+    """Time between refreshes: about one expected new upload, shortened for popular resources."""
+    if uploads_per_day > 0:
+        hours = 24 / uploads_per_day
+    else:
+        hours = REFRESH_MAX_INTERVAL_HOURS
+    # Every tenfold of views makes the refresh half an interval sooner
+    hours /= 1 + math.log10(1 + max(views, 0)) / 2
+    return timedelta(hours=min(max(hours, REFRESH_MIN_INTERVAL_HOURS), REFRESH_MAX_INTERVAL_HOURS))
+
+
+class RefreshTarget:
+    """A channel or playlist with the numbers its refresh schedule is derived from."""
+
+    def __init__(self, resource_type: str, rutube_id: str, uploads_per_day: float = 0.0, views: int = 0,
+                 last_synced_at: datetime | None = None):
+        self.resource_type = resource_type
+        self.rutube_id = rutube_id
+        self.uploads_per_day = uploads_per_day
+        self.views = views
+        self.last_synced_at = as_utc(last_synced_at)
+        self.interval = refresh_interval(uploads_per_day, views)
+
+    @property
+    def due_at(self) -> datetime | None:
+        """None for a resource that was never synced (due right away)."""
+        if self.last_synced_at is None:
+            return None
+        return self.last_synced_at + self.interval
+
+    def overdue(self, now: datetime) -> float:
+        """Elapsed share of the interval; 1.0 means just due."""
+        if self.last_synced_at is None:
+            return 1.0
+        return (now - self.last_synced_at) / self.interval
+
+    def estimated_requests(self, now: datetime, video_limit: int = REFRESH_VIDEO_LIMIT) -> int:
+        # Playlists are walked fully on every sync (their order is the author's, see _incremental_stop)
+        if self.last_synced_at is None or self.resource_type != sync_state.CHANNEL:
+            expected = video_limit
+        else:
+            expected = self.uploads_per_day * (now - self.last_synced_at).total_seconds() / 86400
+        pages = max(1, math.ceil(min(expected, video_limit) / PAGE_SIZE))
+        # A channel refresh also reloads the channel details
+        return pages + 1 if self.resource_type == sync_state.CHANNEL else pages
+
+    def __repr__(self):
+        return f"RefreshTarget({self.resource_type}, {self.rutube_id}, every {self.interval})"
+
+
+def plan_refreshes(targets: list[RefreshTarget], now: datetime, budget: int,
+                   video_limit: int = REFRESH_VIDEO_LIMIT) -> list[RefreshTarget]:
+    """Due targets, most overdue first (then most viewed), that fit into ``budget`` requests."""
+    due = [t for t in targets if t.overdue(now) >= 1]
+    due.sort(key=lambda t: (t.overdue(now), t.views), reverse=True)
+    planned = []
+    for target in due:
+        cost = target.estimated_requests(now, video_limit)
+        if cost <= budget:
+            planned.append(target)
+            budget -= cost
+    return planned
+
+
+async def load_refresh_targets(db, now: datetime | None = None) -> list[RefreshTarget]:
+    """All active channels and playlists with their recent upload rate, views and last sync."""
+    now = now or _now()
+    since = now - timedelta(days=REFRESH_RATE_WINDOW_DAYS)
+    recent = func.sum(case((Movie.channel_added_at >= since, 1), else_=0))
+    views = func.sum(Movie.views)
+
+    states = {
+        (state.resource_type, state.rutube_id): state.last_synced_at
+        for state in (await db.execute(select(SyncState))).scalars()
+    }
+    channels = await db.execute(
+        select(Channel.rutube_id, recent, views)
+        .outerjoin(Movie, Movie.channel_id == Channel.id)
+        .where(Channel.is_active.is_(True))
+        .group_by(Channel.id, Channel.rutube_id)
+    )
+    playlists = await db.execute(
+        select(Playlist.rutube_id, recent, views)
+        .outerjoin(PlaylistMovie, PlaylistMovie.playlist_id == Playlist.id)
+        .outerjoin(Movie, Movie.id == PlaylistMovie.movie_id)
+        .where(Playlist.is_active.is_(True))
+        .group_by(Playlist.id, Playlist.rutube_id)
+    )
+
+    targets = []
+    for resource_type, rows in ((sync_state.CHANNEL, channels), (sync_state.PLAYLIST, playlists)):
+        for rutube_id, recent_count, view_count in rows:
+            if not rutube_id:
+                continue
+            targets.append(RefreshTarget(
+                resource_type, rutube_id,
+                uploads_per_day=(recent_count or 0) / REFRESH_RATE_WINDOW_DAYS,
+                views=view_count or 0,
+                last_synced_at=states.get((resource_type, rutube_id)),
+            ))
+    return targets
+
+
+class RequestBudget:
+    """Requests spent in the current clock hour, against a per-hour allowance.
+
+    The spend is a row per hour in the DB, incremented with an upsert, so every
+    replica and a restarted process see what was already spent this hour.
+    """
+
+    def __init__(self, per_hour: int = REFRESH_REQUESTS_PER_HOUR, session_factory=AsyncSessionLocal):
+        self.per_hour = per_hour
+        self.session_factory = session_factory
+
+    @staticmethod
+    def _hour(now: datetime | None) -> datetime:
+        return (now or _now()).replace(minute=0, second=0, microsecond=0)
+
+    async def remaining(self, now: datetime | None = None) -> int:
+        async with self.session_factory() as db:
+            spent = await db.scalar(
+                select(RefreshBudget.requests).where(RefreshBudget.hour_start == self._hour(now))
+            )
+        return self.per_hour - (spent or 0)
+
+    async def spend(self, requests: int, now: datetime | None = None):
+        if requests <= 0:
+            return
+        hour = self._hour(now)
+        async with self.session_factory() as db:
+            await db.execute(
+                _insert(db, RefreshBudget).values(hour_start=hour, requests=requests).on_conflict_do_update(
+                    index_elements=['hour_start'],
+                    set_={'requests': RefreshBudget.__table__.c.requests + requests},
+                )
+            )
+            # Past hours are never read again
+            await db.execute(delete(RefreshBudget).where(RefreshBudget.hour_start < hour - timedelta(days=1)))
+            await db.commit()
+
+
+class RefreshPlanner:
+    """Refreshes every known channel and playlist on its own adaptive schedule.
+
+    Each run (a scheduler job) loads all active channels and playlists,
+    picks the ones whose interval has elapsed and syncs them one at a time
+    through the incremental importers, until the hourly request budget is
+    used up. Unless a client is passed in, each run opens a client of its
+    own, so the requests counted on its rate limiters are the refreshes'
+    alone and not imports sharing the process. The spend is kept per hour
+    in the DB (RequestBudget), shared by all replicas and restarts.
+    Resources with an import job queued or running are left to that job;
+    a job that starts meanwhile is serialized with the refresh by the
+    importers' per-resource lock (see locks.resource_lock).
+    """
+
+    def __init__(self, client: RutubeClient | None = None, session_factory=AsyncSessionLocal,
+                 requests_per_hour: int = REFRESH_REQUESTS_PER_HOUR, video_limit: int = REFRESH_VIDEO_LIMIT):
+        self.client = client
+        self.session_factory = session_factory
+        self.budget = RequestBudget(requests_per_hour, session_factory)
+        self.video_limit = video_limit
+
+    async def plan(self) -> list[RefreshTarget]:
+        now = _now()
+        async with self.session_factory() as db:
+            targets = await load_refresh_targets(db, now)
+        return plan_refreshes(targets, now, await self.budget.remaining(now), self.video_limit)
+
+    async def run(self) -> dict:
+        if self.client is not None:
+            return await self._run(self.client)
+        async with RutubeClient() as client:
+            return await self._run(client)
+
+    async def _run(self, client: RutubeClient) -> dict:
+        planned = await self.plan()
+        refreshed, skipped, failed, requests = 0, 0, 0, 0
+        for target in planned:
+            cost = target.estimated_requests(_now(), self.video_limit)
+            if cost > await self.budget.remaining():
+                break
+            before = client.rate_limiters.requests
+            try:
+                async with self.session_factory() as db:
+                    if await get_active_job(db, resource_key(target.resource_type, target.rutube_id)):
+                        skipped += 1
+                        continue
+                    await self._refresh(db, target, client)
+                refreshed += 1
+            except Exception as e:  # noqa: BLE001
+                print(f"[refresh] {target.resource_type} {target.rutube_id} failed: {e}")
+                failed += 1
+            finally:
+                spent = client.rate_limiters.requests - before
+                await self.budget.spend(spent)
+                requests += spent
+
+        summary = {"planned": len(planned), "refreshed": refreshed, "skipped": skipped, "failed": failed,
+                   "requests": requests}
+        print(f"[refresh] {summary}")
+        return summary
+
+    async def _refresh(self, db, target: RefreshTarget, client: RutubeClient):
+        if target.resource_type == sync_state.CHANNEL:
+            await import_rutube_channel(db, f"https://rutube.ru/channel/{target.rutube_id}/", target.rutube_id,
+                                        channel_videos_limit=self.video_limit, scan_playlists=False, client=client)
+        else:
+            await import_rutube_playlist_videos(db, f"https://rutube.ru/plst/{target.rutube_id}/", target.rutube_id,
+                                                self.video_limit, client=client)
@@ -0,0 +1,140 @@
+"""
+Кэш соответствия Rutube ID -> первичный ключ в БД на время жизни процесса
+"""
+import hashlib
+import math
+import os
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.models import Movie
+
+
+RESOLUTION_CACHE_SIZE = int(os.getenv("RESOLUTION_CACHE_SIZE", "50000"))
+BLOOM_CAPACITY = int(os.getenv("RESOLUTION_BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = float(os.getenv("RESOLUTION_BLOOM_ERROR_RATE", "0.01"))
+
+
+class LRUCache:
+    """Small LRU map on top of OrderedDict."""
+
+    def __init__(self, maxsize: int = RESOLUTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class BloomFilter:
+    """Bloom filter over strings: ``key in bloom`` is False only for keys never added."""
+
+    def __init__(self, capacity: int = BLOOM_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class ResolutionCache:
+    """Maps Rutube channel, playlist and video IDs to local primary keys.
+
+    Shared by all imports in the process. LRU entries are dropped on any
+    session rollback, since they may point at rows that were never
+    committed. The Bloom filter of known video IDs is only ever added to:
+    a rolled-back insert leaves a false positive, which just costs one
+    lookup. It may also answer "definitely new" for a row another process
+    inserted, so it only ever replaces lookups by rutube_video_id, which
+    ON CONFLICT DO UPDATE protects. Matching by source_url always goes to
+    the database.
+    """
+
+    def __init__(self, maxsize: int = RESOLUTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.reset()
+
+    def reset(self):
+        """Forget everything, including the Bloom filter (e.g. when switching databases)."""
+        self.channels = LRUCache(self.maxsize)
+        self.playlists = LRUCache(self.maxsize)
+        self.videos = LRUCache(self.maxsize)
+        self.known_videos = BloomFilter()
+        self.warmed = False
+        self.skipped_lookups = 0
+
+    def invalidate(self):
+        self.channels.clear()
+        self.playlists.clear()
+        self.videos.clear()
+
+    async def warm(self, db):
+        """Load every known rutube_video_id into the Bloom filter once per process."""
+        if self.warmed:
+            return
+        stmt = select(Movie.rutube_video_id).where(Movie.rutube_video_id.is_not(None))
+        result = await db.stream(stmt.execution_options(yield_per=10000))
+        async for (rutube_video_id,) in result:
+            self.known_videos.add(rutube_video_id)
+        self.warmed = True
+
+    def remember_video(self, rutube_video_id: str, pk: int):
+        self.videos.put(rutube_video_id, pk)
+        self.known_videos.add(rutube_video_id)
+
+    def definitely_new(self, rutube_video_id: str) -> bool:
+        """True when no row of this process's view has the rutube_video_id (no lookup by ID needed)."""
+        if not self.warmed or rutube_video_id in self.known_videos:
+            return False
+        self.skipped_lookups += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            name: {'size': len(lru), 'hits': lru.hits, 'misses': lru.misses}
+            for name, lru in (('channels', self.channels), ('playlists', self.playlists), ('videos', self.videos))
+        } | {'bloom_keys': self.known_videos.count, 'skipped_lookups': self.skipped_lookups}
+
+
+resolution_cache = ResolutionCache()
+
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_on_rollback(session):
+    resolution_cache.invalidate()
@@ -2,365 +2,420 @@
 Rutube API-based scraper - более надежная альтернатива Selenium
 """
 import asyncio
-import aiohttp
+from contextlib import aclosing, nullcontext
 from datetime import datetime
 from app.database import AsyncSessionLocal
-from app.models import Movie, Channel, Playlist, PlaylistMovie
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from app.models import Channel, Movie
+from app.rutube_client import RutubeClient, get_rutube_client, close_rutube_client
+from app.rutube_paging import PAGE_CONCURRENCY, PAGE_SIZE, Page, collect_pages, iter_pages
+from app.pipeline import stream_to_writer
+from app.rutube_decode import VideoRecord, extract_channel, playlist_record, video_record
+from app.ingest import ensure_playlist, link_playlist_movies, save_movies, upsert_channels, upsert_movies
+from app.normalize import normalize_datetimes, normalize_durations, normalize_views, normalize_years, parse_datetime
+from app import sync_state
+from app.sync_state import as_utc, get_watermark, record_sync
+from app.checkpoints import clear_checkpoint, get_checkpoint, save_checkpoint
+from app.jobs import resource_key
+from app.locks import resource_lock
+from sqlalchemy import exists, select
 import os
 
 
-RUTUBE_API_BASE = "https://rutube.ru/api"
 CHANNEL_ID = os.getenv("RUTUBE_CHANNEL_ID", "32869212")
+# How many fetches (channel videos, playlist list, single playlists) one channel import runs at once
+IMPORT_CONCURRENCY = int(os.getenv("RUTUBE_IMPORT_CONCURRENCY", "6"))
 
 
-async def fetch_channel_videos(limit: int = 100):
+async def fetch_channel_videos(limit: int = 100, client: RutubeClient | None = None, stop_when=None):
     """Deprecated: use fetch_channel_videos_by_id with explicit channel_id."""
-    return await fetch_channel_videos_by_id(CHANNEL_ID, limit)
+    return await fetch_channel_videos_by_id(CHANNEL_ID, limit, client=client, stop_when=stop_when)
 
-async def fetch_channel_videos_by_id(channel_id: str, limit: int = 100):
-    """Получить видео из канала через Rutube API"""
-    videos = []
-    page = 1
-    page_size = 20
 
-    async with aiohttp.ClientSession() as session:
-        while len(videos) < limit:
-            url = f"{RUTUBE_API_BASE}/video/person/{channel_id}/?page={page}&page_size={page_size}"
+def _channel_video_info(video: dict) -> VideoRecord:
+    return video_record(video)
 
-            try:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    if response.status != 200:
-                        print(f"API returned status {response.status}")
-                        break
 
-                    data = await response.json()
-                    results = data.get('results', [])
+def _playlist_video_info(video: dict) -> VideoRecord:
+    # Playlist items also carry the video id and its channel (person or author)
+    return video_record(video, with_channel=True)
 
-                    if not results:
-                        break
 
-                    for video in results:
-                        if len(videos) >= limit:
-                            break
+async def _collect(pages) -> list:
+    return [item async for page in pages for item in page]
 
-                        video_info = {
-                            'title': video.get('title', ''),
-                            'url': f"https://rutube.ru/video/{video.get('id', '')}/",
-                            'thumbnail_url': video.get('thumbnail_url', ''),
-                            'views': video.get('hits', 0),
-                            'duration': video.get('duration', 0),
-                            'description': video.get('description', ''),
-                            'publication_date': video.get('created_ts', ''),
-                            'category': video.get('category', {}).get('name', 'Видео'),
-                        }
-                        videos.append(video_info)
 
-                    page += 1
-                    await asyncio.sleep(0.5)  # Rate limiting
+async def iter_channel_video_pages(channel_id: str, limit: int = 100, client: RutubeClient | None = None,
+                                   page_size: int = PAGE_SIZE, concurrency: int = PAGE_CONCURRENCY,
+                                   stop_when=None, start_page: int = 1):
+    """Yield pages of channel videos as they arrive, in page order."""
+    client = client or get_rutube_client()
 
-            except Exception as e:
-                print(f"Error fetching page {page}: {e}")
-                break
+    async def fetch_page(page: int):
+        url = f"/video/person/{channel_id}/?page={page}&page_size={page_size}"
+        # Transient errors are retried by the client; RutubeAPIError aborts the fetch
+        status, data = await client.get_json(url)
+        if status != 200:
+            print(f"API returned status {status}")
+            return None
+        return data
 
-    return videos
+    async with aclosing(iter_pages(fetch_page, limit=limit, page_size=page_size, concurrency=concurrency,
+                                   stop_when=stop_when, start_page=start_page)) as pages:
+        async for results in pages:
+            yield Page(map(_channel_video_info, results), results.number)
 
 
-async def fetch_playlist_videos(playlist_id: str, limit: int = 100):
+async def fetch_channel_videos_by_id(channel_id: str, limit: int = 100, client: RutubeClient | None = None,
+                                     page_size: int = PAGE_SIZE, concurrency: int = PAGE_CONCURRENCY,
+                                     stop_when=None):
+    """Получить видео из канала через Rutube API"""
+    return await _collect(iter_channel_video_pages(channel_id, limit, client=client, page_size=page_size,
+                                                   concurrency=concurrency, stop_when=stop_when))
+
+
+async def iter_playlist_video_pages(playlist_id: str, limit: int = 100, client: RutubeClient | None = None,
+                                    page_size: int = PAGE_SIZE, concurrency: int = PAGE_CONCURRENCY,
+                                    stop_when=None, start_page: int = 1):
+    """Yield pages of playlist videos as they arrive, in page order."""
+    client = client or get_rutube_client()
+
+    async def fetch_page(page: int):
+        # Using the playlist API endpoint
+        url = f"/video/playlist/{playlist_id}/?page={page}&page_size={page_size}"
+        status, data = await client.get_json(url)
+        if status != 200:
+            print(f"Playlist API returned status {status}")
+            # Try alternative endpoint
+            alt_url = f"/playlist/{playlist_id}/?page={page}&page_size={page_size}"
+            alt_status, data = await client.get_json(alt_url)
+            if alt_status != 200:
+                print(f"Alternative playlist API also failed: {alt_status}")
+                return None
+        return data
+
+    async with aclosing(iter_pages(fetch_page, limit=limit, page_size=page_size, concurrency=concurrency,
+                                   stop_when=stop_when, start_page=start_page)) as pages:
+        async for results in pages:
+            yield Page(map(_playlist_video_info, results), results.number)
+
+
+async def fetch_playlist_videos(playlist_id: str, limit: int = 100, client: RutubeClient | None = None,
+                                page_size: int = PAGE_SIZE, concurrency: int = PAGE_CONCURRENCY,
+                                stop_when=None):
     """Получить видео из плейлиста через Rutube API"""
-    videos = []
-    page = 1
-    page_size = 20
-
-    async with aiohttp.ClientSession() as session:
-        while len(videos) < limit:
-            # Using the playlist API endpoint
-            url = f"{RUTUBE_API_BASE}/video/playlist/{playlist_id}/?page={page}&page_size={page_size}"
-
-            try:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    if response.status != 200:
-                        print(f"Playlist API returned status {response.status}")
-                        # Try alternative endpoint
-                        alt_url = f"{RUTUBE_API_BASE}/playlist/{playlist_id}/?page={page}&page_size={page_size}"
-                        async with session.get(alt_url, timeout=aiohttp.ClientTimeout(total=30)) as alt_response:
-                            if alt_response.status != 200:
-                                print(f"Alternative playlist API also failed: {alt_response.status}")
-                                break
-                            data = await alt_response.json()
-                    else:
-                        data = await response.json()
-
-                    results = data.get('results', [])
-
-                    if not results:
-                        break
-
-                    for video in results:
-                        if len(videos) >= limit:
-                            break
-
-                        # Extract channel information
-                        channel = video.get('person', {}) or video.get('author', {})
-
-                        video_info = {
-                            'title': video.get('title', ''),
-                            'url': f"https://rutube.ru/video/{video.get('id', '')}/",
-                            'thumbnail_url': video.get('thumbnail_url', ''),
-                            'views': video.get('hits', 0),
-                            'duration': video.get('duration', 0),
-                            'description': video.get('description', ''),
-                            'publication_date': video.get('created_ts', ''),
-                            'category': video.get('category', {}).get('name', 'Видео'),
-                            'rutube_video_id': video.get('id', ''),
-                            'channel_data': {
-                                'rutube_id': str(channel.get('id', '')),
-                                'title': channel.get('name', ''),
-                                'avatar_url': channel.get('avatar_url', ''),
-                            }
-                        }
-                        videos.append(video_info)
-
-                    page += 1
-                    # Rate limiting
-                    await asyncio.sleep(0.25)  # Reduced delay for playlist fetching
-
-            except Exception as e:
-                print(f"Error fetching playlist page {page}: {e}")
-                break
-
-    return videos
-
-
-async def import_rutube_playlist_videos(db, rutube_playlist_url: str, playlist_id: str, limit: int = 100):
-    """Import videos from a Rutube playlist into the database"""
-    print(f"Importing videos from playlist {playlist_id} (limit: {limit})")
+    return await _collect(iter_playlist_video_pages(playlist_id, limit, client=client, page_size=page_size,
+                                                    concurrency=concurrency, stop_when=stop_when))
+
+
+async def _get_or_create_playlist(db, rutube_playlist_url: str, playlist_id: str):
+    # Insert-if-missing is race-free when two imports hit the same playlist
+    return await ensure_playlist(db, {
+        'rutube_id': playlist_id,
+        'title': f"Playlist {playlist_id}",
+        'description': f"Imported from {rutube_playlist_url}",
+        'is_active': True
+    })
 
-    # Get or create the playlist
-    existing_playlist = await db.execute(
-        select(Playlist).where(Playlist.rutube_id == playlist_id)
-    )
-    playlist = existing_playlist.scalar_one_or_none()
-
-    if not playlist:
-        # Create new playlist
-        playlist_data = {
-            'rutube_id': playlist_id,
-            'title': f"Playlist {playlist_id}",
-            'description': f"Imported from {rutube_playlist_url}",
-            'is_active': True
+
+async def _video_stored(db, rutube_video_id: str) -> bool:
+    return bool(await db.scalar(select(exists().where(Movie.rutube_video_id == rutube_video_id))))
+
+
+async def _incremental_stop(db, resource_type: str, rutube_id: str, full_resync: bool = False, is_known=None):
+    """stop_when predicate for an incremental sync, or None when the list must be walked fully.
+
+    Only channel video lists are guaranteed to come newest first; playlists
+    keep the author's order (often oldest first), so they are always walked
+    fully. Paging stops at the first video that is not newer than the
+    stored watermark and is already in the database. ``is_known(video_id)``
+    does that check; by default it queries ``db``, so pass one that takes
+    the session's lock when ``db`` is shared with concurrent writes.
+    """
+    if full_resync or resource_type != sync_state.CHANNEL:
+        return None
+    watermark = await get_watermark(db, resource_type, rutube_id)
+    if watermark is None:
+        return None
+    if is_known is None:
+        async def is_known(video_id):
+            return await _video_stored(db, video_id)
+
+    async def stop_when(item: dict) -> bool:
+        created = as_utc(parse_datetime(item.get('created_ts', '')))
+        if created is None or created > watermark or not item.get('id'):
+            return False
+        return await is_known(str(item['id']))
+
+    return stop_when
+
+
+def _newest_publication(videos) -> datetime | None:
+    dates = normalize_datetimes(v.get('publication_date', '') for v in videos)
+    dates = [as_utc(d) for d in dates if d is not None]
+    return max(dates, default=None)
+
+
+def _add_counts(results: list[dict]) -> dict:
+    totals = {}
+    for counts in results:
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+async def _resumable_sync(db, resource_type: str, rutube_id: str, iter_video_pages, store, *, limit: int | None,
+                          client: RutubeClient | None, full_resync: bool, db_lock: asyncio.Lock, ready=None,
+                          page_size: int = PAGE_SIZE, progress=None,
+                          fetch_slots: asyncio.Semaphore | None = None) -> dict:
+    """Stream a channel's or playlist's videos into the database, resuming an interrupted run.
+
+    ``iter_video_pages`` is one of the iter_*_video_pages generators and
+    ``store(videos)`` writes one batch without committing and returns its
+    counts (with an 'imported' key). Every batch is committed together with
+    an ImportCheckpoint holding the next page, so a failed run continues
+    from there next time. The watermark advances and the checkpoint is
+    dropped only once the whole list has been written. All work on ``db``
+    happens under ``db_lock``; ``ready`` is awaited before the first write.
+    ``progress(counts)``, if given, is awaited after every committed batch.
+
+    The whole run holds the resource's lock (see locks.resource_lock), so
+    jobs, channel imports and planned refreshes of the same channel or
+    playlist never write its checkpoint and watermark at the same time.
+    A slot of ``fetch_slots`` is taken only once the lock is held, so a run
+    waiting behind another import does not keep a fetch slot busy.
+    """
+    async def is_known(video_id):
+        async with db_lock:
+            return await _video_stored(db, video_id)
+
+    async with resource_lock(db.bind, resource_key(resource_type, rutube_id)), (fetch_slots or nullcontext()):
+        async with db_lock:
+            checkpoint = await get_checkpoint(db, resource_type, rutube_id, page_size)
+            start_page, committed, newest = 1, 0, None
+            if checkpoint is not None:
+                start_page, committed = checkpoint.next_page, checkpoint.committed_items
+                newest = as_utc(checkpoint.newest_item_at)
+                full_resync = full_resync or checkpoint.full_resync
+                print(f"Resuming {resource_type} {rutube_id} import from page {start_page} "
+                      f"({committed} videos done)")
+            stop_when = await _incremental_stop(db, resource_type, rutube_id, full_resync, is_known)
+            await db.commit()
+
+        async def write(videos):
+            nonlocal committed, newest
+            if ready is not None:
+                await ready
+            batch_newest = max(filter(None, (newest, _newest_publication(videos))), default=None)
+            async with db_lock:
+                try:
+                    counts = await store(videos)
+                    await save_checkpoint(db, resource_type, rutube_id, next_page=videos.number + 1,
+                                          page_size=page_size, committed_items=committed + len(videos),
+                                          newest_item_at=batch_newest, full_resync=stop_when is None)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+            committed += len(videos)
+            newest = batch_newest
+            if progress is not None:
+                await progress({'videos': len(videos), **counts})
+            return counts
+
+        results = []
+        remaining = None if limit is None else limit - committed
+        if remaining is None or remaining > 0:
+            pages = iter_video_pages(rutube_id, remaining, client=client, page_size=page_size,
+                                     stop_when=stop_when, start_page=start_page)
+            results = await stream_to_writer(pages, write)
+        counts = _add_counts(results)
+
+        async with db_lock:
+            await record_sync(db, resource_type, rutube_id, newest,
+                              new_items=counts.get('imported', 0), full_resync=stop_when is None)
+            await clear_checkpoint(db, resource_type, rutube_id)
+            await db.commit()
+
+        return {
+            **counts,
+            "sync_mode": "full" if stop_when is None else "incremental",
+            "resumed_from_page": start_page if checkpoint is not None else None,
         }
 
-        playlist = Playlist(**playlist_data)
-        db.add(playlist)
-        await db.flush()  # Get the ID without committing
-
-    imported_count = 0
-    updated_count = 0
-    linked_count = 0
-
-    # Fetch videos from the playlist
-    videos = await fetch_playlist_videos(playlist_id, limit)
-
-    for video in videos:
-        # Get or create channel
-        existing_channel = await db.execute(
-            select(Channel).where(Channel.rutube_id == video['channel_data']['rutube_id'])
-        )
-        channel = existing_channel.scalar_one_or_none()
-
-        if not channel:
-            channel_data = {
-                'rutube_id': video['channel_data']['rutube_id'],
-                'title': video['channel_data']['title'],
-                'avatar_url': video['channel_data'].get('avatar_url'),
-                'is_active': True
-            }
-            channel = Channel(**channel_data)
-            db.add(channel)
-            await db.flush()  # Get the ID without committing
-
-        # Get or create movie by rutube_video_id
-        existing_movie = await db.execute(
-            select(Movie).where(Movie.rutube_video_id == video['rutube_video_id'])
-        )
-        movie = existing_movie.scalar_one_or_none()
-
-        if movie:
-            # Update existing movie
-            update_data = {
-                'title': video.get('title', movie.title),
-                'thumbnail_url': video.get('thumbnail_url', movie.thumbnail_url),
-                'views': video.get('views', movie.views),
-                'description': video.get('description', movie.description),
-                'duration': format_duration(video.get('duration', movie.duration)),
-                'genre': video.get('category', movie.genre),
-                'source_url': video.get('url', movie.source_url),
-                'channel_id': channel.id,
-                'channel_added_at': parse_channel_added_at(video.get('publication_date', '')),
-            }
-            for key, value in update_data.items():
-                setattr(movie, key, value)
-
-            updated_count += 1
-        else:
-            # Create new movie
-            movie_data = {
-                'title': video.get('title', ''),
-                'year': extract_year_from_date(video.get('publication_date', '')),
-                'thumbnail_url': video.get('thumbnail_url', ''),
-                'views': video.get('views', 0),
-                'source_url': video.get('url', ''),
-                'duration': format_duration(video.get('duration', 0)),
-                'description': video.get('description', ''),
-                'genre': video.get('category', 'Видео'),
-                'rating': None,
-                'is_active': True,
-                'channel_added_at': parse_channel_added_at(video.get('publication_date', '')),
-                'channel_id': channel.id,
-                'rutube_video_id': video['rutube_video_id']
-            }
-            movie = Movie(**movie_data)
-            db.add(movie)
-            imported_count += 1
-
-        await db.flush()  # Ensure movie ID is available
-
-        # Link movie to playlist if not already linked
-        existing_link = await db.execute(
-            select(PlaylistMovie).where(
-                PlaylistMovie.playlist_id == playlist.id,
-                PlaylistMovie.movie_id == movie.id
-            )
-        )
-        existing_link_result = existing_link.scalar_one_or_none()
-
-        if not existing_link_result:
-            playlist_movie = PlaylistMovie(
-                playlist_id=playlist.id,
-                movie_id=movie.id
-            )
-            db.add(playlist_movie)
-            linked_count += 1
 
-    await db.commit()
+async def _sync_playlist(db, rutube_playlist_url: str, playlist_id: str, limit: int, client: RutubeClient | None,
+                         full_resync: bool, db_lock: asyncio.Lock, ready=None, progress=None,
+                         fetch_slots: asyncio.Semaphore | None = None) -> dict:
+    """Stream a playlist into the database, committing every written batch (see _resumable_sync)."""
+    async with db_lock:
+        playlist = await _get_or_create_playlist(db, rutube_playlist_url, playlist_id)
+        await db.commit()
 
+    async def store(videos):
+        return await _store_playlist_videos(db, playlist, videos)
+
+    result = await _resumable_sync(db, sync_state.PLAYLIST, playlist_id, iter_playlist_video_pages, store,
+                                   limit=limit, client=client, full_resync=full_resync, db_lock=db_lock,
+                                   ready=ready, progress=progress, fetch_slots=fetch_slots)
     return {
-        "imported": imported_count,
-        "updated": updated_count,
-        "linked": linked_count,
+        "imported": 0, "updated": 0, "linked": 0,
+        **result,
         "playlist_id": playlist.id,
-        "playlist_title": playlist.title
+        "playlist_title": playlist.title,
     }
 
 
-def extract_year_from_date(date_str):
-    """Extract year from publication date string."""
-    if not date_str:
-        return datetime.now().year
+async def import_rutube_playlist_videos(db, rutube_playlist_url: str, playlist_id: str, limit: int = 100,
+                                        client: RutubeClient | None = None, full_resync: bool = False,
+                                        progress=None):
+    """Import videos from a Rutube playlist into the database
 
-    try:
-        # Try parsing ISO format
-        dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        return dt.year
-    except Exception:
-        return datetime.now().year
+    Playlists keep the author's order, so every import walks the whole
+    playlist (existing videos are updated, not duplicated). An interrupted
+    import continues from the last committed page.
+    """
+    print(f"Importing videos from playlist {playlist_id} (limit: {limit})")
+    return await _sync_playlist(db, rutube_playlist_url, playlist_id, limit, client, full_resync, asyncio.Lock(),
+                                progress=progress)
+
+
+def _movie_rows(videos: list[dict], channel_ids: list[int], rutube_video_ids: list[str]) -> list[dict]:
+    """Movie column values for fetched videos (used for both insert and update), normalized per column."""
+    dates = [v.get('publication_date', '') for v in videos]
+    years = normalize_years(dates)
+    published = normalize_datetimes(dates)
+    views = normalize_views(v.get('views', 0) for v in videos)
+    durations = normalize_durations(v.get('duration', 0) for v in videos)
+    return [
+        {
+            'title': video.get('title', ''),
+            'year': years[i],
+            'thumbnail_url': video.get('thumbnail_url', ''),
+            'views': views[i],
+            'source_url': video.get('url', ''),
+            'duration': durations[i],
+            'description': video.get('description', ''),
+            'genre': video.get('category', 'Видео'),
+            'rating': None,
+            'is_active': True,
+            'channel_added_at': published[i],
+            'channel_id': channel_ids[i],
+            'rutube_video_id': rutube_video_ids[i],
+        }
+        for i, video in enumerate(videos)
+    ]
 
 
-def parse_channel_added_at(date_str):
-    """Parse created_ts from Rutube API to datetime with timezone."""
-    if not date_str:
-        return None
+async def _store_playlist_videos(db, playlist, videos) -> dict:
+    """Upsert fetched playlist videos (and their channels) and link them to the playlist. Does not commit.
 
-    try:
-        # Parse ISO format with Z/UTC handling
-        dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        return dt
-    except Exception:
-        return None
+    The whole batch costs a handful of statements: one channel upsert, one
+    lookup plus one upsert for movies and one insert for playlist links.
+    """
+    videos = [v for v in videos if v.get('rutube_video_id')]
+    if not videos:
+        return {"imported": 0, "updated": 0, "linked": 0}
+
+    channel_ids = await upsert_channels(db, [
+        {
+            'rutube_id': v['channel_data']['rutube_id'],
+            'title': v['channel_data']['title'],
+            'avatar_url': v['channel_data'].get('avatar_url'),
+            'is_active': True,
+        }
+        for v in videos
+    ])
+    movie_ids, imported_count, updated_count = await upsert_movies(db, _movie_rows(
+        videos,
+        [channel_ids[v['channel_data']['rutube_id']] for v in videos],
+        [v['rutube_video_id'] for v in videos],
+    ))
+    linked_count = await link_playlist_movies(db, playlist.id, movie_ids.values())
+
+    return {
+        "imported": imported_count,
+        "updated": updated_count,
+        "linked": linked_count,
+    }
 
 
-def format_duration(seconds):
-    """Convert duration in seconds to HH:MM:SS string format."""
-    if not seconds or seconds == 0:
-        return "00:00:00"
+def _video_id_from_url(url: str) -> str:
+    # The channel endpoint has no separate id field, so take it from the url
+    return (url or '').rstrip('/').split('/')[-1]
 
-    try:
-        seconds = int(seconds)
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        secs = seconds % 60
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-    except Exception:
-        return "00:00:00"
 
+async def save_videos_to_db(videos, source_name="Rutube API", channel_rutube_id: str = CHANNEL_ID) -> dict:
+    """Save scraped channel videos: insert new ones, refresh the changed fields of known ones.
 
-async def save_videos_to_db(videos, source_name="Rutube API"):
-    """Save videos to PostgreSQL database using SQLAlchemy ORM."""
+    Returns {'inserted', 'updated', 'skipped'}. Existence is resolved for
+    the whole batch at once (see ingest.save_movies), so the cost does not
+    grow with the size of the movies table.
+    """
     print(f"Saving {len(videos)} videos from '{source_name}' to PostgreSQL database...")
-    
+
     if not videos:
-        return 0
+        return {'inserted': 0, 'updated': 0, 'skipped': 0}
 
-    new_videos_count = 0
     async with AsyncSessionLocal() as db:
-        for video in videos:
-            # Check if this video already exists
-            existing_video = await db.execute(
-                select(Movie).where(Movie.source_url == video.get('url'))
-            )
-            existing = existing_video.scalar_one_or_none()
-            
-            if existing is None:
-                # Prepare data for Movie model
-                movie_data = {
-                    'title': video.get('title', ''),
-                    'year': extract_year_from_date(video.get('publication_date', '')),
-                    'image_url': video.get('thumbnail_url'),
-                    'thumbnail_url': video.get('thumbnail_url'),
-                    'views': video.get('views', 0),
-                    'source_url': video.get('url'),
-                    'duration': format_duration(video.get('duration')),
-                    'description': video.get('description', f'Video from {source_name}'),
-                    'genre': video.get('category', 'Видео'),
-                    'rating': None,
-                    'is_active': True,
-                    'channel_added_at': parse_channel_added_at(video.get('publication_date', '')),
-                }
-                
-                # Create new movie object and add to database
-                new_movie = Movie(**movie_data)
-                db.add(new_movie)
-                new_videos_count += 1
-        
-        if new_videos_count > 0:
-            await db.commit()
-            print(f"Saved {new_videos_count} new videos to database.")
-        else:
-            print("No new videos were added - all videos already existed in database.")
-    
-    return new_videos_count
-
-
-async def run_api_scraper(limit: int = 100):
+        channel_ids = await upsert_channels(db, [{
+            'rutube_id': channel_rutube_id,
+            'title': f"Channel {channel_rutube_id}",
+            'is_active': True,
+        }])
+        rows = _movie_rows(videos, [channel_ids[channel_rutube_id]] * len(videos),
+                           [_video_id_from_url(video.get('url')) for video in videos])
+        for row, video in zip(rows, videos):
+            row['image_url'] = video.get('thumbnail_url')
+            row['description'] = video.get('description') or f'Video from {source_name}'
+        counts = await save_movies(db, rows)
+        await db.commit()
+
+    print(f"Saved videos: {counts['inserted']} new, {counts['updated']} updated, {counts['skipped']} unchanged")
+    return counts
+
+
+async def run_api_scraper(limit: int = 100, client: RutubeClient | None = None, full_resync: bool = False):
     """Main function to run the API scraping process."""
     print(f"Starting Rutube API scraper. Scraping limit: {limit} videos")
     
     try:
-        # Fetch videos from API
-        videos = await fetch_channel_videos(limit=limit)
-        print(f"Fetched {len(videos)} videos from Rutube API")
-        
-        # Save collected videos to database
-        if videos:
-            print(f"Saving {len(videos)} videos to database...")
-            new_videos_saved = await save_videos_to_db(videos, "Rutube API Scraper")
-            print(f"Successfully saved {new_videos_saved} new videos to database.")
-            return len(videos)
-        else:
-            print("No videos were found.")
-            return 0
+        # Same lock as the channel's import jobs and refreshes (see _resumable_sync)
+        async with resource_lock(AsyncSessionLocal.kw['bind'], resource_key(sync_state.CHANNEL, CHANNEL_ID)):
+            async def is_known(video_id):
+                async with AsyncSessionLocal() as db:
+                    return await _video_stored(db, video_id)
+
+            async with AsyncSessionLocal() as db:
+                stop_when = await _incremental_stop(db, sync_state.CHANNEL, CHANNEL_ID, full_resync, is_known)
+            if stop_when is not None:
+                print("Incremental sync: stopping at the first already known video")
+
+            # Fetch videos from API and save each batch while the next pages are loading
+            client = client or get_rutube_client()
+            fetched = 0
+            newest = None
+
+            async def write(videos):
+                nonlocal fetched, newest
+                fetched += len(videos)
+                newest = max(filter(None, (newest, _newest_publication(videos))), default=None)
+                return await save_videos_to_db(videos, "Rutube API Scraper", CHANNEL_ID)
+
+            pages = iter_channel_video_pages(CHANNEL_ID, limit, client=client, stop_when=stop_when)
+            counts = _add_counts(await stream_to_writer(pages, write))
+            print(f"Fetched {fetched} videos from Rutube API "
+                  f"(throttled {client.stats()['throttled_seconds']}s in total)")
+            if fetched:
+                print(f"Successfully saved {counts['inserted']} new and {counts['updated']} "
+                      f"updated videos to database.")
+            else:
+                print("No videos were found.")
+
+            async with AsyncSessionLocal() as db:
+                await record_sync(db, sync_state.CHANNEL, CHANNEL_ID, newest,
+                                  new_items=counts.get('inserted', 0), full_resync=stop_when is None)
+                await db.commit()
+            return fetched
             
     except Exception as e:
         print(f"Error during API scraping: {e}")
@@ -368,117 +423,123 @@ async def run_api_scraper(limit: int = 100):
 
 
 # Channel import utilities
-async def fetch_channel_details(channel_id: str):
+async def fetch_channel_details(channel_id: str, client: RutubeClient | None = None):
     """Fetch channel details (name, avatar, description) from Rutube API by channel id."""
-    async with aiohttp.ClientSession() as session:
-        url = f"{RUTUBE_API_BASE}/person/{channel_id}/"
-        try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                if response.status != 200:
-                    print(f"Channel details API returned status {response.status}")
-                    return None
-                data = await response.json()
-                # API may return fields like name, avatar_url, description
-                return {
-                    'rutube_id': str(data.get('id', channel_id)),
-                    'title': data.get('name', f'Channel {channel_id}'),
-                    'avatar_url': data.get('avatar_url', None),
-                    'description': data.get('description', None),
-                }
-        except Exception as e:
-            print(f"Error fetching channel details: {e}")
+    client = client or get_rutube_client()
+    try:
+        status, data = await client.get_json(f"/person/{channel_id}/")
+        if status != 200:
+            print(f"Channel details API returned status {status}")
             return None
+        # API may return fields like name, avatar_url, description
+        fields = extract_channel(data)
+        return {
+            'rutube_id': str(fields['id'] or channel_id),
+            'title': fields['title'] or f'Channel {channel_id}',
+            'avatar_url': fields['avatar_url'],
+            'description': fields['description'],
+        }
+    except Exception as e:
+        print(f"Error fetching channel details: {e}")
+        return None
 
-async def import_rutube_channel(db, rutube_channel_url: str, channel_id: str, channel_videos_limit: int | None = None, scan_playlists: bool = True, per_playlist_limit: int = 100):
-    """Create or update a Channel by rutube channel id. Optionally import recent videos."""
-    # Check existing channel
-    existing = await db.execute(select(Channel).where(Channel.rutube_id == channel_id))
-    channel = existing.scalar_one_or_none()
-
-    details = await fetch_channel_details(channel_id)
-
-    if channel:
-        # update basic fields
-        if details:
-            channel.title = details['title']
-            channel.avatar_url = details.get('avatar_url')
-            channel.description = details.get('description')
-    else:
-        # create new channel
-        channel = Channel(
-            rutube_id=channel_id,
-            title=(details and details['title']) or f"Channel {channel_id}",
-            avatar_url=details.get('avatar_url') if details else None,
-            description=details.get('description') if details else None,
-            is_active=True,
-        )
-        db.add(channel)
-        await db.flush()
-
-    imported_videos = 0
-    playlists_found = 0
-    playlists_processed = 0
-    # Optionally import videos for this channel
+async def import_rutube_channel(db, rutube_channel_url: str, channel_id: str, channel_videos_limit: int | None = None, scan_playlists: bool = True, per_playlist_limit: int = 100, client: RutubeClient | None = None, full_resync: bool = False, progress=None):
+    """Create or update a Channel by rutube channel id. Optionally import recent videos.
+
+    Channel videos are synced incrementally against their watermark unless
+    ``full_resync`` is set; playlists are always walked fully (see
+    _incremental_stop). Each list resumes from its last committed page
+    after a failed run.
+
+    Channel details, channel videos, playlist discovery and per-playlist
+    fetches all run concurrently, bounded by IMPORT_CONCURRENCY fetches at a
+    time. Fetched pages are written in batches while later pages are still
+    loading. All DB writes go through the single session ``db`` and are
+    serialized by a lock, so the run takes as long as the slowest fetch
+    rather than the sum of them.
+    """
+    client = client or get_rutube_client()
+    fetch_slots = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    db_lock = asyncio.Lock()
+
+    async def limited(coro):
+        async with fetch_slots:
+            return await coro
+
+    async def ensure_channel():
+        details = await limited(fetch_channel_details(channel_id, client=client))
+        async with db_lock:
+            row = {
+                'rutube_id': channel_id,
+                'title': (details and details['title']) or f"Channel {channel_id}",
+                'avatar_url': details.get('avatar_url') if details else None,
+                'description': details.get('description') if details else None,
+                'is_active': True,
+            }
+            # Fresh details overwrite basic fields of an existing channel
+            update_columns = ('title', 'avatar_url', 'description') if details else ()
+            channel_ids = await upsert_channels(db, [row], update_columns=update_columns)
+            await db.commit()
+            channel = await db.get(Channel, channel_ids[channel_id], populate_existing=True)
+            return channel
+
+    channel_task = asyncio.create_task(ensure_channel())
+
+    async def import_channel_videos():
+        async def store(videos):
+            return {'imported': await _store_channel_videos(db, channel_task.result(), videos)}
+
+        # channel_task took its fetch slot first, so waiting for it while holding one cannot deadlock
+        result = await _resumable_sync(db, sync_state.CHANNEL, channel_id, iter_channel_video_pages, store,
+                                       limit=channel_videos_limit, client=client, full_resync=full_resync,
+                                       db_lock=db_lock, ready=channel_task, progress=progress,
+                                       fetch_slots=fetch_slots)
+        return result.get('imported', 0)
+
+    async def import_playlist(p):
+        playlist_rutube_id = str(p.get('rutube_id')) if isinstance(p, dict) else str(p)
+        if not playlist_rutube_id:
+            return False
+        playlist_url = f"https://rutube.ru/plst/{playlist_rutube_id}/"
+        # Each batch commits on its own, so a failed playlist only rolls back its current batch
+        await _sync_playlist(db, playlist_url, playlist_rutube_id, per_playlist_limit, client,
+                             full_resync, db_lock, ready=channel_task, progress=progress, fetch_slots=fetch_slots)
+        return True
+
+    async def import_playlists():
+        playlists = await limited(fetch_channel_playlists_by_id(channel_id, client=client))
+        outcomes = await asyncio.gather(*(import_playlist(p) for p in playlists), return_exceptions=True)
+        for p, outcome in zip(playlists, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error importing playlist {p}: {outcome}")
+        return playlists, outcomes
+
+    videos_task = None
     if channel_videos_limit and channel_videos_limit > 0:
-        videos = await fetch_channel_videos_by_id(channel_id, limit=channel_videos_limit)
-        for v in videos:
-            # Use rutube video id if possible; for channel endpoint we didn't add it, so extract from url
-            rutube_video_id = None
-            try:
-                rutube_video_id = v.get('url', '').rstrip('/').split('/')[-1]
-            except Exception:
-                rutube_video_id = None
-
-            existing_movie = await db.execute(select(Movie).where(Movie.rutube_video_id == rutube_video_id))
-            movie = existing_movie.scalar_one_or_none() if rutube_video_id else None
-
-            if movie:
-                # update
-                movie.title = v.get('title', movie.title)
-                movie.thumbnail_url = v.get('thumbnail_url', movie.thumbnail_url)
-                movie.views = v.get('views', movie.views)
-                movie.description = v.get('description', movie.description)
-                movie.duration = format_duration(v.get('duration', 0))
-                movie.genre = v.get('category', movie.genre)
-                movie.source_url = v.get('url', movie.source_url)
-                movie.channel_added_at = parse_channel_added_at(v.get('publication_date', ''))
-                movie.channel_id = channel.id
-            else:
-                # create
-                movie = Movie(
-                    title=v.get('title', ''),
-                    year=extract_year_from_date(v.get('publication_date', '')),
-                    thumbnail_url=v.get('thumbnail_url', ''),
-                    views=v.get('views', 0),
-                    source_url=v.get('url', ''),
-                    duration=format_duration(v.get('duration', 0)),
-                    description=v.get('description', ''),
-                    genre=v.get('category', 'Видео'),
-                    is_active=True,
-                    channel_added_at=parse_channel_added_at(v.get('publication_date', '')),
-                    channel_id=channel.id,
-                    rutube_video_id=rutube_video_id,
-                )
-                db.add(movie)
-                imported_videos += 1
-        await db.flush()
+        videos_task = asyncio.create_task(import_channel_videos())
+    playlists_task = asyncio.create_task(import_playlists()) if scan_playlists else None
 
+    try:
+        channel = await channel_task
+        # Optionally import videos for this channel
+        imported_videos = await videos_task if videos_task else 0
+    except BaseException:
+        for task in (channel_task, videos_task, playlists_task):
+            if task:
+                task.cancel()
+        await asyncio.gather(*(t for t in (channel_task, videos_task, playlists_task) if t), return_exceptions=True)
+        raise
+
+    playlists_found = 0
+    playlists_processed = 0
+    playlists_failed = 0
     # Optionally scan playlists and import them
-    if scan_playlists:
+    if playlists_task:
         try:
-            playlists = await fetch_channel_playlists_by_id(channel_id)
+            playlists, outcomes = await playlists_task
             playlists_found = len(playlists)
-            for p in playlists:
-                try:
-                    playlist_rutube_id = str(p.get('rutube_id')) if isinstance(p, dict) else str(p)
-                    if not playlist_rutube_id:
-                        continue
-                    playlist_url = f"https://rutube.ru/plst/{playlist_rutube_id}/"
-                    await import_rutube_playlist_videos(db, playlist_url, playlist_rutube_id, per_playlist_limit)
-                    playlists_processed += 1
-                    await asyncio.sleep(0.25)
-                except Exception as inner_e:
-                    print(f"Error importing playlist {p}: {inner_e}")
+            playlists_processed = sum(1 for outcome in outcomes if outcome is True)
+            playlists_failed = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
         except Exception as e:
             print(f"Error fetching playlists for channel {channel_id}: {e}")
 
@@ -491,57 +552,50 @@ async def import_rutube_channel(db, rutube_channel_url: str, channel_id: str, ch
         'imported_videos': imported_videos,
         'playlists_found': playlists_found,
         'playlists_imported': playlists_processed,
+        'playlists_failed': playlists_failed,
     }
 
+
+async def _store_channel_videos(db, channel, videos) -> int:
+    """Upsert fetched channel videos by rutube video id. Returns the number of new movies. Does not commit."""
+    videos = [v for v in videos if _video_id_from_url(v.get('url'))]
+    rows = _movie_rows(videos, [channel.id] * len(videos), [_video_id_from_url(v.get('url')) for v in videos])
+    _, imported_videos, _ = await upsert_movies(db, rows)
+    return imported_videos
+
 # Fetch playlists for a channel via Rutube API
-async def fetch_channel_playlists_by_id(channel_id: str, limit: int | None = None):
+async def fetch_channel_playlists_by_id(channel_id: str, limit: int | None = None, client: RutubeClient | None = None,
+                                        page_size: int = PAGE_SIZE, concurrency: int = PAGE_CONCURRENCY):
     """Return list of playlists for a given channel id using Rutube API.
     Each item: { rutube_id, title, image_url?, description? }
     """
-    results = []
-    page = 1
-    page_size = 20
-    async with aiohttp.ClientSession() as session:
-        while True:
-            url_primary = f"{RUTUBE_API_BASE}/playlist/person/{channel_id}/?page={page}&page_size={page_size}"
-            try:
-                async with session.get(url_primary, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                    data = None
-                    if resp.status == 200:
-                        data = await resp.json()
-                    else:
-                        # try alternative endpoint if available
-                        alt = f"{RUTUBE_API_BASE}/person/{channel_id}/playlists/?page={page}&page_size={page_size}"
-                        async with session.get(alt, timeout=aiohttp.ClientTimeout(total=30)) as alt_resp:
-                            if alt_resp.status == 200:
-                                data = await alt_resp.json()
-                            else:
-                                break
-                    items = data.get('results', []) if isinstance(data, dict) else []
-                    if not items:
-                        break
-                    for it in items:
-                        playlist_id = str(it.get('id') or it.get('rutube_id') or '')
-                        if not playlist_id:
-                            continue
-                        results.append({
-                            'rutube_id': playlist_id,
-                            'title': it.get('name') or it.get('title') or f"Playlist {playlist_id}",
-                            'image_url': it.get('thumbnail_url') or it.get('image_url'),
-                            'description': it.get('description')
-                        })
-                    page += 1
-                    if limit and len(results) >= limit:
-                        break
-                    await asyncio.sleep(0.25)
-            except Exception as e:
-                print(f"Error fetching playlists page {page} for channel {channel_id}: {e}")
-                break
-    return results
+    client = client or get_rutube_client()
+
+    async def fetch_page(page: int):
+        url_primary = f"/playlist/person/{channel_id}/?page={page}&page_size={page_size}"
+        status, data = await client.get_json(url_primary)
+        if status != 200:
+            # try alternative endpoint if available
+            alt = f"/person/{channel_id}/playlists/?page={page}&page_size={page_size}"
+            alt_status, data = await client.get_json(alt)
+            if alt_status != 200:
+                return None
+        return data
+
+    items = await collect_pages(fetch_page, limit=limit, page_size=page_size, concurrency=concurrency)
+    return [record for record in map(playlist_record, items) if record is not None]
+
+
+async def _main():
+    try:
+        await run_api_scraper()
+    finally:
+        await close_rutube_client()
+
 
 if __name__ == "__main__":
 
 
     print("Starting Rutube API scraper...")
-    asyncio.run(run_api_scraper())
+    asyncio.run(_main())
 
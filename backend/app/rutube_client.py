@@ -0,0 +1,227 @@
+"""
+Общий HTTP-клиент Rutube API с пулом соединений (одна сессия на всё приложение)
+"""
+import asyncio
+import os
+
+import aiohttp
+
+from app.http_cache import HTTP_CACHE_ENABLED, HTTPResponseCache, cache_key
+from app.rate_limiter import HostRateLimiters, backoff_delay, parse_retry_after
+from app.rutube_decode import decode_json
+
+
+RUTUBE_API_BASE = os.getenv("RUTUBE_API_BASE", "https://rutube.ru/api")
+
+# Connector tuning
+HTTP_LIMIT = int(os.getenv("RUTUBE_HTTP_LIMIT", "100"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("RUTUBE_HTTP_LIMIT_PER_HOST", "10"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("RUTUBE_HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("RUTUBE_HTTP_DNS_CACHE_TTL", "300"))
+
+# Shared timeout policy
+HTTP_TIMEOUT_TOTAL = float(os.getenv("RUTUBE_HTTP_TIMEOUT", "30"))
+HTTP_TIMEOUT_CONNECT = float(os.getenv("RUTUBE_HTTP_CONNECT_TIMEOUT", "10"))
+
+# Retries for a single request (429, 5xx, network errors)
+HTTP_MAX_RETRIES = int(os.getenv("RUTUBE_MAX_RETRIES", "4"))
+
+
+class RutubeAPIError(Exception):
+    """Raised when a request still fails after all retries."""
+
+    def __init__(self, url: str, status: int | None = None, message: str = ""):
+        self.url = url
+        self.status = status
+        detail = f"status {status}" if status is not None else (message or "request failed")
+        super().__init__(f"Rutube API request failed ({detail}): {url}")
+
+
+def _is_retryable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+class RutubeClient:
+    """Long-lived aiohttp session for Rutube API calls.
+
+    Keeps connections alive between requests and caches DNS lookups, so
+    repeated fetches within one import (and across imports) reuse the same
+    TCP/TLS connections instead of paying for a new handshake every time.
+    """
+
+    def __init__(
+        self,
+        base_url: str = RUTUBE_API_BASE,
+        *,
+        limit: int = HTTP_LIMIT,
+        limit_per_host: int = HTTP_LIMIT_PER_HOST,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+        timeout_total: float = HTTP_TIMEOUT_TOTAL,
+        timeout_connect: float = HTTP_TIMEOUT_CONNECT,
+        max_retries: int = HTTP_MAX_RETRIES,
+        rate_limiters: HostRateLimiters | None = None,
+        response_cache: HTTPResponseCache | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout_total, sock_connect=timeout_connect)
+        self.max_retries = max_retries
+        self.rate_limiters = rate_limiters or HostRateLimiters()
+        self.response_cache = response_cache
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    async def start(self):
+        """Open the pooled session (idempotent)."""
+        if not self.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self.closed:
+            raise RuntimeError("RutubeClient is not started")
+        return self._session
+
+    def url(self, path: str) -> str:
+        """Build an absolute API URL from a path like '/video/person/1/'."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def get_json(self, path: str, params: dict | None = None):
+        """GET a JSON document. Returns (status, data); data is None for non-200 responses.
+
+        Requests go through the per-host adaptive rate limiter. 429/5xx
+        responses and network errors are retried up to ``max_retries`` times
+        with jittered backoff (honouring Retry-After); after that
+        RutubeAPIError is raised instead of returning a partial result.
+
+        Bodies are read as raw bytes and decoded by rutube_decode (orjson
+        when installed, big payloads off the event loop).
+
+        With a ``response_cache``, fresh cached responses are returned
+        without a request and stale ones are revalidated conditionally.
+        """
+        url = self.url(path)
+        cache = self.response_cache
+        key = cache_key(url, params)
+        entry = await cache.lookup(key) if cache else None
+        if entry is not None and cache.is_fresh(entry):
+            return 200, await decode_json(entry['body'])
+
+        status, response_headers, body = await self._send(url, params, HTTPResponseCache.conditional_headers(entry))
+        if status == 304 and entry is not None:
+            await cache.revalidated(key, entry, response_headers)
+            return 200, await decode_json(entry['body'])
+        if status != 200:
+            return status, None
+        data = await decode_json(body)
+        if cache:
+            await cache.store(key, body, response_headers, stale=entry)
+        return status, data
+
+    async def get_text(self, path: str, params: dict | None = None):
+        """GET a text document such as an HTML page. Returns (status, text); text is None for non-200.
+
+        Same rate limiter and retries as get_json, no response cache.
+        """
+        status, response_headers, body = await self._send(self.url(path), params)
+        if status != 200:
+            return status, None
+        charset = 'utf-8'
+        content_type = response_headers.get('Content-Type', '')
+        if 'charset=' in content_type:
+            charset = content_type.split('charset=', 1)[1].split(';')[0].strip() or charset
+        return status, body.decode(charset, errors='replace')
+
+    async def _send(self, url: str, params: dict | None = None, headers: dict | None = None):
+        """GET through the limiter with retries. Returns (status, headers, body); body only for 200."""
+        await self.start()
+        limiter = self.rate_limiters.for_url(url)
+        last_error: Exception | None = None
+
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            retry_after = None
+            try:
+                async with self.session.get(url, params=params, headers=headers) as response:
+                    if _is_retryable(response.status):
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        last_error = RutubeAPIError(url, response.status)
+                    else:
+                        limiter.on_success()
+                        body = await response.read() if response.status == 200 else None
+                        return response.status, response.headers, body
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = e
+
+            limiter.on_throttle(retry_after)
+            if attempt < self.max_retries:
+                await limiter.sleep(backoff_delay(attempt, retry_after))
+
+        if isinstance(last_error, RutubeAPIError):
+            raise last_error
+        raise RutubeAPIError(url, message=str(last_error)) from last_error
+
+    def stats(self) -> dict:
+        """Per-host limiter state and total time spent throttled."""
+        stats = {
+            'throttled_seconds': round(self.rate_limiters.throttled_seconds, 3),
+            'hosts': self.rate_limiters.stats(),
+        }
+        if self.response_cache:
+            stats['http_cache'] = self.response_cache.stats()
+        return stats
+
+
+_shared_client: RutubeClient | None = None
+
+
+def get_rutube_client() -> RutubeClient:
+    """Return the process-wide Rutube client (created lazily)."""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = RutubeClient(response_cache=HTTPResponseCache() if HTTP_CACHE_ENABLED else None)
+    return _shared_client
+
+
+async def open_rutube_client() -> RutubeClient:
+    """Start the shared client; called from the FastAPI lifespan and CLI entry points."""
+    client = get_rutube_client()
+    await client.start()
+    return client
+
+
+async def close_rutube_client():
+    """Close the shared client and drop it, so the next use starts a fresh pool."""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
@@ -0,0 +1,176 @@
+"""
+Быстрый разбор ответов Rutube API и извлечение нужных полей по заранее собранной схеме
+"""
+import asyncio
+import json
+import os
+from typing import TypedDict
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used when orjson is not installed
+    orjson = None
+
+
+# Bodies larger than this are parsed in a worker thread instead of on the event loop
+JSON_OFFLOAD_BYTES = int(os.getenv("RUTUBE_JSON_OFFLOAD_BYTES", "262144"))
+
+_EMPTY = (None, '', {}, [])
+
+
+def loads(body: bytes | str):
+    """Parse a JSON document; an empty body decodes to None (like aiohttp's response.json())."""
+    if not body.strip():
+        return None
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+async def decode_json(body: bytes | str):
+    """loads() that keeps big payloads off the event loop."""
+    if len(body) >= JSON_OFFLOAD_BYTES:
+        return await asyncio.to_thread(loads, body)
+    return loads(body)
+
+
+def _getter(paths: tuple, default):
+    """Compile alternative key paths into one function: the first non-empty value wins."""
+    paths = tuple((p,) if isinstance(p, str) else tuple(p) for p in paths)
+    if len(paths) == 1 and len(paths[0]) == 1:
+        key = paths[0][0]
+
+        def get_one(item: dict):
+            value = item.get(key)
+            return default if value in _EMPTY else value
+        return get_one
+
+    def get_first(item: dict):
+        for path in paths:
+            value = item
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+                if value is None:
+                    break
+            if value not in _EMPTY:
+                return value
+        return default
+    return get_first
+
+
+def compile_spec(spec: dict):
+    """Build an extractor from ``{field: (paths, default)}``; ``paths`` are alternative key paths.
+
+    The returned function maps one raw API item to a dict with exactly the
+    spec's fields, without touching the rest of the payload.
+    """
+    getters = tuple((field, _getter(paths, default)) for field, (paths, default) in spec.items())
+
+    def extract(item: dict) -> dict:
+        return {field: get(item) for field, get in getters}
+    return extract
+
+
+class ChannelRef(TypedDict):
+    rutube_id: str
+    title: str
+    avatar_url: str | None
+
+
+class VideoRecord(TypedDict, total=False):
+    title: str
+    url: str
+    thumbnail_url: str
+    views: int
+    duration: int
+    description: str
+    publication_date: str
+    category: str
+    # Only for playlist items, which carry the video id and its channel
+    rutube_video_id: str
+    channel_data: ChannelRef
+
+
+class PlaylistRecord(TypedDict):
+    rutube_id: str
+    title: str
+    image_url: str | None
+    description: str | None
+
+
+extract_video = compile_spec({
+    'id': (('id',), ''),
+    'title': (('title',), ''),
+    'thumbnail_url': (('thumbnail_url',), ''),
+    'views': (('hits',), 0),
+    'duration': (('duration',), 0),
+    'description': (('description',), ''),
+    'publication_date': (('created_ts',), ''),
+    'category': ((('category', 'name'),), 'Видео'),
+})
+
+extract_video_channel = compile_spec({
+    'id': ((('person', 'id'), ('author', 'id')), ''),
+    'title': ((('person', 'name'), ('author', 'name')), ''),
+    'avatar_url': ((('person', 'avatar_url'), ('author', 'avatar_url')), ''),
+})
+
+extract_playlist = compile_spec({
+    'id': (('id', 'rutube_id'), ''),
+    'title': (('name', 'title'), None),
+    'image_url': (('thumbnail_url', 'image_url'), None),
+    'description': (('description',), None),
+})
+
+extract_channel = compile_spec({
+    'id': (('id',), None),
+    'title': (('name',), None),
+    'avatar_url': (('avatar_url',), None),
+    'description': (('description',), None),
+})
+
+
+def looks_like_video(item) -> bool:
+    """True for a video list item (as opposed to channels, playlists or ads in mixed payloads)."""
+    return isinstance(item, dict) and bool(item.get('id')) and 'title' in item and (
+        'hits' in item or 'duration' in item)
+
+
+def video_record(item: dict, with_channel: bool = False) -> VideoRecord:
+    fields = extract_video(item)
+    video_id = fields.pop('id')
+    record: VideoRecord = {'url': f"https://rutube.ru/video/{video_id}/", **fields}
+    if with_channel:
+        channel = extract_video_channel(item)
+        record['rutube_video_id'] = video_id
+        record['channel_data'] = {
+            'rutube_id': str(channel['id']),
+            'title': channel['title'],
+            'avatar_url': channel['avatar_url'],
+        }
+    return record
+
+
+def channel_video_records(items, channel_rutube_id: str | None = None) -> list[VideoRecord]:
+    """Records of the video items in a scraped list, minus videos of other channels (recommendations)."""
+    records = []
+    for item in filter(looks_like_video, items):
+        record = video_record(item, with_channel=True)
+        owner = record['channel_data']['rutube_id']
+        if channel_rutube_id and owner and owner != str(channel_rutube_id):
+            continue
+        records.append(record)
+    return records
+
+
+def playlist_record(item: dict) -> PlaylistRecord | None:
+    fields = extract_playlist(item)
+    playlist_id = str(fields['id'])
+    if not playlist_id:
+        return None
+    return {
+        'rutube_id': playlist_id,
+        'title': fields['title'] or f"Playlist {playlist_id}",
+        'image_url': fields['image_url'],
+        'description': fields['description'],
+    }
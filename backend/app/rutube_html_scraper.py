@@ -0,0 +1,200 @@
+"""
+Скрапинг канала без браузера: HTML страницы по обычному HTTP, встроенное начальное состояние (JSON)
+или разметка карточек, затем страницы продолжения по ссылкам, которые отдаёт сама страница
+"""
+import json
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from app.rutube_client import RutubeClient, get_rutube_client
+from app.rutube_decode import channel_video_records
+
+
+# `window.reduxState = {...}` and similar assignments of the server-rendered state
+STATE_ASSIGNMENT = re.compile(r"window\.[\w$]+\s*=\s*(?=[{\[])")
+VIDEO_HREF = re.compile(r"^(?:https?://rutube\.ru)?/video/([a-zA-Z0-9]+)/?")
+VIEWS_TEXT = re.compile(r"просмотр|views?\b", re.IGNORECASE)
+DURATION_TEXT = re.compile(r"^\d{1,2}(?::\d{2}){1,2}$")
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class _ChannelPageParser(HTMLParser):
+    """Collects inline scripts and the video links of a page in one pass."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.scripts: list[tuple[str, str]] = []
+        self.cards: dict[str, dict] = {}
+        self._script: tuple[str, list] | None = None
+        self._card: dict | None = None
+        # Views are often printed next to the link rather than inside it
+        self._last_card: dict | None = None
+        self._card_depth = 0
+        self._in_time = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._open(tag, dict(attrs), tag in VOID_TAGS)
+
+    def handle_startendtag(self, tag, attrs):
+        self._open(tag, dict(attrs), True)
+
+    def _open(self, tag, attrs, void):
+        if tag == 'script':
+            self._script = ((attrs.get('type') or '').lower(), [])
+        elif tag == 'a' and VIDEO_HREF.match(attrs.get('href') or ''):
+            url = urljoin('https://rutube.ru', attrs['href'])
+            self._card = self.cards.setdefault(url, {
+                'index': len(self.cards), 'url': url, 'title': None,
+                'thumbnail_url': None, 'duration': None, 'views': None,
+            })
+            self._card['title'] = self._card['title'] or attrs.get('title') or attrs.get('aria-label')
+            self._last_card = self._card
+            self._card_depth = 1
+        elif self._card is not None:
+            if tag == 'img' and not self._card['thumbnail_url']:
+                self._card['thumbnail_url'] = attrs.get('src') or attrs.get('data-src')
+                self._card['title'] = self._card['title'] or attrs.get('alt')
+            if void:
+                return
+            self._card_depth += 1
+            if tag == 'time' or any(word in (attrs.get('class') or '') for word in ('duration', 'time')):
+                self._in_time = self._card_depth
+
+    def handle_endtag(self, tag):
+        if tag == 'script' and self._script is not None:
+            kind, parts = self._script
+            self.scripts.append((kind, ''.join(parts)))
+            self._script = None
+        elif self._card is not None:
+            if self._in_time == self._card_depth:
+                self._in_time = 0
+            self._card_depth -= 1
+            if tag == 'a' or self._card_depth <= 0:
+                self._card = None
+                self._in_time = 0
+
+    def handle_data(self, data):
+        if self._script is not None:
+            self._script[1].append(data)
+            return
+        text = data.strip()
+        if not text:
+            return
+        if self._card is None:
+            if self._last_card is not None and VIEWS_TEXT.search(text):
+                self._last_card['views'] = self._last_card['views'] or text
+            return
+        if self._in_time or DURATION_TEXT.match(text):
+            self._card['duration'] = self._card['duration'] or text
+        elif VIEWS_TEXT.search(text):
+            self._card['views'] = self._card['views'] or text
+        elif not self._card['title']:
+            self._card['title'] = text
+
+
+def _script_states(scripts: list[tuple[str, str]]) -> list:
+    """JSON documents embedded in the page: JSON script tags and `window.x = {...}` assignments."""
+    states = []
+    decoder = json.JSONDecoder()
+    for kind, text in scripts:
+        if 'json' in kind:
+            try:
+                states.append(json.loads(text))
+            except ValueError:
+                pass
+            continue
+        for match in STATE_ASSIGNMENT.finditer(text):
+            try:
+                states.append(decoder.raw_decode(text, match.end())[0])
+            except ValueError:
+                # A JS literal that is not plain JSON (undefined, functions, ...)
+                continue
+    return states
+
+
+def parse_channel_page(html: str) -> tuple[list, list[dict]]:
+    """Embedded state documents and video cards (in page order) of a channel page."""
+    parser = _ChannelPageParser()
+    parser.feed(html)
+    parser.close()
+    return _script_states(parser.scripts), list(parser.cards.values())
+
+
+def find_video_lists(state) -> list[dict]:
+    """Every paged list in a state tree: dicts with a ``results`` list (API responses cached by the page)."""
+    found = []
+    stack = [state]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if isinstance(node.get('results'), list):
+                found.append(node)
+            stack.extend(reversed(node.values()))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return found
+
+
+def _api_path(url: str) -> str:
+    """Continuation links point at rutube.ru/api; route them through the client's API base."""
+    parts = urlsplit(url)
+    if '/api/' not in parts.path:
+        return url
+    path = parts.path.split('/api/', 1)[1]
+    return f"/{path}" + (f"?{parts.query}" if parts.query else "")
+
+
+def _continuation(page: dict, channel_rutube_id: str | None) -> str | None:
+    if page.get('next'):
+        return _api_path(page['next'])
+    if page.get('has_next') and channel_rutube_id and page.get('page'):
+        per_page = page.get('per_page') or len(page['results'])
+        return f"/video/person/{channel_rutube_id}/?page={int(page['page']) + 1}&page_size={per_page}"
+    return None
+
+
+async def scrape_channel_html(channel_url: str, limit: int, channel_rutube_id: str | None = None,
+                              client: RutubeClient | None = None) -> tuple[list, list[dict]]:
+    """Videos of a channel page fetched without a browser.
+
+    Returns ``(api_videos, cards)``. Videos found in the embedded state,
+    and on the continuation pages it links to, are records shaped like
+    rutube_api_scraper's. When the page carries no usable state, the video
+    links of the markup are returned as cards (url, title, thumbnail,
+    duration and views text) instead.
+    """
+    client = client or get_rutube_client()
+    status, html = await client.get_text(channel_url)
+    if status != 200:
+        print(f"Channel page {channel_url} returned status {status}")
+        return [], []
+
+    states, cards = parse_channel_page(html)
+    videos = {}
+    continuations = []
+    for state in states:
+        for page in find_video_lists(state):
+            records = channel_video_records(page['results'], channel_rutube_id)
+            if records:
+                videos.update((r['url'], r) for r in records if r['url'] not in videos)
+                continuations.append(_continuation(page, channel_rutube_id))
+
+    if not videos:
+        print(f"No embedded video list in {channel_url}, using {len(cards)} cards from the markup")
+        return [], cards[:limit]
+
+    next_url = next(filter(None, continuations), None)
+    requested = set()
+    while next_url and next_url not in requested and len(videos) < limit:
+        requested.add(next_url)
+        status, page = await client.get_json(next_url)
+        if status != 200 or not isinstance(page, dict) or not isinstance(page.get('results'), list):
+            break
+        for record in channel_video_records(page['results'], channel_rutube_id):
+            videos.setdefault(record['url'], record)
+        next_url = _continuation(page, channel_rutube_id)
+
+    print(f"Collected {len(videos)} videos from the page state of {channel_url} "
+          f"and {len(requested)} continuation pages")
+    return list(videos.values())[:limit], []
@@ -0,0 +1,148 @@
+"""
+Параллельная постраничная загрузка списков Rutube API
+"""
+import asyncio
+import inspect
+import math
+import os
+from collections import deque
+
+
+PAGE_SIZE = int(os.getenv("RUTUBE_API_PAGE_SIZE", "20"))
+PAGE_CONCURRENCY = int(os.getenv("RUTUBE_PAGE_CONCURRENCY", "4"))
+
+
+class Page(list):
+    """Items of one API page; ``number`` is the page they came from (a resume cursor)."""
+
+    def __init__(self, items=(), number: int | None = None):
+        super().__init__(items)
+        self.number = number
+
+
+def _page_results(data) -> list:
+    if not isinstance(data, dict):
+        return []
+    return data.get('results') or []
+
+
+def _total_count(data):
+    """Total number of items if the payload reports it, else None."""
+    for key in ('count', 'total'):
+        value = data.get(key)
+        if isinstance(value, int) and value >= 0:
+            return value
+    return None
+
+
+def _has_next(data, results: list, page_size: int) -> bool:
+    if 'has_next' in data:
+        return bool(data['has_next'])
+    if 'next' in data:
+        return bool(data['next'])
+    # No explicit marker: a full page means there may be more
+    return len(results) >= page_size
+
+
+async def _cut_at_stop(results: list, stop_when) -> tuple[list, bool]:
+    """Drop the first item matching ``stop_when`` and everything after it."""
+    if stop_when is None:
+        return results, False
+    for index, item in enumerate(results):
+        stop = stop_when(item)
+        if inspect.isawaitable(stop):
+            stop = await stop
+        if stop:
+            return results[:index], True
+    return results, False
+
+
+async def iter_pages(fetch_page, *, limit: int | None = None, page_size: int = PAGE_SIZE,
+                     concurrency: int = PAGE_CONCURRENCY, stop_when=None, start_page: int = 1):
+    """Yield Pages of raw result items page by page, in page order.
+
+    ``fetch_page(page)`` must return the decoded JSON page or None when the
+    page is missing. The first page is fetched alone to learn the real page
+    size and either the total count or ``has_next``; the remaining pages are
+    then fetched through a sliding window of at most ``concurrency``
+    requests. Pages past ``limit`` (or past the reported total) are never
+    requested; without a total, at most ``concurrency - 1`` speculative
+    pages past the end may be requested and are discarded.
+
+    ``stop_when(item)`` ends paging at the first matching item (incremental
+    sync: the first already known video); that item is not yielded. It may
+    be a coroutine function, e.g. one that checks the database.
+
+    ``start_page`` resumes an interrupted walk; ``limit`` then counts items
+    from that page on.
+    """
+    first = await fetch_page(start_page)
+    first_results = _page_results(first)
+    if not first_results:
+        return
+
+    results, stopped = await _cut_at_stop(first_results, stop_when)
+    if limit is not None and len(results) >= limit:
+        yield Page(results[:limit], start_page)
+        return
+    if results:
+        yield Page(results, start_page)
+    yielded = len(results)
+
+    if stopped or not _has_next(first, first_results, page_size):
+        return
+
+    # Learn the effective page size: the API may cap page_size silently
+    effective_size = first.get('per_page') if isinstance(first.get('per_page'), int) else None
+    effective_size = effective_size or len(first_results)
+
+    last_page = None
+    total = _total_count(first)
+    if total is not None:
+        last_page = math.ceil(total / effective_size)
+    if limit is not None:
+        by_limit = start_page - 1 + math.ceil(limit / effective_size)
+        last_page = by_limit if last_page is None else min(last_page, by_limit)
+
+    window: deque[tuple[int, asyncio.Task]] = deque()
+    next_page = start_page + 1
+
+    def schedule():
+        nonlocal next_page
+        while len(window) < max(1, concurrency) and (last_page is None or next_page <= last_page):
+            window.append((next_page, asyncio.create_task(fetch_page(next_page))))
+            next_page += 1
+
+    try:
+        schedule()
+        while window:
+            page, task = window.popleft()
+            data = await task
+            page_results = _page_results(data)
+            if not page_results:
+                break
+            results, stopped = await _cut_at_stop(page_results, stop_when)
+            if limit is not None and yielded + len(results) >= limit:
+                yield Page(results[:limit - yielded], page)
+                break
+            if results:
+                yield Page(results, page)
+            yielded += len(results)
+            if stopped or not _has_next(data, page_results, effective_size):
+                break
+            schedule()
+    finally:
+        for _, task in window:
+            task.cancel()
+        if window:
+            await asyncio.gather(*(task for _, task in window), return_exceptions=True)
+
+
+async def collect_pages(fetch_page, *, limit: int | None = None, page_size: int = PAGE_SIZE,
+                        concurrency: int = PAGE_CONCURRENCY, stop_when=None, start_page: int = 1) -> list:
+    """Fetch all pages via iter_pages and return the flattened, ordered items."""
+    items = []
+    async for results in iter_pages(fetch_page, limit=limit, page_size=page_size, concurrency=concurrency,
+                                    stop_when=stop_when, start_page=start_page):
+        items.extend(results)
+    return items
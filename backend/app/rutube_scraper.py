@@ -1,10 +1,9 @@
 import asyncio
+import base64
+import json
 import time
 import re
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
@@ -16,14 +15,33 @@ import sys
 # Add the backend path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.browser_pool import check_cancelled, close_driver_pool, get_driver_pool
 from app.database import AsyncSessionLocal
-from app.models import Movie
-from sqlalchemy import select
+from app.ingest import save_movies, upsert_channels
+from app.normalize import normalize_durations, normalize_views, normalize_years
+from app import rutube_api_scraper
+from app.rutube_decode import channel_video_records, loads
+from app.rutube_client import close_rutube_client
+from app.rutube_html_scraper import scrape_channel_html
 
 
 # --- Config ---
 CHANNEL_URL = os.getenv("RUTUBE_CHANNEL_URL", "https://rutube.ru/channel/32869212/")
 SCRAPE_LIMIT = int(os.getenv("RUTUBE_SCRAPE_LIMIT", "100"))  # Limit to 100 videos for initial run
+# Page data is poorer than the API's, so a repeated scrape only refreshes these fields
+SCRAPE_UPDATE_COLUMNS = ('title', 'views')
+# Readiness waits: document load, new cards after a scroll, and the quiet period
+# (no DOM changes, no network requests) after which the page counts as fully loaded
+SCRAPE_READY_TIMEOUT = float(os.getenv("RUTUBE_SCRAPE_READY_TIMEOUT", "15"))
+SCRAPE_SCROLL_TIMEOUT = float(os.getenv("RUTUBE_SCRAPE_SCROLL_TIMEOUT", "10"))
+SCRAPE_IDLE_MS = int(os.getenv("RUTUBE_SCRAPE_IDLE_MS", "1500"))
+SCRAPE_MAX_SCROLLS = int(os.getenv("RUTUBE_SCRAPE_MAX_SCROLLS", "200"))
+# "xhr": take videos from the JSON the page itself loads while scrolling, cards the
+# page rendered without a request come from the DOM; "dom": read every card from the DOM;
+# "html": no browser, the page HTML and its embedded state are fetched over HTTP
+SCRAPE_MODE = os.getenv("RUTUBE_SCRAPE_MODE", "dom")
+# Responses of the page's own API calls that are inspected for video lists
+XHR_URL_PATTERN = re.compile(os.getenv("RUTUBE_SCRAPE_XHR_PATTERN", r"rutube\.ru/api/"))
 
 def get_with_retry(driver, url, retries=3, delay=5):
     """Attempts to get a URL with retries."""
@@ -37,362 +55,458 @@ def get_with_retry(driver, url, retries=3, delay=5):
                 time.sleep(delay)
     return False
 
-def extract_year_from_date(date_str):
-    """Extract year from publication date string."""
-    if not date_str:
-        return datetime.now().year
+# Card selectors, evaluated in the page by EXTRACT_CARDS_JS
+VIDEO_CARD_XPATHS = [
+    "//div[contains(@class, 'video') and .//a[starts-with(@href, '/video/')]]",
+    "//article[.//a[starts-with(@href, '/video/')]]",
+    "//a[starts-with(@href, '/video/')]//parent::div[contains(@class, 'card') or contains(@class, 'item') or contains(@class, 'video')]"
+]
+CARD_FIELD_XPATHS = {
+    'link': [
+        ".//a[starts-with(@href, '/video/')]",
+        ".//a[contains(@href, '/video/')]"
+    ],
+    'title': [
+        ".//div[@class='video-title']",
+        ".//a[@title]",
+        ".//h3",
+        ".//span[contains(@class, 'title') or contains(@class, 'name') or contains(@class, 'caption')]",
+        ".//div[contains(@class, 'title') or contains(@class, 'name') or contains(@class, 'caption')]"
+    ],
+    'thumbnail': [
+        ".//img[contains(@src, 'imagetools') or contains(@src, 'images')]",
+        ".//img[contains(@alt, 'video') or contains(@alt, 'image')]"
+    ],
+    'duration': [
+        ".//time",
+        ".//span[contains(@class, 'duration') or contains(@class, 'time')]",
+        ".//div[contains(@class, 'duration') or contains(@class, 'time')]"
+    ],
+    'views': [
+        ".//span[contains(text(), 'просмотр') or contains(text(), 'view') or contains(text(), 'тыс.') or contains(text(), 'views') or contains(text(), 'K') or contains(text(), 'M')]",
+        ".//div[contains(text(), 'просмотр') or contains(text(), 'view') or contains(text(), 'тыс.') or contains(text(), 'views') or contains(text(), 'K') or contains(text(), 'M')]"
+    ],
+}
+
+# One round trip for the whole page: arguments are the card XPaths, the field XPaths,
+# URLs already collected and the most cards to return. Cards come back in document order.
+EXTRACT_CARDS_JS = """
+const [cardXPaths, fieldXPaths, seenUrls, limit] = arguments;
+const seen = new Set(seenUrls);
+const first = (node, xpaths) => {
+    for (const xpath of xpaths) {
+        const found = document.evaluate(xpath, node, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        if (found) return found;
+    }
+    return null;
+};
+const text = (el) => el ? (el.innerText || el.textContent || '').trim() : null;
+const cards = document.evaluate(cardXPaths.join(' | '), document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const found = [];
+for (let i = 0; i < cards.snapshotLength && found.length < limit; i++) {
+    const card = cards.snapshotItem(i);
+    const link = first(card, fieldXPaths.link);
+    if (!link || !link.href || seen.has(link.href)) continue;
+    seen.add(link.href);
+    const thumbnail = first(card, fieldXPaths.thumbnail);
+    found.push({
+        index: i,
+        url: link.href,
+        title: text(first(card, fieldXPaths.title)),
+        thumbnail_url: thumbnail ? thumbnail.getAttribute('src') : null,
+        duration: text(first(card, fieldXPaths.duration)),
+        views: text(first(card, fieldXPaths.views)),
+    });
+}
+return {total: cards.snapshotLength, cards: found};
+"""
+
+
+def _card_to_video(card: dict) -> dict:
+    """Shape one card returned by EXTRACT_CARDS_JS like the rest of the scraper expects."""
+    index = card.get('index', 0)
+    url = urljoin('https://rutube.ru', card['url'])
+    video_id_match = re.search(r'/video/([a-zA-Z0-9]+)/?', url)
+    title = card.get('title') or f'Video {index}'
+    return {
+        'url': url,
+        'video_id': video_id_match.group(1) if video_id_match else f'unknown_{index}',
+        'title': title,
+        'thumbnail_url': card.get('thumbnail_url'),
+        'duration': card.get('duration'),
+        'views': card.get('views') or "0",
+        # Publication date and description are not available on card view
+        'publication_date_text': str(datetime.now().date()),  # Placeholder
+        'description': f'Video from Rutube: {title}',
+    }
+
+
+def scrape_video_cards(driver, seen_urls=(), limit: int | None = None):
+    """Extract the video cards of the current page in a single execute_script call.
+
+    Cards whose URL is in ``seen_urls`` are skipped in the browser, so a
+    re-extraction after scrolling only transfers the newly loaded ones.
+    """
+    limit = limit if limit is not None else SCRAPE_LIMIT
+    started = time.perf_counter()
+    try:
+        result = driver.execute_script(EXTRACT_CARDS_JS, VIDEO_CARD_XPATHS, CARD_FIELD_XPATHS,
+                                       list(seen_urls), limit)
+    except Exception as e:
+        print(f"Error extracting video cards: {e}")
+        return []
+
+    videos = [_card_to_video(card) for card in (result or {}).get('cards', []) if card.get('url')]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"Found {(result or {}).get('total', 0)} video elements, {len(videos)} new cards "
+          f"extracted in {elapsed_ms:.0f} ms")
+    return videos
 
-    # Look for 4-digit year in the string
-    year_match = re.search(r'\b(19|20)\d{2}\b', str(date_str))
-    if year_match:
-        return int(year_match.group(0))
+# Resolves as soon as the page holds more distinct video links than arguments[0] ('cards'),
+# once neither the DOM nor the network changed for arguments[2] ms ('idle'), or after
+# arguments[1] ms ('timeout'). Driven by MutationObserver and PerformanceObserver, not polling.
+WAIT_FOR_NEW_CARDS_JS = """
+const [previous, timeoutMs, idleMs, done] = arguments;
+const count = () => new Set(Array.from(document.querySelectorAll('a[href*="/video/"]'), a => a.href)).size;
+let lastActivity = performance.now();
+let finished = false;
+const observers = [];
+const finish = (reason) => {
+    if (finished) return;
+    finished = true;
+    observers.forEach(o => o.disconnect());
+    clearInterval(idleTimer);
+    clearTimeout(deadline);
+    done({count: count(), reason: reason});
+};
+const mutations = new MutationObserver(() => {
+    lastActivity = performance.now();
+    if (count() > previous) finish('cards');
+});
+mutations.observe(document.body, {childList: true, subtree: true});
+observers.push(mutations);
+try {
+    const network = new PerformanceObserver(() => { lastActivity = performance.now(); });
+    network.observe({type: 'resource', buffered: false});
+    observers.push(network);
+} catch (e) {}
+const idleTimer = setInterval(() => {
+    if (performance.now() - lastActivity >= idleMs) finish('idle');
+}, 100);
+const deadline = setTimeout(() => finish('timeout'), timeoutMs);
+if (count() > previous) finish('cards');
+"""
+
+
+def wait_for_document_ready(driver, timeout: float = SCRAPE_READY_TIMEOUT) -> bool:
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+        return True
+    except TimeoutException:
+        print(f"Page was not ready after {timeout}s, extracting what is there")
+        return False
 
-    return datetime.now().year
 
-def parse_views(views_str):
-    """Convert views string to integer."""
-    if not views_str:
-        return 0
-    
-    # Clean the string and try to extract numbers
-    views_clean = re.sub(r'[^\d.,]', '', views_str.replace(' ', ''))
-    
-    if not views_clean:
-        return 0
-    
+def wait_for_new_cards(driver, previous: int, timeout: float = SCRAPE_SCROLL_TIMEOUT,
+                       idle_ms: int = SCRAPE_IDLE_MS) -> dict:
+    """Block until more than ``previous`` video links are on the page, or it goes quiet.
+
+    Returns {'count', 'reason'} with reason 'cards', 'idle', 'timeout' or 'error'.
+    """
     try:
-        # Handle decimal numbers and various formats
-        if '.' in views_clean or ',' in views_clean:
-            views_clean = views_clean.replace(',', '.')
-            num = float(views_clean)
-        else:
-            num = int(views_clean)
-        
-        # Handle common format like "1.2K" or "2.5M"
-        if 'K' in views_str.upper():
-            return int(num * 1000)
-        elif 'M' in views_str.upper():
-            return int(num * 1000000)
-        else:
-            # If no K/M, assume it's already a number
-            return int(num)
-    except ValueError:
-        return 0
-
-def scrape_video_cards(driver):
-    """Scrape video cards from current page."""
-    print("Scraping video cards from current page...")
-    
-    # Wait for page to load
-    time.sleep(3)
-    
-    # Find video elements using multiple selectors to catch most videos
-    video_selectors = [
-        "//div[contains(@class, 'video') and .//a[starts-with(@href, '/video/')]]",
-        "//article[.//a[starts-with(@href, '/video/')]]",
-        "//a[starts-with(@href, '/video/')]//parent::div[contains(@class, 'card') or contains(@class, 'item') or contains(@class, 'video')]"
-    ]
-    
-    video_elements = []
-    for selector in video_selectors:
+        driver.set_script_timeout(timeout + 5)
+        return driver.execute_async_script(WAIT_FOR_NEW_CARDS_JS, previous, int(timeout * 1000), idle_ms)
+    except Exception as e:
+        print(f"Error waiting for new cards: {e}")
+        return {'count': previous, 'reason': 'error'}
+
+
+class XhrCapture:
+    """Video records from the JSON responses the page fetched, read from the performance log.
+
+    Each drain() looks at the network events logged since the previous one,
+    fetches the bodies of finished API responses over DevTools and turns
+    their ``results`` into the same records rutube_api_scraper builds from
+    its own requests. Videos of other channels (recommendations) are dropped.
+    """
+
+    def __init__(self, driver, channel_rutube_id: str | None = None, url_pattern=XHR_URL_PATTERN):
+        self.driver = driver
+        self.channel_rutube_id = channel_rutube_id
+        self.url_pattern = url_pattern
+        self.videos = {}
+        self.responses = 0
+        self._candidates = {}
+
+    def reset(self):
+        """Forget events logged before now (e.g. by the previous page of a pooled browser)."""
+        self._events()
+        self._candidates.clear()
+
+    def _events(self) -> list:
         try:
-            elements = driver.find_elements(By.XPATH, selector)
-            video_elements.extend(elements)
-        except:
-            continue
-    
-    print(f"Found {len(video_elements)} video elements")
-    
-    videos = []
-    for i, element in enumerate(video_elements):
-        if len(videos) >= SCRAPE_LIMIT:
-            print(f"Reached scraping limit of {SCRAPE_LIMIT} videos")
-            break
-            
-        video_info = {}
-        
-        try:
-            # Get video URL and ID
-            link_element = None
-            link_selectors = [
-                ".//a[starts-with(@href, '/video/')]",
-                ".//a[contains(@href, '/video/')]"
-            ]
-            
-            for sel in link_selectors:
-                try:
-                    link_element = element.find_element(By.XPATH, sel)
-                    break
-                except:
-                    continue
-                    
-            if link_element is None:
-                continue  # Skip if no link found
-                
-            relative_url = link_element.get_attribute('href')
-            video_info['url'] = urljoin('https://rutube.ru', relative_url)
-            
-            # Extract video ID from URL
-            video_id_match = re.search(r'/video/([a-zA-Z0-9]+)/?', video_info['url'])
-            if video_id_match:
-                video_info['video_id'] = video_id_match.group(1)
-            else:
-                video_info['video_id'] = f'unknown_{i}'  # Fallback ID
-            
-            # Get video title
-            title_selectors = [
-                ".//div[@class='video-title']",
-                ".//a[@title]",
-                ".//h3",
-                ".//span[contains(@class, 'title') or contains(@class, 'name') or contains(@class, 'caption')]",
-                ".//div[contains(@class, 'title') or contains(@class, 'name') or contains(@class, 'caption')]"
-            ]
-            
-            title_element = None
-            for sel in title_selectors:
-                try:
-                    title_element = element.find_element(By.XPATH, sel)
-                    break
-                except:
-                    continue
-
-            if title_element:
-                video_info['title'] = title_element.text.strip() or f'Video {i}'
-            else:
-                video_info['title'] = f'Video {i}'
-
-            # Try to get thumbnail
-            img_selectors = [
-                ".//img[contains(@src, 'imagetools') or contains(@src, 'images')]",
-                ".//img[contains(@alt, 'video') or contains(@alt, 'image')]"
-            ]
-
-            thumbnail_element = None
-            for sel in img_selectors:
-                try:
-                    thumbnail_element = element.find_element(By.XPATH, sel)
-                    break
-                except:
-                    continue
-
-            if thumbnail_element:
-                video_info['thumbnail_url'] = thumbnail_element.get_attribute('src')
-            else:
-                video_info['thumbnail_url'] = None
-
-            # Try to get duration
-            time_selectors = [
-                ".//time",
-                ".//span[contains(@class, 'duration') or contains(@class, 'time')]",
-                ".//div[contains(@class, 'duration') or contains(@class, 'time')]"
-            ]
-
-            duration_element = None
-            for sel in time_selectors:
-                try:
-                    duration_element = element.find_element(By.XPATH, sel)
-                    break
-                except:
-                    continue
-
-            if duration_element:
-                video_info['duration'] = duration_element.text.strip()
-            else:
-                video_info['duration'] = None
-
-            # Try to get views count
-            views_selectors = [
-                ".//span[contains(text(), 'просмотр') or contains(text(), 'view') or contains(text(), 'тыс.') or contains(text(), 'views') or contains(text(), 'K') or contains(text(), 'M')]",
-                ".//div[contains(text(), 'просмотр') or contains(text(), 'view') or contains(text(), 'тыс.') or contains(text(), 'views') or contains(text(), 'K') or contains(text(), 'M')]"
-            ]
-
-            views_element = None
-            for sel in views_selectors:
-                try:
-                    views_element = element.find_element(By.XPATH, sel)
-                    break
-                except:
-                    continue
-
-            if views_element:
-                video_info['views'] = views_element.text.strip()
-            else:
-                video_info['views'] = "0"
-
-            # Publication date and description might not be available on card view
-            video_info['publication_date_text'] = str(datetime.now().date())  # Placeholder
-            video_info['description'] = f'Video from Rutube: {video_info["title"]}'
-
-            # Add to list if we have required fields
-            if video_info.get('url') and video_info.get('title'):
-                videos.append(video_info)
-                
+            entries = self.driver.get_log("performance")
         except Exception as e:
-            print(f"Error parsing video element {i}: {e}")
-            continue
-    
-    return videos
+            print(f"Performance log is not available: {e}")
+            return []
+        events = []
+        for entry in entries:
+            try:
+                events.append(json.loads(entry['message'])['message'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return events
+
+    def _body(self, request_id: str):
+        try:
+            response = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception:
+            # Evicted from the browser's buffer or not a text response
+            return None
+        body = response.get('body') or ''
+        if response.get('base64Encoded'):
+            body = base64.b64decode(body)
+        try:
+            return loads(body)
+        except ValueError:
+            return None
+
+    def drain(self) -> list:
+        """Records of videos first seen in responses finished since the last call."""
+        finished = []
+        for event in self._events():
+            method, params = event.get('method'), event.get('params', {})
+            if method == 'Network.responseReceived':
+                response = params.get('response', {})
+                if (response.get('status') == 200 and 'json' in (response.get('mimeType') or '')
+                        and self.url_pattern.search(response.get('url') or '')):
+                    self._candidates[params.get('requestId')] = response['url']
+            elif method == 'Network.loadingFinished' and params.get('requestId') in self._candidates:
+                finished.append(params['requestId'])
+
+        new = []
+        for request_id in finished:
+            self._candidates.pop(request_id, None)
+            data = self._body(request_id)
+            items = data.get('results') if isinstance(data, dict) else None
+            if not isinstance(items, list):
+                continue
+            self.responses += 1
+            for record in channel_video_records(items, self.channel_rutube_id):
+                if record['url'] not in self.videos:
+                    self.videos[record['url']] = record
+                    new.append(record)
+        return new
+
+
+def capture_page(driver, page_url, scrape_limit: int | None = None, max_scrolls: int = SCRAPE_MAX_SCROLLS,
+                 channel_rutube_id: str | None = None, cancelled=None) -> tuple[list, list]:
+    """Scroll a page and collect videos from its own API responses.
+
+    Returns ``(api_videos, dom_videos)``: records shaped like
+    rutube_api_scraper's, and DOM cards for videos the page showed without
+    a captured request (typically the server-rendered first screen).
+    """
+    limit = scrape_limit if scrape_limit is not None else SCRAPE_LIMIT
+    capture = XhrCapture(driver, channel_rutube_id)
+    capture.reset()
+
+    print(f"\n--- Capturing page data: {page_url} ---")
+    if not get_with_retry(driver, page_url):
+        print(f"Failed to get page {page_url} after multiple retries.")
+        return [], []
+
+    wait_for_document_ready(driver)
+    state = wait_for_new_cards(driver, 0)
+    capture.drain()
+    scrolls = 0
+
+    # Rendered links also cover videos that arrived without a captured request
+    while max(len(capture.videos), state['count']) < limit:
+        check_cancelled(cancelled)
+        if scrolls >= max_scrolls:
+            print(f"Stopped after {max_scrolls} scrolls")
+            break
+        scrolls += 1
+        links_before = state['count']
+        driver.execute_script("window.scrollTo(0, document.documentElement.scrollHeight);")
+        state = wait_for_new_cards(driver, links_before)
+        new = capture.drain()
+        print(f"Scroll #{scrolls}: {len(new)} videos from {capture.responses} captured responses, "
+              f"{len(capture.videos)} in total")
+        if state['count'] <= links_before and not new:
+            print(f"No new videos after scroll #{scrolls} ({state['reason']}), reached end of content.")
+            break
+
+    api_videos = list(capture.videos.values())[:limit]
+    dom_videos = []
+    if len(api_videos) < limit:
+        dom_videos = scrape_video_cards(driver, seen_urls=capture.videos.keys(), limit=limit - len(api_videos))
+    print(f"Collected {len(api_videos)} videos from page requests and {len(dom_videos)} from the DOM")
+    return api_videos, dom_videos
 
-async def save_videos_to_db(videos, source_name="Rutube Channel"):
-    """Save videos to PostgreSQL database using SQLAlchemy ORM."""
+
+def _channel_id_from_url(url: str) -> str | None:
+    match = re.search(r'/channel/(\d+)', url or '')
+    return match.group(1) if match else None
+
+
+async def save_videos_to_db(videos, source_name="Rutube Channel", channel_url: str = CHANNEL_URL) -> dict:
+    """Save scraped videos: insert new ones, refresh title and views of known ones.
+
+    Returns {'inserted', 'updated', 'skipped'}. Existence is resolved for
+    the whole batch at once (see ingest.save_movies).
+    """
     print(f"Saving {len(videos)} videos from '{source_name}' to PostgreSQL database...")
-    
+
     if not videos:
-        return 0
+        return {'inserted': 0, 'updated': 0, 'skipped': 0}
 
-    new_videos_count = 0
+    # movies.channel_id is NOT NULL: a URL without a channel id falls back to the configured channel,
+    # as in run_scraper and the rutube_videos.db import
+    channel_rutube_id = _channel_id_from_url(channel_url) or rutube_api_scraper.CHANNEL_ID
     async with AsyncSessionLocal() as db:
-        for video in videos:
-            # Check if this video already exists
-            existing_video = await db.execute(
-                select(Movie).where(Movie.source_url == video.get('url'))
-            )
-            existing = existing_video.scalar_one_or_none()
-            
-            if existing is None:
-                # Prepare data for Movie model
-                movie_data = {
-                    'title': video.get('title', ''),
-                    'year': extract_year_from_date(video.get('publication_date_text', '')),
-                    'image_url': video.get('thumbnail_url'),
-                    'thumbnail_url': video.get('thumbnail_url'),
-                    'views': parse_views(video.get('views', '0')),
-                    'source_url': video.get('url'),
-                    'duration': video.get('duration'),
-                    'description': video.get('description', f'Video from {source_name}'),
-                    'genre': 'Видео',  # Default genre for Rutube videos
-                    'rating': None,  # Rating not available from Rutube
-                    'is_active': True,
-                }
-                
-                # Create new movie object and add to database
-                new_movie = Movie(**movie_data)
-                db.add(new_movie)
-                new_videos_count += 1
-        
-        if new_videos_count > 0:
-            await db.commit()
-            print(f"Saved {new_videos_count} new videos to database.")
-        else:
-            print("No new videos were added - all videos already existed in database.")
-    
-    return new_videos_count
-
-def scrape_page(driver, page_url, source_name="Rutube Channel", scrape_limit: int | None = None):
-    """Scrape videos from a single page with scrolling logic."""
+        channel_ids = await upsert_channels(db, [{
+            'rutube_id': channel_rutube_id,
+            'title': f"Channel {channel_rutube_id}",
+            'is_active': True,
+        }])
+        channel_id = channel_ids.get(channel_rutube_id)
+        if channel_id is None:
+            print(f"Channel {channel_rutube_id} could not be resolved, skipping {len(videos)} videos")
+            return {'inserted': 0, 'updated': 0, 'skipped': len(videos)}
+        years = normalize_years(video.get('publication_date_text', '') for video in videos)
+        views = normalize_views(video.get('views', '0') for video in videos)
+        durations = normalize_durations(video.get('duration') for video in videos)
+        rows = [
+            {
+                'title': video.get('title', ''),
+                'year': years[i],
+                'image_url': video.get('thumbnail_url'),
+                'thumbnail_url': video.get('thumbnail_url'),
+                'views': views[i],
+                'source_url': video.get('url'),
+                'duration': durations[i],
+                'description': video.get('description', f'Video from {source_name}'),
+                'genre': 'Видео',  # Default genre for Rutube videos
+                'rating': None,  # Rating not available from Rutube
+                'is_active': True,
+                'channel_id': channel_id,
+                'rutube_video_id': (video.get('url') or '').rstrip('/').split('/')[-1],
+            }
+            for i, video in enumerate(videos)
+        ]
+        counts = await save_movies(db, rows, update_columns=SCRAPE_UPDATE_COLUMNS)
+        await db.commit()
+
+    print(f"Saved videos: {counts['inserted']} new, {counts['updated']} updated, {counts['skipped']} unchanged")
+    return counts
+
+def scrape_page(driver, page_url, source_name="Rutube Channel", scrape_limit: int | None = None,
+                max_scrolls: int = SCRAPE_MAX_SCROLLS, cancelled=None):
+    """Scrape videos from a single page, scrolling until the limit or the end of the list.
+
+    Each scroll waits only until new cards appear (or the page goes quiet),
+    and new cards are extracted right away, so scrolling stops as soon as
+    ``scrape_limit`` videos are collected.
+    """
     limit = scrape_limit if scrape_limit is not None else SCRAPE_LIMIT
-    all_videos = []
+    # Keyed by URL: dedup is a dict lookup and the seen URLs are handed to the extractor
+    all_videos = {}
     
     print(f"\n--- Processing page: {page_url} ---")
     if not get_with_retry(driver, page_url):
         print(f"Failed to get page {page_url} after multiple retries.")
         return []
 
-    time.sleep(5)
+    wait_for_document_ready(driver)
+    state = wait_for_new_cards(driver, 0)
+    scrolls = 0
 
-    scroll_attempts = 0
-    max_scroll_attempts = 3  # Limit scroll attempts to prevent endless scrolling
-    
-    while scroll_attempts < max_scroll_attempts and len(all_videos) < limit:
-        scroll_attempts += 1
-        print(f"\nScroll attempt #{scroll_attempts}/{max_scroll_attempts}...")
-        
-        patience = 3  # Number of times to wait for new content to load
-        patience_counter = 0
-        last_height = driver.execute_script("return document.documentElement.scrollHeight")
-
-        print("Starting complete page scroll with patience...")
-        while patience_counter < patience and len(all_videos) < limit:
-            driver.execute_script("window.scrollTo(0, document.documentElement.scrollHeight);")
-            time.sleep(2)  # Wait for content to load
-            new_height = driver.execute_script("return document.documentElement.scrollHeight")
-
-            if new_height == last_height:
-                patience_counter += 1
-                print(f"Page height unchanged. Attempt {patience_counter}/{patience}...")
-                if patience_counter >= patience:
-                    print("Reached end of scrollable content.")
-                    break
-            else:
-                patience_counter = 0  # Reset counter when new content loads
-            last_height = new_height
-
-        print("\nExtracting video information after scroll...")
-        current_videos = scrape_video_cards(driver)
-        
-        # Filter out duplicates before adding
-        unique_current = []
-        for video in current_videos:
-            if not any(v['url'] == video['url'] for v in all_videos):
-                unique_current.append(video)
-        
-        all_videos.extend(unique_current)
-        current_count = len(all_videos)
-        print(f"Found {len(unique_current)} new unique videos on this scroll, total: {current_count}")
-        
-        if current_count >= limit:
-            print(f"Reached scraping limit of {SCRAPE_LIMIT} videos")
+    while True:
+        check_cancelled(cancelled)
+        for video in scrape_video_cards(driver, seen_urls=all_videos.keys(), limit=limit - len(all_videos)):
+            all_videos.setdefault(video['url'], video)
+        print(f"Collected {len(all_videos)} unique videos after {scrolls} scrolls")
+
+        if len(all_videos) >= limit:
+            print(f"Reached scraping limit of {limit} videos")
+            break
+        if scrolls >= max_scrolls:
+            print(f"Stopped after {max_scrolls} scrolls")
+            break
+
+        scrolls += 1
+        links_before = state['count']
+        driver.execute_script("window.scrollTo(0, document.documentElement.scrollHeight);")
+        state = wait_for_new_cards(driver, links_before)
+        if state['count'] <= links_before:
+            print(f"No new videos after scroll #{scrolls} ({state['reason']}), reached end of content.")
             break
     
     print(f"Collected {len(all_videos)} unique videos from {page_url}")
-    return all_videos[:limit]  # Return only up to the limit
+    return list(all_videos.values())[:limit]  # Return only up to the limit
+
+def _scrape_with_browser(driver, cancelled, mode: str, limit: int, channel_rutube_id: str) -> tuple[list, list]:
+    """Browser part of run_scraper; runs on a browser pool thread. Returns (api_videos, dom_videos)."""
+    if mode == "xhr":
+        return capture_page(driver, CHANNEL_URL, scrape_limit=limit, channel_rutube_id=channel_rutube_id,
+                            cancelled=cancelled)
+    return [], scrape_page(driver, CHANNEL_URL, "Rutube Main Channel", scrape_limit=limit, cancelled=cancelled)
 
-async def run_scraper(limit: int | None = None):
-    """Main function to run the scraping process."""
+
+async def run_scraper(limit: int | None = None, mode: str | None = None):
+    """Main function to run the scraping process (``mode`` overrides RUTUBE_SCRAPE_MODE).
+
+    Browser work runs on the browser pool's threads, so the event loop keeps
+    serving while a page is scrolled; cancelling the call stops the scrape.
+    """
     limit_to_use = limit if limit is not None else SCRAPE_LIMIT
-    print(f"Starting Rutube scraper with PostgreSQL integration. Scraping limit: {limit_to_use} videos")
+    mode = mode or SCRAPE_MODE
+    print(f"Starting Rutube scraper with PostgreSQL integration. Scraping limit: {limit_to_use} videos, mode: {mode}")
+    channel_rutube_id = _channel_id_from_url(CHANNEL_URL) or rutube_api_scraper.CHANNEL_ID
     
-    # Set environment variable to disable crashpad
-    os.environ['CHROME_CRASHPAD_PIPE_NAME'] = ''
-
-    chrome_options = Options()
-    chrome_options.binary_location = "/usr/bin/chromium"
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--disable-software-rasterizer")
-    chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--disable-crash-reporter")
-    chrome_options.add_argument("--crash-dumps-dir=/tmp/crashpad")
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--user-data-dir=/tmp/chrome-user-data")
-    chrome_options.add_argument("--data-path=/tmp/chrome-data")
-    chrome_options.add_argument("--disk-cache-dir=/tmp/chrome-cache")
-    chrome_options.add_argument("--remote-debugging-port=9222")
-    chrome_options.add_argument("--disable-setuid-sandbox")
-    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-
     try:
-        # Use system chromium-driver instead of ChromeDriverManager to avoid permission issues
-        service = Service('/usr/bin/chromedriver')
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        # Execute script to remove webdriver property
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-
-        # Scrape videos from the main channel page
         print(f"Starting to scrape videos from {CHANNEL_URL}")
-        channel_videos = scrape_page(driver, CHANNEL_URL, "Rutube Main Channel", scrape_limit=limit_to_use)
-        
+        if mode == "html":
+            api_videos, cards = await scrape_channel_html(CHANNEL_URL, limit_to_use, channel_rutube_id)
+            channel_videos = [_card_to_video(card) for card in cards]
+        else:
+            # Warm browser from the shared pool: own profile and DevTools port, images/fonts/trackers blocked.
+            # Only XHR capture reads the DevTools network log, so only its browsers record one
+            api_videos, channel_videos = await get_driver_pool(performance_log=mode == "xhr").run(
+                _scrape_with_browser, mode, limit_to_use, channel_rutube_id)
+
         # Save collected videos to database
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        if api_videos:
+            # Exact views, durations and dates: stored like the API scraper's own results
+            print(f"Saving {len(api_videos)} videos captured from page requests...")
+            api_counts = await rutube_api_scraper.save_videos_to_db(api_videos, "Rutube Scraper (XHR)", channel_rutube_id)
+            counts = {key: counts[key] + api_counts[key] for key in counts}
         if channel_videos:
             print(f"Saving {len(channel_videos)} videos to database...")
-            new_videos_saved = await save_videos_to_db(channel_videos, "Rutube Scraper")
-            print(f"Successfully saved {new_videos_saved} new videos to database.")
+            dom_counts = await save_videos_to_db(channel_videos, "Rutube Scraper")
+            counts = {key: counts[key] + dom_counts[key] for key in counts}
+        if api_videos or channel_videos:
+            print(f"Successfully saved {counts['inserted']} new videos to database.")
         else:
             print("No videos were found to save.")
         
-        return len(channel_videos)
+        return len(api_videos) + len(channel_videos)
 
     finally:
-        if 'driver' in locals():
-            driver.quit()
         print("\n\nScraping completed.")
 
+async def _main():
+    try:
+        await run_scraper()
+    finally:
+        close_driver_pool()
+        await close_rutube_client()
+
 if __name__ == "__main__":
     print("Starting Rutube scraper with PostgreSQL integration...")
-    asyncio.run(run_scraper())
\ No newline at end of file
+    asyncio.run(_main())
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""
+Планировщик периодических задач: cron-расписание, jitter, один исполнитель на все реплики
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+from app.database import AsyncSessionLocal
+from app.models import ScheduledRun
+from app.sync_state import as_utc
+
+
+# Upper bound for one sleep, so a run recorded by another replica is noticed
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "60"))
+# Lease lifetime while a job runs; renewed every third of it
+SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", "1800"))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_field(field: str, low: int, high: int) -> set[int]:
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid cron step: {field!r}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week), in UTC.
+
+    Supports ``*``, lists, ranges and steps. Day of week is 0-7 with 0 and 7
+    both Sunday; when both day fields are restricted either may match, as in cron.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _parse_field(fields[4], 0, 7)}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        """First matching minute strictly after ``dt``."""
+        dt = as_utc(dt).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+class ScheduledJob:
+    """A coroutine function run on a cron schedule, delayed by up to ``jitter`` seconds."""
+
+    def __init__(self, name: str, schedule: CronSchedule, func, jitter: float = 0,
+                 lease_ttl: float = SCHEDULER_LEASE_TTL):
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.jitter = jitter
+        self.lease_ttl = lease_ttl
+
+
+async def get_last_run(db, name: str) -> datetime | None:
+    run = await db.get(ScheduledRun, name, populate_existing=True)
+    return as_utc(run.last_run_at) if run else None
+
+
+class Scheduler:
+    """Runs scheduled jobs so that each due run happens once across all replicas.
+
+    Every process runs the loop, but a run only starts under a lease from
+    ``lease_factory(name, ttl)`` (a RedisLease in production) and after
+    re-checking the last run time in the database. The last run is
+    persisted, so a restart does not trigger an extra run; a run missed
+    while every instance was down is made up once at startup.
+    """
+
+    def __init__(self, jobs: list[ScheduledJob], lease_factory, session_factory=AsyncSessionLocal,
+                 poll_interval: float = SCHEDULER_POLL_SECONDS):
+        self.jobs = list(jobs)
+        self.lease_factory = lease_factory
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self._tasks: list[asyncio.Task] = []
+        self._jitter: dict[str, tuple[datetime, float]] = {}
+        self._started_at = _now()
+
+    async def start(self):
+        self._started_at = _now()
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self, job: ScheduledJob):
+        while True:
+            try:
+                delay = await self.run_if_due(job)
+            except Exception as e:  # noqa: BLE001
+                print(f"[scheduler] {job.name}: {e}")
+                delay = self.poll_interval
+            await asyncio.sleep(delay)
+
+    def _fire_at(self, job: ScheduledJob, due: datetime) -> datetime:
+        # One random offset per due time, so the wait does not shift on every check
+        cached = self._jitter.get(job.name)
+        if cached is None or cached[0] != due:
+            cached = (due, random.uniform(0, job.jitter) if job.jitter else 0)
+            self._jitter[job.name] = cached
+        return due + timedelta(seconds=cached[1])
+
+    async def _due(self, job: ScheduledJob) -> datetime:
+        async with self.session_factory() as db:
+            last_run = await get_last_run(db, job.name)
+        # Never run: wait for the first scheduled time instead of running on deploy
+        return job.schedule.next_after(last_run or self._started_at)
+
+    async def run_if_due(self, job: ScheduledJob) -> float:
+        """Run ``job`` if it is due and the lease is free. Returns seconds until the next check."""
+        fire_at = self._fire_at(job, await self._due(job))
+        wait = (fire_at - _now()).total_seconds()
+        if wait > 0:
+            return min(wait, self.poll_interval)
+
+        lease = self.lease_factory(job.name, job.lease_ttl)
+        if not await lease.acquire():
+            # Another replica is running it
+            return self.poll_interval
+        try:
+            # Re-check under the lease: another replica may have just finished this run
+            if await self._due(job) > _now():
+                return 0
+            await self._record(job.name, last_run_at=_now(), last_status="running", last_error=None)
+            try:
+                await job.func()
+            except Exception as e:  # noqa: BLE001
+                print(f"[scheduler] {job.name} failed: {e}")
+                await self._record(job.name, last_finished_at=_now(), last_status="failed", last_error=str(e))
+            else:
+                await self._record(job.name, last_finished_at=_now(), last_status="succeeded")
+        finally:
+            await lease.release()
+        return 0
+
+    async def _record(self, name: str, **values):
+        async with self.session_factory() as db:
+            run = await db.get(ScheduledRun, name)
+            if run is None:
+                run = ScheduledRun(name=name)
+                db.add(run)
+            for key, value in values.items():
+                setattr(run, key, value)
+            await db.commit()
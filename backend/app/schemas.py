@@ -164,4 +164,21 @@ class ChannelWithVideosCount(BaseModel):
     videos_count: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Схемы для фоновых задач импорта
+class ImportJob(BaseModel):
+    id: str
+    kind: str
+    status: str
+    resource_key: Optional[str] = None
+    params: dict
+    progress: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
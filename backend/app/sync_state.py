@@ -0,0 +1,55 @@
+"""
+Состояние инкрементальной синхронизации каналов и плейлистов (водяные знаки)
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.models import SyncState
+
+
+CHANNEL = "channel"
+PLAYLIST = "playlist"
+
+
+def as_utc(dt: datetime | None) -> datetime | None:
+    """Naive datetimes (SQLite, Rutube created_ts) are treated as UTC."""
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+async def get_sync_state(db, resource_type: str, rutube_id: str) -> SyncState | None:
+    result = await db.execute(
+        select(SyncState).where(SyncState.resource_type == resource_type, SyncState.rutube_id == rutube_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_watermark(db, resource_type: str, rutube_id: str) -> datetime | None:
+    """Newest item timestamp seen by the last successful sync, or None if never synced."""
+    state = await get_sync_state(db, resource_type, rutube_id)
+    if state is None or state.last_synced_at is None:
+        return None
+    return as_utc(state.newest_item_at)
+
+
+async def record_sync(db, resource_type: str, rutube_id: str, newest_item_at: datetime | None,
+                      new_items: int = 0, full_resync: bool = False) -> SyncState:
+    """Advance the watermark after a successful sync. Does not commit."""
+    state = await get_sync_state(db, resource_type, rutube_id)
+    if state is None:
+        state = SyncState(resource_type=resource_type, rutube_id=rutube_id)
+        db.add(state)
+
+    now = datetime.now(timezone.utc)
+    current = as_utc(state.newest_item_at)
+    newest_item_at = as_utc(newest_item_at)
+    if newest_item_at is not None and (current is None or newest_item_at > current):
+        state.newest_item_at = newest_item_at
+    state.last_synced_at = now
+    state.last_new_items = new_items
+    if full_resync:
+        state.last_full_sync_at = now
+    await db.flush()
+    return state
@@ -0,0 +1,200 @@
+"""
+Бенчмарк импорта против локальной имитации Rutube API: видео/с, запросы/с,
+SQL-запросов на видео и пиковый RSS для каждого сценария импорта
+(каждый сценарий выполняется в отдельном процессе)
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aiohttp.test_utils import TestServer
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import rutube_api_scraper  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import Movie  # noqa: E402
+from app.rate_limiter import HostRateLimiters  # noqa: E402
+from app.resolution_cache import resolution_cache  # noqa: E402
+from app.rutube_client import RutubeClient  # noqa: E402
+from benchmarks.rutube_stub import StubConfig, add_stub_arguments, build_stub_app, config_from_args  # noqa: E402
+
+
+async def bench_playlist(db_factory, client, config: StubConfig):
+    channel_id = config.channel_ids[0]
+    async with db_factory() as db:
+        for playlist_id in config.playlist_ids(channel_id):
+            await rutube_api_scraper.import_rutube_playlist_videos(
+                db, f"https://rutube.ru/plst/{playlist_id}/", str(playlist_id), config.videos_per_playlist,
+                client=client,
+            )
+
+
+async def bench_channel(db_factory, client, config: StubConfig):
+    for channel_id in config.channel_ids:
+        async with db_factory() as db:
+            await rutube_api_scraper.import_rutube_channel(
+                db, f"https://rutube.ru/channel/{channel_id}/", str(channel_id),
+                channel_videos_limit=config.videos_per_channel, scan_playlists=True,
+                per_playlist_limit=config.videos_per_playlist, client=client,
+            )
+
+
+async def bench_scraper(db_factory, client, config: StubConfig):
+    # run_api_scraper works on the module-level session factory and channel id
+    saved = rutube_api_scraper.AsyncSessionLocal, rutube_api_scraper.CHANNEL_ID
+    rutube_api_scraper.AsyncSessionLocal = db_factory
+    rutube_api_scraper.CHANNEL_ID = str(config.channel_ids[0])
+    try:
+        await rutube_api_scraper.run_api_scraper(limit=config.videos_per_channel, client=client)
+    finally:
+        rutube_api_scraper.AsyncSessionLocal, rutube_api_scraper.CHANNEL_ID = saved
+
+
+SCENARIOS = {
+    "playlist": bench_playlist,
+    "channel": bench_channel,
+    "scraper": bench_scraper,
+}
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextlib.asynccontextmanager
+async def _database(database_url: str | None):
+    """Empty schema for one scenario: a temporary SQLite file unless ``database_url`` is given."""
+    path = None
+    if database_url is None:
+        fd, path = tempfile.mkstemp(prefix="bench_ingest_", suffix=".sqlite")
+        os.close(fd)
+        database_url = f"sqlite+aiosqlite:///{path}"
+    engine = create_async_engine(database_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        yield engine
+    finally:
+        await engine.dispose()
+        if path:
+            os.remove(path)
+
+
+async def run_scenario(name: str, config: StubConfig, database_url: str | None = None,
+                       unthrottled: bool = True, verbose: bool = False) -> dict:
+    """Run one scenario in this process.
+
+    ``peak_rss_mb`` is the process-wide high-water mark (ru_maxrss), so it is
+    the scenario's own peak only in a fresh process; see run_isolated.
+    ``baseline_rss_mb`` is that mark before the scenario started.
+    """
+    baseline_rss = _peak_rss_mb()
+    server = TestServer(build_stub_app(config))
+    await server.start_server()
+    # Without a cap the numbers show the pipeline itself, not the production rate limit
+    limiters = HostRateLimiters(rate=10000, burst=10000, max_rate=10000) if unthrottled else HostRateLimiters()
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    try:
+        async with _database(database_url) as engine:
+            db_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            # The resolution cache is process-wide and must not carry IDs between databases
+            resolution_cache.reset()
+            async with RutubeClient(str(server.make_url("/api")), rate_limiters=limiters) as client:
+                event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+                output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+                started = time.perf_counter()
+                with output:
+                    await SCENARIOS[name](db_factory, client, config)
+                elapsed = time.perf_counter() - started
+                event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+            async with db_factory() as db:
+                videos = (await db.execute(select(func.count()).select_from(Movie))).scalar_one()
+    finally:
+        await server.close()
+
+    stats = server.app["stats"]
+    return {
+        "scenario": name,
+        "seconds": round(elapsed, 3),
+        "videos": videos,
+        "videos_per_sec": round(videos / elapsed, 1) if elapsed else None,
+        "requests": stats["requests"],
+        "requests_per_sec": round(stats["requests"] / elapsed, 1) if elapsed else None,
+        "errors": stats["errors"],
+        "throttled": stats["throttled"],
+        "statements": statements,
+        "statements_per_video": round(statements / videos, 3) if videos else None,
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _run_in_this_process(name: str, config: StubConfig, database_url: str | None, unthrottled: bool,
+                         verbose: bool) -> dict:
+    return asyncio.run(run_scenario(name, config, database_url, unthrottled, verbose))
+
+
+def run_isolated(name: str, config: StubConfig, database_url: str | None = None,
+                 unthrottled: bool = True, verbose: bool = False) -> dict:
+    """Run one scenario in a freshly spawned process, so its peak RSS is not inherited from earlier ones."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run_in_this_process, name, config, database_url, unthrottled, verbose).result()
+
+
+def _print_table(results: list[dict]):
+    columns = ("scenario", "seconds", "videos", "videos_per_sec", "requests", "requests_per_sec",
+               "statements_per_video", "baseline_rss_mb", "peak_rss_mb")
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _main(args):
+    config = config_from_args(args)
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        results.append(run_isolated(name, config, args.database_url, not args.production_limits, args.verbose))
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2, default=str)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Rutube import throughput against the local stub API")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="scenario to run (repeatable); all by default")
+    parser.add_argument("--database-url", default=None,
+                        help="async SQLAlchemy URL of an empty scratch database (tables are dropped); "
+                             "a temporary SQLite file by default")
+    parser.add_argument("--production-limits", action="store_true",
+                        help="use the RUTUBE_RATE_* limiter settings instead of an unlimited limiter")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the importers' own output")
+    add_stub_arguments(parser)
+    _main(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
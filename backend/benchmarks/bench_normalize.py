@@ -0,0 +1,113 @@
+"""
+Бенчмарк нормализации полей видео: построчный разбор без кэша против пакетного
+по колонкам (app.normalize), строк/с для каждого поля
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import normalize  # noqa: E402
+
+
+def make_columns(rows: int, distinct: int, seed: int = 1) -> dict[str, list]:
+    """Field columns shaped like the three import paths produce them, with ``distinct`` values per text field."""
+    rng = random.Random(seed)
+    views_texts = [
+        rng.choice([f"{rng.randint(1, 999)} просмотров", f"{rng.randint(1, 99)},{rng.randint(0, 9)} тыс. просмотров",
+                    f"{rng.randint(1000, 99999):,} views".replace(',', ' '), f"{rng.randint(1, 9)}.{rng.randint(0, 9)}M"])
+        for _ in range(distinct)
+    ]
+    dates = [f"20{rng.randint(10, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00Z"
+             for _ in range(distinct)]
+    clocks = [f"{rng.randint(0, 59)}:{rng.randint(0, 59):02d}" for _ in range(distinct)]
+    return {
+        'views_text': [rng.choice(views_texts) for _ in range(rows)],
+        'views_api': [rng.randint(0, 10_000_000) for _ in range(rows)],
+        'year': [rng.choice(dates) for _ in range(rows)],
+        'published': [rng.choice(dates) for _ in range(rows)],
+        'duration_text': [rng.choice(clocks) for _ in range(rows)],
+        'duration_api': [rng.randint(0, 20_000) for _ in range(rows)],
+    }
+
+
+FIELDS = {
+    'views_text': (normalize._views_from_text, normalize.parse_views, normalize.normalize_views),
+    'views_api': (normalize._views_from_text, normalize.parse_views, normalize.normalize_views),
+    'year': (normalize._year_from_text, normalize.parse_year, normalize.normalize_years),
+    'published': (normalize._datetime_from_text, normalize.parse_datetime, normalize.normalize_datetimes),
+    'duration_text': (normalize._duration_from_text, normalize.format_duration, normalize.normalize_durations),
+    'duration_api': (normalize._duration_from_text, normalize.format_duration, normalize.normalize_durations),
+}
+
+
+def _clear_caches():
+    for cached, _, _ in FIELDS.values():
+        cached.cache_clear()
+
+
+def _rate(rows: int, seconds: float):
+    return round(rows / seconds) if seconds else None
+
+
+def run_field(name: str, column: list) -> dict:
+    cached, public, batch = FIELDS[name]
+    # Swap the cache out once for the whole loop, so the baseline pays no per-row patching
+    setattr(normalize, cached.__name__, cached.__wrapped__)
+    try:
+        started = time.perf_counter()
+        scalar = [public(value) for value in column]
+        scalar_seconds = time.perf_counter() - started
+    finally:
+        setattr(normalize, cached.__name__, cached)
+
+    _clear_caches()
+    started = time.perf_counter()
+    batched = batch(column)
+    batch_seconds = time.perf_counter() - started
+    if batched != scalar:
+        raise AssertionError(f"batch and scalar results differ for {name}")
+    return {
+        "field": name,
+        "rows": len(column),
+        "scalar_rows_per_sec": _rate(len(column), scalar_seconds),
+        "batch_rows_per_sec": _rate(len(column), batch_seconds),
+        "speedup": round(scalar_seconds / batch_seconds, 1) if batch_seconds else None,
+    }
+
+
+def run(rows: int, distinct: int, seed: int = 1) -> list[dict]:
+    columns = make_columns(rows, distinct, seed)
+    return [run_field(name, columns[name]) for name in FIELDS]
+
+
+def _print_table(results: list[dict]):
+    columns = ("field", "rows", "scalar_rows_per_sec", "batch_rows_per_sec", "speedup")
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure field normalization throughput, per row vs per column")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows per column")
+    parser.add_argument("--distinct", type=int, default=2_000, help="distinct values per text column")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.distinct, args.seed)
+    print(f"NumPy: {'yes' if normalize.np is not None else 'no'}")
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "numpy": normalize.np is not None, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
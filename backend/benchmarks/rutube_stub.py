@@ -0,0 +1,189 @@
+"""
+Локальная имитация Rutube API для нагрузочных прогонов импорта: синтетические каналы
+заданного размера, задержка, доля ошибок 5xx и ответов 429
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+
+FIRST_CHANNEL_ID = 1000
+# Newest video of every channel; each next one is an hour older, as Rutube lists them newest first
+NEWEST_VIDEO_AT = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+class StubConfig:
+    """Size of the synthetic catalog and the failure knobs of the stand-in API."""
+
+    def __init__(self, channels: int = 1, videos_per_channel: int = 1000, playlists_per_channel: int = 5,
+                 videos_per_playlist: int = 100, latency_ms: float = 0, latency_jitter_ms: float = 0,
+                 error_rate: float = 0, throttle_rate: float = 0, retry_after: float = 1, seed: int = 0):
+        self.channels = channels
+        self.videos_per_channel = videos_per_channel
+        self.playlists_per_channel = playlists_per_channel
+        self.videos_per_playlist = videos_per_playlist
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+    @property
+    def channel_ids(self) -> list[int]:
+        return [FIRST_CHANNEL_ID + n for n in range(self.channels)]
+
+    def playlist_ids(self, channel_id: int) -> list[int]:
+        return [channel_id * 1000 + n for n in range(self.playlists_per_channel)]
+
+
+def make_video(channel_id: int, number: int) -> dict:
+    """Video ``number`` of a channel (0 is the newest), shaped like a Rutube API list item."""
+    return {
+        "id": f"{channel_id:06x}{number:026x}",
+        "title": f"Channel {channel_id} video {number}",
+        "thumbnail_url": f"https://pic.rutube.ru/video/{channel_id}/{number}.jpg",
+        "hits": (number * 7919) % 100000,
+        "duration": 60 + number % 3600,
+        "description": f"Synthetic video {number} of channel {channel_id}",
+        "created_ts": (NEWEST_VIDEO_AT - timedelta(hours=number)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "category": {"id": 13, "name": "Обучение"},
+        "author": {"id": channel_id, "name": f"Channel {channel_id}", "avatar_url": None},
+    }
+
+
+def _page(request, total: int, make_item) -> web.Response:
+    page = max(1, int(request.query.get("page", 1)))
+    page_size = max(1, int(request.query.get("page_size", 20)))
+    start = (page - 1) * page_size
+    items = [make_item(n) for n in range(start, min(start + page_size, total))]
+    return web.json_response({
+        "results": items,
+        "has_next": start + page_size < total,
+        "page": page,
+        "per_page": page_size,
+    })
+
+
+def build_stub_app(config: StubConfig | None = None) -> web.Application:
+    """aiohttp application serving the Rutube endpoints used by rutube_api_scraper under /api.
+
+    Request counters per endpoint and per outcome are kept in
+    ``app["stats"]``.
+    """
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    channels = set(config.channel_ids)
+    stats = {"requests": 0, "errors": 0, "throttled": 0, "endpoints": {}}
+
+    def channel_or_404(request) -> int:
+        channel_id = int(request.match_info["cid"])
+        if channel_id not in channels:
+            raise web.HTTPNotFound()
+        return channel_id
+
+    @web.middleware
+    async def faults(request, handler):
+        stats["requests"] += 1
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else "?"
+        stats["endpoints"][route] = stats["endpoints"].get(route, 0) + 1
+        if config.latency_ms or config.latency_jitter_ms:
+            delay = config.latency_ms + rng.uniform(0, config.latency_jitter_ms)
+            await asyncio.sleep(delay / 1000)
+        if config.throttle_rate and rng.random() < config.throttle_rate:
+            stats["throttled"] += 1
+            return web.json_response({"detail": "Too many requests"}, status=429,
+                                     headers={"Retry-After": str(config.retry_after)})
+        if config.error_rate and rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return web.json_response({"detail": "Internal error"}, status=500)
+        return await handler(request)
+
+    async def person(request):
+        channel_id = channel_or_404(request)
+        return web.json_response({
+            "id": channel_id,
+            "name": f"Channel {channel_id}",
+            "description": f"Synthetic channel {channel_id}",
+            "avatar_url": f"https://pic.rutube.ru/user/{channel_id}.jpg",
+        })
+
+    async def person_videos(request):
+        channel_id = channel_or_404(request)
+        return _page(request, config.videos_per_channel, lambda n: make_video(channel_id, n))
+
+    async def person_playlists(request):
+        channel_id = channel_or_404(request)
+        playlist_ids = config.playlist_ids(channel_id)
+        return _page(request, len(playlist_ids), lambda n: {
+            "id": playlist_ids[n],
+            "name": f"Playlist {playlist_ids[n]}",
+            "thumbnail_url": None,
+            "description": None,
+        })
+
+    async def playlist_videos(request):
+        playlist_id = int(request.match_info["pid"])
+        channel_id, number = divmod(playlist_id, 1000)
+        if channel_id not in channels or number >= config.playlists_per_channel:
+            raise web.HTTPNotFound()
+        # Playlists of a channel overlap: playlist n starts at video n * 10
+        offset = number * 10
+        total = max(0, min(config.videos_per_playlist, config.videos_per_channel - offset))
+        return _page(request, total, lambda n: make_video(channel_id, offset + n))
+
+    app = web.Application(middlewares=[faults])
+    app["config"] = config
+    app["stats"] = stats
+    app.router.add_get("/api/person/{cid}/", person)
+    app.router.add_get("/api/video/person/{cid}/", person_videos)
+    app.router.add_get("/api/playlist/person/{cid}/", person_playlists)
+    app.router.add_get("/api/video/playlist/{pid}/", playlist_videos)
+    return app
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--videos-per-channel", type=int, default=1000)
+    parser.add_argument("--playlists-per-channel", type=int, default=5)
+    parser.add_argument("--videos-per-playlist", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0, help="extra random delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After of 429 responses, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(
+        channels=args.channels,
+        videos_per_channel=args.videos_per_channel,
+        playlists_per_channel=args.playlists_per_channel,
+        videos_per_playlist=args.videos_per_playlist,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Rutube API on http://HOST:PORT/api")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    config = config_from_args(args)
+    print(f"Channels: {', '.join(map(str, config.channel_ids))}; "
+          f"point RUTUBE_API_BASE at http://{args.host}:{args.port}/api")
+    web.run_app(build_stub_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
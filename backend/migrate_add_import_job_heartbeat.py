@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Migration script to add worker ownership and heartbeat columns to the import_jobs table.
+Run this script once after deploying the backend changes.
+"""
+from sqlalchemy import text
+from app.database import sync_engine
+
+def run_migration():
+    """Add worker_id/heartbeat_at/cancel_requested columns to import_jobs."""
+    with sync_engine.connect() as conn:
+        conn.execute(text("""
+            ALTER TABLE import_jobs
+            ADD COLUMN IF NOT EXISTS worker_id VARCHAR NULL,
+            ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE NULL,
+            ADD COLUMN IF NOT EXISTS cancel_requested BOOLEAN NOT NULL DEFAULT FALSE;
+        """))
+
+        conn.commit()
+        print("Migration completed: added import job heartbeat columns")
+
+if __name__ == "__main__":
+    run_migration()
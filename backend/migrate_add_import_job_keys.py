@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Migration script to add deduplication keys to the import_jobs table.
+Run this script once after deploying the backend changes.
+"""
+from sqlalchemy import text
+from app.database import sync_engine
+
+def run_migration():
+    """Add resource_key/idempotency_key columns and their unique indexes to import_jobs."""
+    with sync_engine.connect() as conn:
+        conn.execute(text("""
+            ALTER TABLE import_jobs
+            ADD COLUMN IF NOT EXISTS resource_key VARCHAR NULL,
+            ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR NULL;
+        """))
+
+        conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS ix_import_jobs_idempotency_key
+            ON import_jobs (idempotency_key);
+        """))
+
+        # At most one queued or running job per playlist/channel
+        conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_import_jobs_active_resource
+            ON import_jobs (resource_key)
+            WHERE status IN ('queued', 'running');
+        """))
+
+        conn.commit()
+        print("Migration completed: added import job deduplication keys")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Migration script to index movies.source_url.
+Run this script once after deploying the backend changes.
+"""
+from sqlalchemy import text
+from app.database import sync_engine
+
+def run_migration():
+    """Create the source_url index used by batched duplicate checks."""
+    with sync_engine.connect() as conn:
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_movies_source_url
+            ON movies (source_url);
+        """))
+
+        conn.commit()
+        print("Migration completed: added movies.source_url index")
+
+if __name__ == "__main__":
+    run_migration()
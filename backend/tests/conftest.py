@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.rate_limiter import HostRateLimiters
+from app.resolution_cache import resolution_cache
+from app.rutube_client import RutubeClient
+
+
+@pytest_asyncio.fixture()
+async def engine():
+    """Temporary SQLite database with all tables created."""
+    fd, path = tempfile.mkstemp(prefix="tmp_test_", suffix=".sqlite")
+    os.close(fd)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    # Кэш ID привязан к конкретной БД
+    resolution_cache.reset()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield engine
+    finally:
+        await engine.dispose()
+        os.remove(path)
+
+
+@pytest_asyncio.fixture()
+async def session_local(engine):
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture()
+async def start_server():
+    """``await start_server(handler)`` serves ``handler`` for every GET under /api/; closed after the test."""
+    servers = []
+
+    async def start(handler):
+        app = web.Application()
+        app.router.add_get("/api/{tail:.*}", handler)
+        server = TestServer(app)
+        await server.start_server()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        await server.close()
+
+
+@pytest.fixture()
+def make_client():
+    """``make_client(server)``: RutubeClient for a test server, without real rate limiting."""
+    def make(server, cache=None, max_retries=3):
+        limiters = HostRateLimiters(rate=1000, burst=1000)
+        return RutubeClient(str(server.make_url("/api")), max_retries=max_retries, rate_limiters=limiters,
+                            response_cache=cache)
+    return make
@@ -0,0 +1,37 @@
+import pytest
+
+from benchmarks.bench_ingest import SCENARIOS, run_isolated, run_scenario
+from benchmarks.bench_normalize import FIELDS as NORMALIZE_FIELDS, run as run_normalize
+from benchmarks.rutube_stub import StubConfig
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+async def test_benchmark_scenarios_run_against_the_stub(scenario):
+    config = StubConfig(videos_per_channel=50, playlists_per_channel=2, videos_per_playlist=30)
+    result = await run_scenario(scenario, config)
+    assert result["videos"] == {"playlist": 40, "channel": 50, "scraper": 50}[scenario]
+    assert result["requests"] > 0 and result["statements_per_video"] > 0
+
+
+@pytest.mark.asyncio
+async def test_stub_faults_are_retried_by_the_client():
+    config = StubConfig(videos_per_channel=100, playlists_per_channel=0, error_rate=0.2, throttle_rate=0.2,
+                        retry_after=0, seed=3)
+    result = await run_scenario("scraper", config)
+    assert result["videos"] == 100
+    assert result["errors"] + result["throttled"] > 0
+
+
+def test_isolated_scenario_reports_its_own_peak_rss():
+    config = StubConfig(videos_per_channel=20, playlists_per_channel=1, videos_per_playlist=10)
+    result = run_isolated("playlist", config)
+    assert result["videos"] == 10
+    # Исходный уровень и пик измерены в отдельном процессе сценария
+    assert 0 < result["baseline_rss_mb"] <= result["peak_rss_mb"]
+
+
+def test_normalize_benchmark_reports_every_field():
+    results = run_normalize(rows=500, distinct=20)
+    assert [r["field"] for r in results] == list(NORMALIZE_FIELDS)
+    assert all(r["batch_rows_per_sec"] and r["scalar_rows_per_sec"] for r in results)
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.browser_pool import BLOCKED_DOMAINS, DriverPool, block_heavy_resources, check_cancelled
+
+
+class FakeDriver:
+    def __init__(self, profile_dir, port):
+        self.profile_dir = profile_dir
+        self.port = port
+        self.closed = False
+        self.commands = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.commands.append((command, params))
+
+    def quit(self):
+        self.closed = True
+
+
+def make_pool(**kwargs) -> tuple[DriverPool, list[FakeDriver]]:
+    started = []
+
+    def factory(profile_dir, port):
+        driver = FakeDriver(profile_dir, port)
+        started.append(driver)
+        return driver
+
+    kwargs.setdefault("max_rss_mb", 0)
+    return DriverPool(factory=factory, **kwargs), started
+
+
+def test_driver_is_reused_warm():
+    pool, started = make_pool(size=2)
+    with pool.driver() as first:
+        pass
+    with pool.driver() as second:
+        pass
+    assert first is second
+    assert len(started) == 1 and not first.closed
+    pool.close()
+    assert first.closed and not os.path.exists(first.profile_dir)
+
+
+def test_driver_is_recycled_after_max_pages():
+    pool, started = make_pool(size=1, max_pages=2)
+    for _ in range(5):
+        with pool.driver():
+            pass
+    assert len(started) == 3
+    assert [d.closed for d in started] == [True, True, False]
+    assert pool.stats()["recycled"] == 2
+
+
+def test_driver_is_discarded_after_failed_scrape():
+    pool, started = make_pool(size=1)
+    with pytest.raises(RuntimeError):
+        with pool.driver():
+            raise RuntimeError("page crashed")
+    with pool.driver() as driver:
+        pass
+    assert started[0].closed
+    assert driver is started[1]
+
+
+def test_concurrent_checkouts_are_isolated_and_bounded():
+    pool, started = make_pool(size=2)
+    in_use, peak = 0, 0
+    lock = threading.Lock()
+
+    def scrape():
+        nonlocal in_use, peak
+        with pool.driver():
+            with lock:
+                in_use += 1
+                peak = max(peak, in_use)
+            time.sleep(0.05)
+            with lock:
+                in_use -= 1
+
+    threads = [threading.Thread(target=scrape) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak == 2
+    assert len(started) == 2
+    assert len({d.profile_dir for d in started}) == 2
+    assert len({d.port for d in started}) == 2
+    pool.close()
+
+
+def test_pools_sharing_slots_run_at_most_size_browsers():
+    started = []
+
+    def factory(profile_dir, port):
+        driver = FakeDriver(profile_dir, port)
+        started.append(driver)
+        return driver
+
+    dom = DriverPool(size=2, factory=factory, max_rss_mb=0)
+    xhr = DriverPool(size=5, factory=factory, max_rss_mb=0, shares_with=dom)
+    assert xhr.size == 2
+
+    # Тёплые браузеры одного пула уступают место новому браузеру другого
+    with dom.driver(), dom.driver():
+        pass
+    with xhr.driver() as driver:
+        assert sum(not d.closed for d in started) == 2
+    assert driver is started[2] and started[0].closed != started[1].closed
+    in_use, peak, peak_open = 0, 0, 0
+    lock = threading.Lock()
+
+    def scrape(pool):
+        nonlocal in_use, peak, peak_open
+        with pool.driver():
+            with lock:
+                in_use += 1
+                peak = max(peak, in_use)
+                peak_open = max(peak_open, sum(not d.closed for d in started))
+            time.sleep(0.02)
+            with lock:
+                in_use -= 1
+
+    # DOM-скрапинг и перехват XHR вперемешку: общий лимит браузеров на оба пула
+    threads = [threading.Thread(target=scrape, args=(dom if n % 2 else xhr,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak == 2 and peak_open <= 2
+    assert sum(not d.closed for d in started) <= 2
+    dom.close()
+    xhr.close()
+
+
+def test_acquire_times_out_when_pool_is_busy():
+    pool, _ = make_pool(size=1, acquire_timeout=0.05)
+    with pool.driver():
+        with pytest.raises(TimeoutError):
+            with pool.driver():
+                pass
+
+
+def test_block_heavy_resources_sends_devtools_commands():
+    driver = FakeDriver("/tmp/x", 0)
+    block_heavy_resources(driver, patterns=["*.png"])
+    commands = dict(driver.commands)
+    assert "Network.enable" in commands
+    blocked = commands["Network.setBlockedURLs"]["urls"]
+    assert "*.png" in blocked
+    assert f"*{BLOCKED_DOMAINS[0]}*" in blocked
+    assert "webdriver" in commands["Page.addScriptToEvaluateOnNewDocument"]["source"]
+
+
+@pytest.mark.asyncio
+async def test_run_keeps_event_loop_free_and_caps_browsers():
+    pool, started = make_pool(size=2)
+    in_use, peak = 0, 0
+    lock = threading.Lock()
+
+    def scrape(driver, cancelled, n):
+        nonlocal in_use, peak
+        assert threading.current_thread() is not threading.main_thread()
+        with lock:
+            in_use += 1
+            peak = max(peak, in_use)
+        time.sleep(0.05)  # blocking, like a WebDriver call
+        with lock:
+            in_use -= 1
+        return n
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    results = await asyncio.gather(*(pool.run(scrape, n) for n in range(6)))
+    ticking.cancel()
+
+    assert results == list(range(6))
+    assert peak == 2 and len(started) == 2
+    # The loop kept running while the three rounds of blocking jobs did
+    assert ticks >= 10
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_stops_cooperative_job_and_keeps_browser():
+    pool, started = make_pool(size=1)
+    entered = threading.Event()
+
+    def scrape(driver, cancelled):
+        entered.set()
+        while True:
+            check_cancelled(cancelled)
+            time.sleep(0.01)
+
+    task = asyncio.create_task(pool.run(scrape))
+    await asyncio.to_thread(entered.wait, 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert pool.stats()["cancelled"] == 1
+    assert not started[0].closed
+    assert await pool.run(lambda driver, cancelled: driver) is started[0]
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_kills_browser_of_stuck_job():
+    pool, started = make_pool(size=1)
+    entered = threading.Event()
+
+    def scrape(driver, cancelled):
+        entered.set()
+        # Ignores the flag, like a WebDriver call that only returns once the browser is gone
+        while not driver.closed:
+            time.sleep(0.01)
+        raise RuntimeError("browser went away")
+
+    task = asyncio.create_task(pool.run(scrape, cancel_grace=0.05))
+    await asyncio.to_thread(entered.wait, 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    await asyncio.sleep(0.05)
+    assert started[0].closed
+    assert await pool.run(lambda driver, cancelled: driver) is started[1]
+    pool.close()
+
+
+
+@pytest.mark.parametrize("performance_log", [False, True])
+def test_performance_log_is_only_recorded_when_asked(monkeypatch, performance_log):
+    from selenium import webdriver
+
+    from app import browser_pool
+
+    created = []
+
+    class Chrome(FakeDriver):
+        def __init__(self, service, options):
+            super().__init__("/tmp/x", 0)
+            created.append(options.to_capabilities())
+
+    monkeypatch.setattr(webdriver, "Chrome", Chrome)
+    try:
+        browser_pool.get_driver_pool(performance_log=performance_log).factory("/tmp/x", 0)
+        # DOM scraping and XHR capture never share a browser, but share the browser limit
+        other = browser_pool.get_driver_pool(not performance_log)
+        assert other is not browser_pool.get_driver_pool(performance_log)
+        assert other._slots is browser_pool.get_driver_pool(performance_log)._slots
+    finally:
+        browser_pool.close_driver_pool()
+    assert ("goog:loggingPrefs" in created[0]) is performance_log
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+from aiohttp import web
+
+from app.http_cache import HTTPResponseCache, cache_key
+
+
+def etag_handler(calls, headers=None):
+    async def handler(request):
+        calls.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.json_response({"id": 1, "name": "Канал"}, headers={"ETag": '"v1"', **(headers or {})})
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_fresh_entry_is_served_without_request(tmp_path, start_server, make_client):
+    calls = []
+    server = await start_server(etag_handler(calls))
+    cache = HTTPResponseCache(str(tmp_path), ttl=60)
+    async with make_client(server, cache=cache) as client:
+        first = await client.get_json("/person/1/")
+        second = await client.get_json("/person/1/")
+
+    assert first == second == (200, {"id": 1, "name": "Канал"})
+    assert len(calls) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "revalidations": 0, "stores": 1, "evictions": 0}
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_revalidated_with_etag(tmp_path, start_server, make_client):
+    calls = []
+    server = await start_server(etag_handler(calls))
+    cache = HTTPResponseCache(str(tmp_path), ttl=0)
+    async with make_client(server, cache=cache) as client:
+        await client.get_json("/person/1/")
+        status, data = await client.get_json("/person/1/")
+
+    assert (status, data) == (200, {"id": 1, "name": "Канал"})
+    assert calls == [None, '"v1"']
+    assert cache.revalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_no_store_responses_are_not_cached(tmp_path, start_server, make_client):
+    calls = []
+    server = await start_server(etag_handler(calls, {"Cache-Control": "no-store"}))
+    cache = HTTPResponseCache(str(tmp_path), ttl=60)
+    async with make_client(server, cache=cache) as client:
+        await client.get_json("/person/1/")
+        await client.get_json("/person/1/")
+
+    assert calls == [None, None]
+    assert cache.stores == 0
+
+
+def test_cache_key_includes_sorted_params():
+    assert cache_key("https://rutube.ru/api/x/", {"b": 2, "a": 1}) == "https://rutube.ru/api/x/?a=1&b=2"
+    assert cache_key("https://rutube.ru/api/x/?page=1", {"a": 1}) == "https://rutube.ru/api/x/?page=1&a=1"
+
+
+@pytest.mark.asyncio
+async def test_store_prunes_old_and_oversized_entries(tmp_path):
+    cache = HTTPResponseCache(str(tmp_path), ttl=60, max_bytes=3000, max_age=3600, prune_every=1)
+    body = os.urandom(1000)  # не сжимается: ~1 КБ на запись
+    for n in range(5):
+        await cache.store(f"https://rutube.ru/api/{n}", body, {"ETag": '"v1"'})
+        # Разные mtime, чтобы порядок вытеснения был определён
+        path = cache._path(f"https://rutube.ru/api/{n}")
+        os.utime(path, (time.time() - 100 + n, time.time() - 100 + n))
+
+    sizes = [os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(tmp_path) for f in files]
+    assert sum(sizes) <= 3000
+    # Вытесняются самые старые записи, свежие остаются
+    assert await cache.lookup("https://rutube.ru/api/4") is not None
+    assert await cache.lookup("https://rutube.ru/api/0") is None
+
+    # Запись с валидаторами, не обновлявшаяся дольше max_age, удаляется при следующем store
+    old = cache._path("https://rutube.ru/api/4")
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    await cache.store("https://rutube.ru/api/new", b"{}", {})
+    assert not os.path.exists(old)
+    assert cache.evictions >= 3
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import import_rutube_data
+from app.import_rutube_data import STAGE_COLUMNS, _movie_rows, _stage, import_rutube_data_to_movies, stage_table
+from app.models import Channel, Movie
+
+
+@pytest.fixture()
+def legacy_db():
+    """rutube_videos.db of the old scraper: 25 videos, one repeated, one without source."""
+    fd, path = tempfile.mkstemp(prefix="tmp_rutube_videos_", suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE videos (
+            id INTEGER PRIMARY KEY, title TEXT, url TEXT, thumbnail_url TEXT, duration TEXT, views TEXT,
+            publication_date_text TEXT, source_name TEXT, scraped_at TEXT
+        )
+    """)
+    rows = [
+        (f"Video {n}", f"https://rutube.ru/video/v{n}/", None, "10:00", "123 просмотра", "2023-05-01",
+         "Rutube Main Channel", "2024-01-01 10:00:00")
+        for n in range(25)
+    ]
+    rows.append(rows[3])
+    rows.append(("No source", "https://rutube.ru/video/x/", None, None, "1", None, None, None))
+    conn.executemany("""
+        INSERT INTO videos (title, url, thumbnail_url, duration, views, publication_date_text, source_name,
+                            scraped_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    try:
+        yield path
+    finally:
+        os.remove(path)
+
+
+@pytest.mark.asyncio
+async def test_import_streams_chunks_and_skips_known_videos(engine, legacy_db, monkeypatch):
+    monkeypatch.setattr(import_rutube_data, "LEGACY_CHANNEL_ID", "777")
+    async with AsyncSession(engine) as db:
+        channel = Channel(rutube_id="777", title="Main")
+        db.add(channel)
+        await db.flush()
+        channel_id = channel.id
+        # Already stored by the API importer
+        db.add(Movie(title="known", source_url="https://rutube.ru/video/v0/", channel_id=channel_id,
+                     rutube_video_id="v0"))
+        db.add(Movie(title="known", source_url="https://rutube.ru/video/v1", channel_id=channel_id,
+                     rutube_video_id="v1"))
+        await db.commit()
+
+    counts = await import_rutube_data_to_movies(legacy_db, chunk_size=7, engine=engine)
+
+    assert (counts['read'], counts['inserted'], counts['skipped']) == (26, 23, 3)
+    assert counts['rows_per_sec'] > 0
+    async with AsyncSession(engine) as db:
+        assert await db.scalar(select(func.count()).select_from(Movie)) == 25
+        assert await db.scalar(select(func.count()).select_from(Movie).where(Movie.channel_id != channel_id)) == 0
+        movie = (await db.execute(select(Movie).where(Movie.rutube_video_id == "v5"))).scalar_one()
+        assert (movie.year, movie.views, movie.description) == (2023, 123, "Видео с Rutube Main Channel")
+
+    again = await import_rutube_data_to_movies(legacy_db, chunk_size=10, engine=engine)
+    assert (again['inserted'], again['skipped']) == (0, 26)
+
+
+@pytest.mark.asyncio
+async def test_import_without_dump_does_nothing(engine, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    counts = await import_rutube_data_to_movies(str(tmp_path / "missing.db"), engine=engine)
+    assert counts == {'read': 0, 'inserted': 0, 'skipped': 0}
+
+
+@pytest.mark.asyncio
+async def test_stage_copies_records_in_stage_column_order_on_postgresql():
+    copied = []
+
+    class AsyncpgConnection:
+        async def copy_records_to_table(self, table_name, *, records, columns):
+            copied.append((table_name, records, columns))
+
+    class Connection:
+        dialect = SimpleNamespace(name="postgresql")
+
+        async def get_raw_connection(self):
+            return SimpleNamespace(driver_connection=AsyncpgConnection())
+
+    added_at = datetime(2024, 1, 2, 3, 4, 5)
+    rows = _movie_rows([
+        (1, "Video", "https://rutube.ru/video/abc/", None, "10:00", "1,2 тыс.", "2023-05-01", "Main", None),
+        (2, "No id", "https://rutube.ru/plst/1/", "https://pic/2.jpg", None, None, None, None, None),
+    ], channel_id=7, added_at=added_at)
+
+    await _stage(Connection(), rows)
+
+    table_name, records, columns = copied[0]
+    assert table_name == stage_table.name
+    # Порядок колонок COPY совпадает с временной таблицей и с записями
+    assert list(columns) == list(STAGE_COLUMNS) == [c.name for c in stage_table.columns]
+    assert records == [tuple(row[column] for column in STAGE_COLUMNS) for row in rows]
+    first, second = (dict(zip(columns, record)) for record in records)
+    # asyncpg получает значения как есть: datetime без строкового представления, None как NULL
+    assert first['added_at'] is added_at and isinstance(first['added_at'], datetime)
+    assert (first['views'], first['year'], first['rutube_video_id']) == (1200, 2023, "abc")
+    assert first['image_url'] is None and first['rating'] is None
+    assert second['rutube_video_id'] is None and second['image_url'] == "https://pic/2.jpg"
+    assert second['channel_id'] == 7
@@ -0,0 +1,123 @@
+
+import pytest
+from sqlalchemy import event, func, select
+
+from app import rutube_api_scraper
+from app.ingest import save_movies
+from app.models import Channel, Movie
+from app.resolution_cache import ResolutionCache
+
+
+def movie_row(video_id: str, channel_id: int, views: int = 10) -> dict:
+    return {
+        'title': f"Video {video_id}",
+        'views': views,
+        'source_url': f"https://rutube.ru/video/{video_id}/",
+        'channel_id': channel_id,
+        'rutube_video_id': video_id,
+    }
+
+
+async def add_channel(db) -> int:
+    channel = Channel(rutube_id="100", title="c")
+    db.add(channel)
+    await db.flush()
+    return channel.id
+
+
+@pytest.mark.asyncio
+async def test_save_movies_counts_inserted_updated_and_skipped(session_local):
+    async with session_local() as db:
+        channel_id = await add_channel(db)
+        counts = await save_movies(db, [movie_row(f"v{i}", channel_id) for i in range(5)])
+        assert counts == {'inserted': 5, 'updated': 0, 'skipped': 0}
+        await db.commit()
+
+        rows = [movie_row(f"v{i}", channel_id) for i in range(5)]
+        rows[0]['views'] = 99                                  # изменилось
+        rows.append(movie_row("v5", channel_id))               # новое
+        rows.append(movie_row("v5", channel_id))               # повтор в пакете
+        rows.append(movie_row("", channel_id))                 # без ID
+        counts = await save_movies(db, rows, update_columns=('views',))
+        await db.commit()
+        assert counts == {'inserted': 1, 'updated': 1, 'skipped': 6}
+
+        assert await db.scalar(select(Movie.views).where(Movie.rutube_video_id == "v0")) == 99
+        assert await db.scalar(select(func.count()).select_from(Movie)) == 6
+
+
+@pytest.mark.asyncio
+async def test_legacy_rows_are_matched_by_source_url(session_local):
+    async with session_local() as db:
+        channel_id = await add_channel(db)
+        db.add(Movie(title="old", views=1, source_url="https://rutube.ru/video/abc/", channel_id=channel_id))
+        await db.commit()
+
+        counts = await save_movies(db, [movie_row("abc", channel_id, views=5)], cache=ResolutionCache())
+        await db.commit()
+
+        assert counts == {'inserted': 0, 'updated': 1, 'skipped': 0}
+        movie = (await db.execute(select(Movie))).scalar_one()
+        assert (movie.rutube_video_id, movie.views) == ("abc", 5)
+
+
+@pytest.mark.asyncio
+async def test_legacy_row_added_after_warm_is_still_matched_by_source_url(session_local):
+    cache = ResolutionCache()
+    async with session_local() as db:
+        channel_id = await add_channel(db)
+        await cache.warm(db)
+        # Записано другим воркером уже после прогрева: фильтр Блума о нём не знает
+        db.add(Movie(title="old", views=1, source_url="https://rutube.ru/video/abc/", channel_id=channel_id))
+        await db.commit()
+        assert cache.definitely_new("abc")
+
+        counts = await save_movies(db, [movie_row("abc", channel_id, views=5)], cache=cache)
+        await db.commit()
+
+        assert counts == {'inserted': 0, 'updated': 1, 'skipped': 0}
+        movie = (await db.execute(select(Movie))).scalar_one()
+        assert (movie.rutube_video_id, movie.views) == ("abc", 5)
+
+
+@pytest.mark.asyncio
+async def test_save_movies_statement_count_does_not_grow_with_table(session_local):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async with session_local() as db:
+        channel_id = await add_channel(db)
+        sync_engine = db.get_bind()
+        event.listen(sync_engine, "before_cursor_execute", count_statement)
+        try:
+            counts = []
+            for start in (0, 50, 100):
+                statements.clear()
+                # Холодный кэш: существование проверяется запросом на весь пакет
+                rows = [movie_row(f"v{i}", channel_id) for i in range(start, start + 60)]
+                counts.append(await save_movies(db, rows, cache=ResolutionCache()))
+                await db.commit()
+                assert len([s for s in statements if s.lstrip().upper().startswith(("SELECT", "INSERT"))]) <= 3
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", count_statement)
+
+    assert counts[1] == {'inserted': 50, 'updated': 0, 'skipped': 10}
+
+
+@pytest.mark.asyncio
+async def test_api_save_videos_to_db_returns_counts(session_local, monkeypatch):
+    monkeypatch.setattr(rutube_api_scraper, "AsyncSessionLocal", session_local)
+    videos = [
+        {'url': f"https://rutube.ru/video/v{i}/", 'title': f"Video {i}", 'views': 3,
+         'publication_date': "2024-05-01T10:00:00"}
+        for i in range(3)
+    ]
+    assert await rutube_api_scraper.save_videos_to_db(videos, channel_rutube_id="100") == {
+        'inserted': 3, 'updated': 0, 'skipped': 0,
+    }
+    videos[0]['views'] = 30
+    assert await rutube_api_scraper.save_videos_to_db(videos, channel_rutube_id="100") == {
+        'inserted': 0, 'updated': 1, 'skipped': 2,
+    }
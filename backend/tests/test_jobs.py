@@ -0,0 +1,223 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, IdempotencyKeyReused, JobQueue
+from app.models import ImportJob
+
+
+async def wait_for_status(queue: JobQueue, job_id: str, *statuses: str, timeout: float = 5):
+    async def poll():
+        while True:
+            job = await queue.get(job_id)
+            if job.status in statuses:
+                return job
+            await asyncio.sleep(0.01)
+    return await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_job_runs_and_records_progress_and_result(session_local):
+    async def handler(db, params, progress):
+        await progress({"videos": 20, "imported": 20})
+        await progress({"videos": 5, "imported": 3})
+        return {"playlist_id": params["n"]}
+
+    queue = JobQueue({"playlist": handler}, concurrency=1, session_factory=session_local)
+    await queue.start()
+    try:
+        job = await queue.submit("playlist", {"n": 7})
+        assert job.status == QUEUED
+        job = await wait_for_status(queue, job.id, SUCCEEDED)
+    finally:
+        await queue.drain(timeout=1)
+
+    assert job.result == {"playlist_id": 7}
+    assert job.progress == {"videos": 25, "imported": 23}
+    assert job.started_at is not None and job.finished_at is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_job_keeps_error(session_local):
+    async def handler(db, params, progress):
+        raise RuntimeError("upstream down")
+
+    queue = JobQueue({"channel": handler}, session_factory=session_local)
+    await queue.start()
+    try:
+        job = await queue.submit("channel", {})
+        job = await wait_for_status(queue, job.id, FAILED)
+    finally:
+        await queue.drain(timeout=1)
+
+    assert job.error == "upstream down"
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_cancel(session_local):
+    running = []
+    peak = 0
+    release = asyncio.Event()
+    started = asyncio.Event()
+
+    async def handler(db, params, progress):
+        nonlocal peak
+        running.append(params["n"])
+        started.set()
+        peak = max(peak, len(running))
+        try:
+            await release.wait()
+        finally:
+            running.remove(params["n"])
+        return {}
+
+    queue = JobQueue({"playlist": handler}, concurrency=1, session_factory=session_local)
+    await queue.start()
+    try:
+        first = await queue.submit("playlist", {"n": 1})
+        second = await queue.submit("playlist", {"n": 2})
+        await asyncio.wait_for(started.wait(), 5)
+
+        # Вторая задача ждёт свободного воркера и отменяется из очереди
+        assert (await queue.cancel(second.id)).status == CANCELLED
+        # Выполняющаяся задача прерывается
+        assert (await queue.cancel(first.id)).status == CANCELLED
+        assert peak == 1
+    finally:
+        await queue.drain(timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_drain_requeues_interrupted_jobs(session_local):
+    calls = []
+    started = asyncio.Event()
+
+    async def handler(db, params, progress):
+        calls.append(params)
+        started.set()
+        if len(calls) == 1:
+            await asyncio.sleep(60)
+        return {"done": True}
+
+    queue = JobQueue({"channel": handler}, session_factory=session_local)
+    await queue.start()
+    job = await queue.submit("channel", {"id": "100"})
+    await asyncio.wait_for(started.wait(), 5)
+    await queue.drain(timeout=0.05)
+    assert (await queue.get(job.id)).status == QUEUED
+
+    # Следующий запуск процесса подхватывает задачу
+    restarted = JobQueue({"channel": handler}, session_factory=session_local)
+    await restarted.start()
+    try:
+        job = await wait_for_status(restarted, job.id, SUCCEEDED)
+    finally:
+        await restarted.drain(timeout=1)
+    assert job.result == {"done": True}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_duplicate_submits_attach_to_the_active_job(session_local):
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(db, params, progress):
+        calls.append(params)
+        await release.wait()
+        return {"done": True}
+
+    queue = JobQueue({"playlist": handler}, session_factory=session_local)
+    await queue.start()
+    try:
+        # Двойной клик: запросы приходят одновременно
+        jobs = await asyncio.gather(*(
+            queue.submit("playlist", {"limit": n}, resource_key="playlist:707635") for n in range(5)
+        ))
+        assert len({job.id for job in jobs}) == 1
+
+        other = await queue.submit("playlist", {"limit": 1}, resource_key="playlist:1")
+        assert other.id != jobs[0].id
+
+        release.set()
+        await wait_for_status(queue, jobs[0].id, SUCCEEDED)
+        # После завершения ресурс можно импортировать заново
+        again = await queue.submit("playlist", {"limit": 1}, resource_key="playlist:707635")
+        assert again.id != jobs[0].id
+        await wait_for_status(queue, again.id, SUCCEEDED)
+    finally:
+        await queue.drain(timeout=1)
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_returns_the_first_outcome(session_local):
+    calls = []
+
+    async def handler(db, params, progress):
+        calls.append(params)
+        return {"n": len(calls)}
+
+    queue = JobQueue({"channel": handler}, session_factory=session_local)
+    await queue.start()
+    try:
+        first = await queue.submit("channel", {"id": "100"}, resource_key="channel:100", idempotency_key="k1")
+        first = await wait_for_status(queue, first.id, SUCCEEDED)
+
+        retry = await queue.submit("channel", {"id": "100"}, resource_key="channel:100", idempotency_key="k1")
+        assert retry.id == first.id and retry.result == {"n": 1}
+
+        with pytest.raises(IdempotencyKeyReused):
+            await queue.submit("channel", {"id": "200"}, resource_key="channel:200", idempotency_key="k1")
+    finally:
+        await queue.drain(timeout=1)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_start_requeues_only_jobs_with_expired_heartbeat(session_local):
+    now = datetime.now(timezone.utc)
+    async with session_local() as db:
+        db.add_all([
+            ImportJob(id="dead", kind="channel", status=RUNNING, params={}, worker_id="w1",
+                      heartbeat_at=now - timedelta(minutes=10)),
+            ImportJob(id="alive", kind="channel", status=RUNNING, params={}, worker_id="w2", heartbeat_at=now),
+        ])
+        await db.commit()
+
+    async def handler(db, params, progress):
+        return {"done": True}
+
+    queue = JobQueue({"channel": handler}, session_factory=session_local, heartbeat_timeout=60)
+    await queue.start()
+    try:
+        # Задача упавшего воркера выполняется заново, задачу живой реплики не трогаем
+        await wait_for_status(queue, "dead", SUCCEEDED)
+        alive = await queue.get("alive")
+        assert alive.status == RUNNING and alive.worker_id == "w2"
+    finally:
+        await queue.drain(timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_cancel_reaches_a_job_running_on_another_replica(session_local):
+    async def handler(db, params, progress):
+        await asyncio.sleep(60)
+        return {}
+
+    # Две реплики с общей БД: задачу выполняет одна, отменяют через другую
+    runner = JobQueue({"playlist": handler}, session_factory=session_local, heartbeat_interval=0.05)
+    other = JobQueue({"playlist": handler}, session_factory=session_local, poll_interval=60)
+    await runner.start()
+    try:
+        job = await runner.submit("playlist", {"n": 1})
+        job = await wait_for_status(runner, job.id, RUNNING)
+        assert job.worker_id == runner.worker_id
+
+        job = await other.cancel(job.id)
+        assert job.status == RUNNING and job.cancel_requested
+        job = await wait_for_status(runner, job.id, CANCELLED)
+        assert job.finished_at is not None
+    finally:
+        await runner.drain(timeout=1)
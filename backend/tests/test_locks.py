@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import locks
+from app.locks import ResourceLockTimeout, resource_lock
+
+
+class FakeConnection:
+    """Соединение PostgreSQL: ответы pg_try_advisory_lock по очереди, учёт открытых соединений."""
+
+    def __init__(self, pool, locked: bool):
+        self.pool = pool
+        self.locked = locked
+        self.closed = False
+        self.invalidated = False
+        pool.open += 1
+        pool.peak = max(pool.peak, pool.open)
+
+    async def scalar(self, statement, params):
+        self.pool.statements.append(str(statement))
+        return self.locked
+
+    async def execute(self, statement, params):
+        self.pool.statements.append(str(statement))
+        if self.pool.fail_unlock:
+            raise asyncio.CancelledError()
+
+    async def commit(self):
+        pass
+
+    async def invalidate(self):
+        self.invalidated = True
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.pool.open -= 1
+
+
+class FakeLockEngine:
+    def __init__(self, answers, fail_unlock=False):
+        self.answers = list(answers)
+        self.fail_unlock = fail_unlock
+        self.connections = []
+        self.statements = []
+        self.open = 0
+        self.peak = 0
+
+    async def connect(self):
+        conn = FakeConnection(self, self.answers.pop(0))
+        self.connections.append(conn)
+        return conn
+
+
+@pytest.fixture()
+def postgres(monkeypatch):
+    monkeypatch.setattr(locks, "RESOURCE_LOCK_POLL_INTERVAL", 0)
+
+    def use(lock_engine):
+        monkeypatch.setattr(locks, "_lock_engine", lambda engine: lock_engine)
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+    return use
+
+
+@pytest.mark.asyncio
+async def test_local_lock_times_out():
+    engine = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"))
+    async with resource_lock(engine, "playlist:1"):
+        with pytest.raises(ResourceLockTimeout):
+            async with resource_lock(engine, "playlist:1", timeout=0.05):
+                pass
+    # После освобождения блокировка снова доступна
+    async with resource_lock(engine, "playlist:1", timeout=0.05):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_advisory_lock_retries_without_holding_a_connection(postgres):
+    lock_engine = FakeLockEngine([False, False, True])
+    async with resource_lock(postgres(lock_engine), "channel:100"):
+        # Занятая блокировка: соединение каждой неудачной попытки сразу закрывается
+        assert [c.closed for c in lock_engine.connections] == [True, True, False]
+        assert lock_engine.open == 1
+    assert lock_engine.peak == 1 and lock_engine.open == 0
+    assert "pg_try_advisory_lock" in lock_engine.statements[0]
+    assert "pg_advisory_unlock" in lock_engine.statements[-1]
+
+
+@pytest.mark.asyncio
+async def test_advisory_lock_gives_up_after_timeout(postgres):
+    lock_engine = FakeLockEngine([False] * 1000)
+    with pytest.raises(ResourceLockTimeout):
+        async with resource_lock(postgres(lock_engine), "channel:100", timeout=0):
+            pass
+    assert lock_engine.open == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_unlock_invalidates_the_connection(postgres):
+    lock_engine = FakeLockEngine([True], fail_unlock=True)
+    with pytest.raises(asyncio.CancelledError):
+        async with resource_lock(postgres(lock_engine), "channel:100"):
+            pass
+    # Соединение с возможно не снятой блокировкой не возвращается к переиспользованию
+    conn = lock_engine.connections[0]
+    assert conn.invalidated and conn.closed
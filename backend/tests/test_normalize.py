@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app import normalize
+from app.normalize import (
+    format_duration, normalize_datetimes, normalize_durations, normalize_views, normalize_years, parse_datetime,
+    parse_views, parse_year,
+)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (1234, 1234),
+    (-5, 0),
+    (None, 0),
+    ("", 0),
+    ("345 просмотров", 345),
+    ("12 345 просмотров", 12345),
+    ("12 345 views", 12345),
+    ("1,234", 1234),
+    ("1.234.567", 1234567),
+    ("1,2 тыс. просмотров", 1200),
+    ("15 тыс.", 15000),
+    ("1.5K", 1500),
+    ("2,5 млн", 2500000),
+    ("2.5M views", 2500000),
+    ("1 млрд", 1000000000),
+    ("нет данных", 0),
+])
+def test_parse_views(value, expected):
+    assert parse_views(value) == expected
+
+
+def test_parse_year():
+    assert parse_year("2023-05-01T10:00:00Z") == 2023
+    assert parse_year("01.02.2019") == 2019
+    assert parse_year("2024-01-01 10:00:00") == 2024
+    assert parse_year(datetime(2021, 3, 4)) == 2021
+    assert parse_year("3 дня назад", default=2000) == 2000
+    assert parse_year(None) == datetime.now().year
+
+
+def test_parse_datetime():
+    assert parse_datetime("2023-05-01T10:00:00Z") == datetime(2023, 5, 1, 10, tzinfo=timezone.utc)
+    assert parse_datetime("") is None
+    assert parse_datetime("вчера") is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    (0, "00:00:00"),
+    (None, "00:00:00"),
+    (75, "00:01:15"),
+    (3725, "01:02:05"),
+    ("3725", "01:02:05"),
+    ("12:34", "00:12:34"),
+    ("1:02:03", "01:02:03"),
+    ("live", "00:00:00"),
+])
+def test_format_duration(value, expected):
+    assert format_duration(value) == expected
+
+
+def test_batch_matches_scalar():
+    views = ["1,2 тыс.", 345, None, "1,2 тыс.", "2.5M"]
+    dates = ["2023-05-01T10:00:00Z", "", "2023-05-01T10:00:00Z", "01.02.2019"]
+    durations = [75, "12:34", None, "12:34"]
+
+    assert normalize_views(views) == [parse_views(v) for v in views]
+    assert normalize_years(dates, default=2000) == [parse_year(d, 2000) for d in dates]
+    assert normalize_datetimes(iter(dates)) == [parse_datetime(d) for d in dates]
+    assert normalize_durations(durations) == [format_duration(d) for d in durations]
+
+
+def test_int_columns_take_numpy_path(monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(normalize, "NUMPY_MIN_BATCH", 4)
+    seconds = [0, 59, 3600, 3725, -1, 90061]
+
+    assert normalize_views(seconds) == [parse_views(s) for s in seconds]
+    assert normalize_durations(seconds) == [format_duration(s) for s in seconds]
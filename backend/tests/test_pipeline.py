@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.pipeline import stream_to_writer
+
+
+async def numbered_pages(count: int, size: int, fetched: list, fail_at: int | None = None):
+    for page in range(count):
+        if page == fail_at:
+            raise RuntimeError("fetch failed")
+        fetched.append(page)
+        await asyncio.sleep(0)
+        yield list(range(page * size, (page + 1) * size))
+
+
+@pytest.mark.asyncio
+async def test_writes_all_items_in_batches():
+    fetched, written = [], []
+
+    async def write(batch):
+        written.append(list(batch))
+        return len(batch)
+
+    results = await stream_to_writer(numbered_pages(5, 3, fetched), write, batch_size=4)
+
+    assert [item for batch in written for item in batch] == list(range(15))
+    assert all(len(batch) >= 4 for batch in written[:-1])
+    assert sum(results) == 15
+
+
+@pytest.mark.asyncio
+async def test_bounded_queue_applies_backpressure():
+    fetched = []
+    ahead = []
+
+    async def write(batch):
+        # Пока пишется батч, загрузка может уйти вперёд только на размер очереди
+        await asyncio.sleep(0.01)
+        ahead.append(len(fetched) - (batch[-1] + 1))
+        return len(batch)
+
+    await stream_to_writer(numbered_pages(10, 1, fetched), write, queue_size=2, batch_size=1)
+
+    assert len(fetched) == 10
+    assert max(ahead) <= 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_error_is_raised_after_earlier_batches_are_written():
+    fetched, written = [], []
+
+    async def write(batch):
+        written.extend(batch)
+        return len(batch)
+
+    with pytest.raises(RuntimeError, match="fetch failed"):
+        await stream_to_writer(numbered_pages(5, 2, fetched, fail_at=3), write, batch_size=2)
+
+    assert written == list(range(6))
+
+
+@pytest.mark.asyncio
+async def test_write_error_stops_fetching():
+    fetched = []
+
+    async def write(batch):
+        raise ValueError("db down")
+
+    with pytest.raises(ValueError, match="db down"):
+        await stream_to_writer(numbered_pages(100, 1, fetched), write, queue_size=1, batch_size=1)
+
+    assert len(fetched) < 10
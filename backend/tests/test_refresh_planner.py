@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestServer
+
+from app.models import Channel, Movie, Playlist, PlaylistMovie
+from app.rate_limiter import HostRateLimiters
+from app.refresh_planner import (
+    REFRESH_MAX_INTERVAL_HOURS, REFRESH_MIN_INTERVAL_HOURS, RefreshPlanner, RefreshTarget, RequestBudget,
+    load_refresh_targets, plan_refreshes, refresh_interval,
+)
+from app.rutube_client import RutubeClient
+from app.sync_state import CHANNEL, PLAYLIST, get_sync_state
+from tests.test_rutube_import import build_api
+
+NOW = datetime(2024, 5, 31, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture()
+async def client():
+    server = TestServer(build_api())
+    await server.start_server()
+    limiters = HostRateLimiters(rate=1000, burst=1000)
+    async with RutubeClient(str(server.make_url("/api")), rate_limiters=limiters) as c:
+        yield c
+    await server.close()
+
+
+def test_refresh_interval_follows_upload_rate_and_popularity():
+    hot = refresh_interval(uploads_per_day=4, views=0)
+    daily = refresh_interval(uploads_per_day=1, views=0)
+    dormant = refresh_interval(uploads_per_day=0, views=0)
+    assert hot < daily < dormant
+    assert dormant == timedelta(hours=REFRESH_MAX_INTERVAL_HOURS)
+    assert refresh_interval(uploads_per_day=1, views=1_000_000) < daily
+    assert refresh_interval(uploads_per_day=1000, views=10**9) == timedelta(hours=REFRESH_MIN_INTERVAL_HOURS)
+
+
+def test_plan_orders_by_overdue_and_respects_budget():
+    daily = RefreshTarget(CHANNEL, "daily", uploads_per_day=1, last_synced_at=NOW - timedelta(days=2))
+    fresh = RefreshTarget(CHANNEL, "fresh", uploads_per_day=1, last_synced_at=NOW - timedelta(hours=1))
+    new = RefreshTarget(PLAYLIST, "new")
+    dormant = RefreshTarget(PLAYLIST, "dormant", last_synced_at=NOW - timedelta(days=30))
+
+    planned = plan_refreshes([daily, fresh, new, dormant], NOW, budget=100)
+    assert [t.rutube_id for t in planned] == ["dormant", "daily", "new"]
+
+    # Плейлист проходится целиком (5 страниц), канал — одна страница и описание
+    assert (dormant.estimated_requests(NOW), daily.estimated_requests(NOW)) == (5, 2)
+    # Никогда не синхронизированный плейлист дороже оставшегося бюджета и пропускается
+    planned = plan_refreshes([daily, fresh, new, dormant], NOW, budget=7)
+    assert [t.rutube_id for t in planned] == ["dormant", "daily"]
+
+
+@pytest.mark.asyncio
+async def test_request_budget_window(session_local):
+    budget = RequestBudget(per_hour=10, session_factory=session_local)
+    await budget.spend(7, now=NOW - timedelta(minutes=10))
+    await budget.spend(4, now=NOW + timedelta(minutes=20))
+    await budget.spend(3, now=NOW + timedelta(minutes=40))
+    assert await budget.remaining(NOW + timedelta(minutes=50)) == 3
+
+    # Счётчик в БД: другой экземпляр (другая реплика) видит ту же трату
+    other = RequestBudget(per_hour=10, session_factory=session_local)
+    assert await other.remaining(NOW + timedelta(minutes=59)) == 3
+    assert await other.remaining(NOW + timedelta(minutes=60)) == 10
+
+
+@pytest.mark.asyncio
+async def test_load_refresh_targets_measures_uploads_and_views(session_local):
+    async with session_local() as db:
+        channel = Channel(rutube_id="100", title="c")
+        quiet = Channel(rutube_id="200", title="q")
+        hidden = Channel(rutube_id="300", title="h", is_active=False)
+        playlist = Playlist(rutube_id="501", title="p")
+        db.add_all([channel, quiet, hidden, playlist])
+        await db.flush()
+        movies = [
+            Movie(title=f"m{i}", views=100, channel_id=channel.id, rutube_video_id=f"m{i}",
+                  channel_added_at=NOW - timedelta(days=days))
+            for i, days in enumerate([1, 5, 20, 90])
+        ]
+        db.add_all(movies)
+        await db.flush()
+        db.add(PlaylistMovie(playlist_id=playlist.id, movie_id=movies[0].id))
+        await db.commit()
+
+        targets = {(t.resource_type, t.rutube_id): t for t in await load_refresh_targets(db, NOW)}
+
+    assert set(targets) == {(CHANNEL, "100"), (CHANNEL, "200"), (PLAYLIST, "501")}
+    assert targets[(CHANNEL, "100")].uploads_per_day == pytest.approx(3 / 30)
+    assert targets[(CHANNEL, "100")].views == 400
+    assert targets[(CHANNEL, "200")].uploads_per_day == 0
+    assert targets[(PLAYLIST, "501")].views == 100
+    assert all(t.last_synced_at is None for t in targets.values())
+
+
+@pytest.mark.asyncio
+async def test_planner_refreshes_due_resources_within_budget(session_local, client):
+    async with session_local() as db:
+        db.add_all([Channel(rutube_id="100", title="c"), Playlist(rutube_id="501", title="p")])
+        await db.commit()
+
+    starved = RefreshPlanner(client, session_local, requests_per_hour=2)
+    assert await starved.plan() == []
+
+    planner = RefreshPlanner(client, session_local, requests_per_hour=100)
+    summary = await planner.run()
+    assert summary["refreshed"] == 2 and summary["failed"] == 0
+    assert 0 < summary["requests"] <= 100
+    assert await planner.budget.remaining() == 100 - summary["requests"]
+
+    async with session_local() as db:
+        assert (await get_sync_state(db, CHANNEL, "100")).last_synced_at is not None
+        assert (await get_sync_state(db, PLAYLIST, "501")).last_synced_at is not None
+
+    # Только что обновлённые ресурсы ждут своего интервала
+    assert await planner.plan() == []
@@ -0,0 +1,31 @@
+from app.resolution_cache import BloomFilter, LRUCache, ResolutionCache
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    lru.put("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"video-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}" in bloom for i in range(1000))
+    assert false_positives < 50
+
+
+def test_definitely_new_requires_warm_cache():
+    cache = ResolutionCache(maxsize=10)
+    assert not cache.definitely_new("abc")
+    cache.warmed = True
+    assert cache.definitely_new("abc")
+    cache.remember_video("abc", 1)
+    assert not cache.definitely_new("abc")
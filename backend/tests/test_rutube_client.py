@@ -0,0 +1,85 @@
+import pytest
+from aiohttp import web
+
+from app import rutube_client
+from app.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from app.rutube_client import RutubeAPIError
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Без реальных пауз между повторами
+    monkeypatch.setattr(rutube_client, "backoff_delay", lambda attempt, retry_after=None: 0)
+
+
+@pytest.mark.asyncio
+async def test_get_json_retries_after_429(start_server, make_client):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.path)
+        if len(calls) == 1:
+            return web.json_response({}, status=429, headers={"Retry-After": "0"})
+        return web.json_response({"results": [1, 2]})
+
+    server = await start_server(handler)
+    async with make_client(server) as client:
+        status, data = await client.get_json("/video/person/1/")
+        stats = client.stats()
+
+    assert status == 200
+    assert data == {"results": [1, 2]}
+    assert len(calls) == 2
+    host_stats = next(iter(stats["hosts"].values()))
+    assert host_stats["throttle_events"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_json_raises_after_retries_exhausted(start_server, make_client):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.path)
+        return web.json_response({}, status=503)
+
+    server = await start_server(handler)
+    async with make_client(server, max_retries=2) as client:
+        with pytest.raises(RutubeAPIError) as exc_info:
+            await client.get_json("/person/1/")
+
+    assert exc_info.value.status == 503
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_json_does_not_retry_404(start_server, make_client):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.path)
+        return web.json_response({}, status=404)
+
+    server = await start_server(handler)
+    async with make_client(server) as client:
+        status, data = await client.get_json("/person/1/")
+
+    assert (status, data) == (404, None)
+    assert len(calls) == 1
+
+
+def test_limiter_aimd():
+    limiter = AdaptiveRateLimiter(rate=4, min_rate=1, max_rate=5, increase_step=0.5, decrease_factor=0.5)
+    limiter.on_success()
+    assert limiter.rate == 4.5
+    limiter.on_throttle()
+    assert limiter.rate == 2.25
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
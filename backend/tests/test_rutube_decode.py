@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from app import rutube_decode
+from app.rutube_decode import decode_json, loads, playlist_record, video_record
+
+ITEM = {
+    "id": "abc123",
+    "title": "Урок 1",
+    "thumbnail_url": "https://pic.rutube.ru/abc123.jpg",
+    "hits": 0,
+    "duration": 125,
+    "description": None,
+    "created_ts": "2024-05-01T10:00:00",
+    "category": {"id": 3, "name": "Обучение"},
+    "person": {},
+    "author": {"id": 100, "name": "Канал", "avatar_url": "https://pic.rutube.ru/a.jpg"},
+    "unused": {"deep": list(range(50))},
+}
+
+
+def test_video_record_extracts_only_spec_fields():
+    assert video_record(ITEM) == {
+        "url": "https://rutube.ru/video/abc123/",
+        "title": "Урок 1",
+        "thumbnail_url": "https://pic.rutube.ru/abc123.jpg",
+        "views": 0,
+        "duration": 125,
+        "description": "",
+        "publication_date": "2024-05-01T10:00:00",
+        "category": "Обучение",
+    }
+
+
+def test_playlist_video_falls_back_from_person_to_author():
+    record = video_record(ITEM, with_channel=True)
+    assert record["rutube_video_id"] == "abc123"
+    assert record["channel_data"] == {
+        "rutube_id": "100",
+        "title": "Канал",
+        "avatar_url": "https://pic.rutube.ru/a.jpg",
+    }
+
+
+def test_missing_nested_fields_use_defaults():
+    record = video_record({"id": "x", "category": None})
+    assert record["category"] == "Видео"
+    assert record["views"] == 0
+
+
+def test_playlist_record():
+    assert playlist_record({"rutube_id": 7, "title": "Курс"}) == {
+        "rutube_id": "7", "title": "Курс", "image_url": None, "description": None,
+    }
+    assert playlist_record({"id": 8})["title"] == "Playlist 8"
+    assert playlist_record({"name": "без id"}) is None
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_loads_with_and_without_orjson(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(rutube_decode, "orjson", None)
+    body = json.dumps({"results": [ITEM]}, ensure_ascii=False).encode()
+    assert loads(body) == {"results": [ITEM]}
+    assert loads(b"  ") is None
+
+
+@pytest.mark.asyncio
+async def test_large_bodies_are_decoded_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(rutube_decode, "JSON_OFFLOAD_BYTES", 10)
+    calls = []
+
+    async def to_thread(func, *args):
+        calls.append(func)
+        return func(*args)
+
+    monkeypatch.setattr(rutube_decode.asyncio, "to_thread", to_thread)
+    assert await decode_json(b'{"a": 1}') == {"a": 1}
+    assert await decode_json(b'{"results": [1, 2, 3]}') == {"results": [1, 2, 3]}
+    assert calls == [loads]
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.rate_limiter import HostRateLimiters
+from app.rutube_client import RutubeClient
+from app.rutube_html_scraper import find_video_lists, parse_channel_page, scrape_channel_html
+from benchmarks.rutube_stub import StubConfig, build_stub_app, make_video
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest_asyncio.fixture()
+async def site():
+    """Stub API plus channel pages served from the HTML fixtures."""
+    app = build_stub_app(StubConfig(videos_per_channel=30, playlists_per_channel=0))
+    pages = {"1000": "rutube_channel_state.html", "1001": "rutube_channel_cards.html"}
+
+    async def channel_page(request):
+        return web.Response(text=fixture(pages[request.match_info["cid"]]), content_type="text/html")
+
+    app.router.add_get("/channel/{cid}/", channel_page)
+    server = TestServer(app)
+    await server.start_server()
+    limiters = HostRateLimiters(rate=1000, burst=1000)
+    async with RutubeClient(str(server.make_url("/api")), rate_limiters=limiters) as client:
+        yield server, client
+    await server.close()
+
+
+def test_embedded_state_is_found_in_page():
+    states, cards = parse_channel_page(fixture("rutube_channel_state.html"))
+
+    # The `window.__CONFIG__` literal with `undefined` is not JSON and is skipped
+    assert len(states) == 1
+    lists = find_video_lists(states[0])
+    assert [len(page["results"]) for page in lists] == [5, 2]
+    assert lists[0]["next"].endswith("?page=2&page_size=5")
+    assert len(cards) == 5
+
+
+def test_cards_are_read_from_markup():
+    states, cards = parse_channel_page(fixture("rutube_channel_cards.html"))
+
+    assert states == []
+    assert cards == [
+        {'index': 0, 'url': "https://rutube.ru/video/0003e8aa/", 'title': "Первое видео",
+         'thumbnail_url': "https://pic.rutube.ru/video/1000/0.jpg", 'duration': "12:34",
+         'views': "1,2 тыс. просмотров"},
+        {'index': 1, 'url': "https://rutube.ru/video/0003e8bb/", 'title': "Второе видео",
+         'thumbnail_url': "https://pic.rutube.ru/video/1000/1.jpg", 'duration': "1:02:03",
+         'views': "345 просмотров"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_scrape_follows_continuations_from_embedded_state(site):
+    server, client = site
+    videos, cards = await scrape_channel_html(str(server.make_url("/channel/1000/")), 12, "1000", client=client)
+
+    assert cards == []
+    assert [v['url'] for v in videos] == [f"https://rutube.ru/video/{make_video(1000, n)['id']}/" for n in range(12)]
+    # Recommendations of other channels in the same state are dropped, values are exact
+    assert videos[7]['views'] == make_video(1000, 7)['hits']
+    assert videos[7]['publication_date'] == make_video(1000, 7)['created_ts']
+    assert server.app["stats"]["endpoints"]["/api/video/person/{cid}/"] == 2
+
+
+@pytest.mark.asyncio
+async def test_scrape_falls_back_to_markup_cards(site):
+    server, client = site
+    videos, cards = await scrape_channel_html(str(server.make_url("/channel/1001/")), 10, "1001", client=client)
+
+    assert videos == []
+    assert [c['url'] for c in cards] == ["https://rutube.ru/video/0003e8aa/", "https://rutube.ru/video/0003e8bb/"]
@@ -0,0 +1,285 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from sqlalchemy import func, select
+
+from app.checkpoints import get_checkpoint, save_checkpoint
+from app.models import Channel, ImportCheckpoint, Movie, Playlist, PlaylistMovie
+from app.pipeline import stream_to_writer
+from app.rate_limiter import HostRateLimiters
+from app.resolution_cache import resolution_cache
+from app.rutube_api_scraper import import_rutube_channel, import_rutube_playlist_videos
+from app.rutube_client import RutubeAPIError, RutubeClient
+from app.sync_state import CHANNEL, PLAYLIST, as_utc, get_sync_state
+
+CHANNEL_ID = "100"
+PLAYLISTS = {"501": 45, "502": 7, "503": 0}
+
+
+def make_video(video_id: str, channel_id: str = CHANNEL_ID, created_ts: str = "2024-05-01T10:00:00") -> dict:
+    return {
+        "id": video_id,
+        "title": f"Video {video_id}",
+        "thumbnail_url": f"https://pic.rutube.ru/{video_id}.jpg",
+        "hits": 10,
+        "duration": 125,
+        "description": "desc",
+        "created_ts": created_ts,
+        "category": {"name": "Обучение"},
+        "author": {"id": int(channel_id), "name": "Test channel", "avatar_url": None},
+    }
+
+
+def page_of(items: list, request) -> dict:
+    page = int(request.query.get("page", 1))
+    size = int(request.query.get("page_size", 20))
+    chunk = items[(page - 1) * size:page * size]
+    return {"results": chunk, "has_next": page * size < len(items), "per_page": size}
+
+
+def build_api() -> web.Application:
+    """Минимальная имитация Rutube API для импорта канала и плейлистов."""
+    channel_videos = [make_video(f"c{i}") for i in range(30)]
+    # Плейлисты частично пересекаются между собой
+    playlist_videos = {
+        pid: [make_video(f"p{i}") for i in range(count)] for pid, count in PLAYLISTS.items()
+    }
+
+    async def person(request):
+        return web.json_response({"id": int(CHANNEL_ID), "name": "Test channel", "description": "d"})
+
+    async def person_videos(request):
+        app["channel_pages"].append(int(request.query.get("page", 1)))
+        return web.json_response(page_of(channel_videos, request))
+
+    async def person_playlists(request):
+        items = [{"id": int(pid), "title": f"Playlist {pid}"} for pid in PLAYLISTS]
+        return web.json_response(page_of(items, request))
+
+    async def playlist(request):
+        page = int(request.query.get("page", 1))
+        app["playlist_pages"].append(page)
+        if page in app["fail_pages"]:
+            return web.json_response({}, status=500)
+        videos = playlist_videos.get(request.match_info["pid"])
+        if videos is None:
+            return web.json_response({}, status=404)
+        return web.json_response(page_of(videos, request))
+
+    app = web.Application()
+    app["channel_videos"] = channel_videos
+    app["channel_pages"] = []
+    app["playlist_videos"] = playlist_videos
+    app["playlist_pages"] = []
+    app["fail_pages"] = set()
+    app.router.add_get("/api/person/{cid}/", person)
+    app.router.add_get("/api/video/person/{cid}/", person_videos)
+    app.router.add_get("/api/playlist/person/{cid}/", person_playlists)
+    app.router.add_get("/api/video/playlist/{pid}/", playlist)
+    return app
+
+
+@pytest.fixture()
+def api_app():
+    return build_api()
+
+
+@pytest_asyncio.fixture()
+async def client(api_app):
+    server = TestServer(api_app)
+    await server.start_server()
+    limiters = HostRateLimiters(rate=1000, burst=1000)
+    async with RutubeClient(str(server.make_url("/api")), rate_limiters=limiters) as c:
+        yield c
+    await server.close()
+
+
+async def count(session, model) -> int:
+    return (await session.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_import_playlist(session_local, client):
+    async with session_local() as db:
+        result = await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client)
+        assert result["imported"] == 45
+        assert result["linked"] == 45
+
+        # Полная пересинхронизация обновляет, а не дублирует
+        again = await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client,
+                                                    full_resync=True)
+        assert again["sync_mode"] == "full"
+        assert again["imported"] == 0
+        assert again["updated"] == 45
+        assert again["linked"] == 0
+        assert await count(db, Movie) == 45
+        assert await count(db, Channel) == 1
+
+
+@pytest.mark.asyncio
+async def test_import_channel_with_playlists(session_local, client):
+    async with session_local() as db:
+        result = await import_rutube_channel(
+            db, f"https://rutube.ru/channel/{CHANNEL_ID}/", CHANNEL_ID,
+            channel_videos_limit=25, scan_playlists=True, per_playlist_limit=100, client=client,
+        )
+        assert result["imported_videos"] == 25
+        assert result["playlists_found"] == 3
+        assert result["playlists_imported"] == 3
+        assert result["playlists_failed"] == 0
+
+        assert await count(db, Channel) == 1
+        assert await count(db, Playlist) == 3
+        # 25 видео канала + 45 уникальных видео плейлистов
+        assert await count(db, Movie) == 70
+        assert await count(db, PlaylistMovie) == 45 + 7
+
+
+@pytest.mark.asyncio
+async def test_import_playlist_statement_count_is_constant(session_local, client):
+    from sqlalchemy import event
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async with session_local() as db:
+        sync_engine = db.get_bind()
+        event.listen(sync_engine, "before_cursor_execute", count_statement)
+        try:
+            await import_rutube_playlist_videos(db, "https://rutube.ru/plst/502/", "502", 100, client=client)
+            small = len(statements)
+            statements.clear()
+            await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client)
+            large = len(statements)
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", count_statement)
+
+    # Число запросов не зависит от количества видео в плейлисте
+    assert large <= small
+
+
+@pytest.mark.asyncio
+async def test_resolution_cache_skips_lookups(session_local, client):
+    async with session_local() as db:
+        await import_rutube_playlist_videos(db, "https://rutube.ru/plst/502/", "502", 100, client=client)
+        # Все видео нового плейлиста отсеяны фильтром Блума без запроса к БД
+        assert resolution_cache.skipped_lookups == 7
+
+        # Видео 501 частично совпадают с 502 и берутся из кэша
+        result = await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client)
+        assert result["imported"] == 38
+        assert result["updated"] == 7
+        assert resolution_cache.videos.hits >= 7
+
+        # Откат транзакции сбрасывает кэш
+        await db.execute(select(func.count()).select_from(Movie))
+        await db.rollback()
+        assert len(resolution_cache.videos) == 0
+
+
+@pytest.mark.asyncio
+async def test_incremental_channel_sync_stops_at_known_videos(session_local, client, api_app):
+    channel_url = f"https://rutube.ru/channel/{CHANNEL_ID}/"
+    async with session_local() as db:
+        await import_rutube_channel(db, channel_url, CHANNEL_ID, channel_videos_limit=100, scan_playlists=False,
+                                    client=client)
+        # В начало канала добавлены два новых видео
+        api_app["channel_videos"][:0] = [make_video(f"new{i}", created_ts="2024-06-01T10:00:00") for i in range(2)]
+        api_app["channel_pages"].clear()
+        # Процесс перезапущен: решение об остановке принимается по БД, а не по кэшу в памяти
+        resolution_cache.reset()
+
+        result = await import_rutube_channel(db, channel_url, CHANNEL_ID, channel_videos_limit=100,
+                                             scan_playlists=False, client=client)
+        assert result["imported_videos"] == 2
+        # Загрузка остановилась на первой странице
+        assert api_app["channel_pages"] == [1]
+        assert await count(db, Movie) == 32
+
+        state = await get_sync_state(db, CHANNEL, CHANNEL_ID)
+        assert as_utc(state.newest_item_at) == datetime(2024, 6, 1, 10, 0, tzinfo=timezone.utc)
+        assert state.last_new_items == 2
+
+
+@pytest.mark.asyncio
+async def test_playlist_sync_walks_the_whole_list(session_local, client, api_app):
+    async with session_local() as db:
+        await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client)
+
+        # Плейлист в порядке автора: новые видео добавлены в конец
+        api_app["playlist_videos"]["501"].extend(
+            make_video(f"new{i}", created_ts="2024-06-01T10:00:00") for i in range(2)
+        )
+        api_app["playlist_pages"].clear()
+        result = await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client)
+        assert result["sync_mode"] == "full"
+        assert result["imported"] == 2
+        assert result["linked"] == 2
+        # Дошли до последней страницы, где лежат новые видео
+        assert {1, 2, 3} <= set(api_app["playlist_pages"])
+        assert await count(db, Movie) == 47
+
+
+@pytest.mark.asyncio
+async def test_interrupted_import_resumes_from_checkpoint(session_local, client, api_app, monkeypatch):
+    # Коммит после каждой страницы, без повторов упавшего запроса
+    monkeypatch.setitem(stream_to_writer.__kwdefaults__, "batch_size", 20)
+    client.max_retries = 0
+    api_app["fail_pages"].add(3)
+
+    async with session_local() as db:
+        with pytest.raises(RutubeAPIError):
+            await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client)
+
+        # Первые две страницы записаны, курсор указывает на третью
+        assert await count(db, Movie) == 40
+        checkpoint = (await db.execute(select(ImportCheckpoint))).scalar_one()
+        assert (checkpoint.next_page, checkpoint.committed_items) == (3, 40)
+        assert await get_sync_state(db, PLAYLIST, "501") is None
+
+        api_app["fail_pages"].clear()
+        api_app["playlist_pages"].clear()
+        result = await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100, client=client)
+        assert result["resumed_from_page"] == 3
+        assert result["imported"] == 5
+        assert api_app["playlist_pages"] == [3]
+        assert await count(db, Movie) == 45
+        assert await count(db, PlaylistMovie) == 45
+        assert await count(db, ImportCheckpoint) == 0
+        assert (await get_sync_state(db, PLAYLIST, "501")).last_full_sync_at is not None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_imports_of_one_playlist_are_serialized(session_local, client):
+    # Например, задача импорта и плановое обновление одного плейлиста
+    async def run():
+        async with session_local() as db:
+            return await import_rutube_playlist_videos(db, "https://rutube.ru/plst/501/", "501", 100,
+                                                       client=client)
+
+    first, second = await asyncio.gather(run(), run())
+
+    assert sorted((first["imported"], second["imported"])) == [0, 45]
+    async with session_local() as db:
+        assert await count(db, Movie) == 45
+        assert await count(db, PlaylistMovie) == 45
+        assert await count(db, ImportCheckpoint) == 0
+
+
+@pytest.mark.asyncio
+async def test_save_checkpoint_overwrites_existing_row(session_local):
+    async with session_local() as db:
+        await save_checkpoint(db, PLAYLIST, "501", next_page=2, page_size=20, committed_items=20)
+        await db.commit()
+    async with session_local() as db:
+        await save_checkpoint(db, PLAYLIST, "501", next_page=3, page_size=20, committed_items=40)
+        await db.commit()
+        checkpoint = await get_checkpoint(db, PLAYLIST, "501", 20)
+        assert (checkpoint.next_page, checkpoint.committed_items) == (3, 40)
+        assert await count(db, ImportCheckpoint) == 1
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.rutube_paging import collect_pages, iter_pages
+
+
+def make_fetcher(total: int, page_size: int, with_count: bool = False, delay: float = 0.0):
+    """Фейковый постраничный API: возвращает страницы и запоминает запрошенные номера."""
+    requested = []
+
+    async def fetch_page(page: int):
+        requested.append(page)
+        if delay:
+            # Более ранние страницы отвечают дольше, чтобы проверить порядок сборки
+            await asyncio.sleep(delay / page)
+        start = (page - 1) * page_size
+        items = [{'id': i} for i in range(start, min(start + page_size, total))]
+        data = {'results': items, 'has_next': start + page_size < total, 'per_page': page_size}
+        if with_count:
+            data['count'] = total
+        return data
+
+    return fetch_page, requested
+
+
+@pytest.mark.asyncio
+async def test_collect_pages_keeps_order():
+    fetch_page, _ = make_fetcher(total=95, page_size=10, delay=0.01)
+    items = await collect_pages(fetch_page, page_size=10, concurrency=4)
+    assert [it['id'] for it in items] == list(range(95))
+
+
+@pytest.mark.asyncio
+async def test_collect_pages_stops_at_limit_without_overfetching():
+    fetch_page, requested = make_fetcher(total=1000, page_size=20, with_count=True)
+    items = await collect_pages(fetch_page, limit=45, page_size=20, concurrency=8)
+    assert [it['id'] for it in items] == list(range(45))
+    assert sorted(requested) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_collect_pages_uses_total_count():
+    fetch_page, requested = make_fetcher(total=50, page_size=20, with_count=True)
+    items = await collect_pages(fetch_page, page_size=20, concurrency=8)
+    assert len(items) == 50
+    assert sorted(requested) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_collect_pages_learns_capped_page_size():
+    # API отдаёт по 10 элементов, хотя запрошено 50
+    fetch_page, _ = make_fetcher(total=35, page_size=10)
+    items = await collect_pages(fetch_page, limit=30, page_size=50, concurrency=3)
+    assert [it['id'] for it in items] == list(range(30))
+
+
+@pytest.mark.asyncio
+async def test_iter_pages_empty_first_page():
+    async def fetch_page(page: int):
+        return None
+
+    pages = [page async for page in iter_pages(fetch_page)]
+    assert pages == []
+
+
+@pytest.mark.asyncio
+async def test_collect_pages_stops_at_known_item():
+    fetch_page, requested = make_fetcher(total=1000, page_size=20)
+    items = await collect_pages(fetch_page, page_size=20, concurrency=1, stop_when=lambda it: it['id'] == 25)
+    assert [it['id'] for it in items] == list(range(25))
+    assert requested == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_collect_pages_awaits_async_stop_predicate():
+    fetch_page, requested = make_fetcher(total=1000, page_size=20)
+
+    async def known(item):
+        await asyncio.sleep(0)
+        return item['id'] == 45
+
+    items = await collect_pages(fetch_page, page_size=20, concurrency=1, stop_when=known)
+    assert [it['id'] for it in items] == list(range(45))
+    assert requested == [1, 2, 3]
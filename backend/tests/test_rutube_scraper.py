@@ -0,0 +1,179 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app import rutube_api_scraper, rutube_scraper
+from app.models import Channel, Movie
+from app.rutube_scraper import (
+    EXTRACT_CARDS_JS, WAIT_FOR_NEW_CARDS_JS, capture_page, save_videos_to_db, scrape_page, scrape_video_cards,
+)
+from benchmarks.rutube_stub import make_video
+
+
+class FakeDriver:
+    """Answers the scraper's scripts; each scroll loads ``per_scroll`` more cards."""
+
+    def __init__(self, total: int, per_scroll: int):
+        self.total = total
+        self.per_scroll = per_scroll
+        self.loaded = per_scroll
+        self.extract_calls = []
+        self.scrolls = 0
+        self.waits = []
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute_async_script(self, script, previous, timeout_ms, idle_ms):
+        assert script == WAIT_FOR_NEW_CARDS_JS
+        self.waits.append(previous)
+        return {'count': self.loaded, 'reason': 'cards' if self.loaded > previous else 'idle'}
+
+    def get(self, url):
+        pass
+
+    def card(self, n: int) -> dict:
+        return {'index': n, 'url': f"https://rutube.ru/video/v{n:04d}/", 'title': f"Video {n}",
+                'thumbnail_url': None, 'duration': "1:00", 'views': "12"}
+
+    def execute_script(self, script, *args):
+        if script == EXTRACT_CARDS_JS:
+            _, _, seen, limit = args
+            self.extract_calls.append(len(seen))
+            # Cards repeat across nested containers, as the union of the card XPaths does
+            cards = [self.card(n) for n in range(self.loaded) for _ in range(2)]
+            new, urls = [], set(seen)
+            for card in cards:
+                if card['url'] not in urls and len(new) < limit:
+                    urls.add(card['url'])
+                    new.append(card)
+            return {'total': len(cards), 'cards': new}
+        if script.startswith("window.scrollTo"):
+            self.scrolls += 1
+            self.loaded = min(self.total, self.loaded + self.per_scroll)
+            return None
+        if script == "return document.readyState":
+            return "complete"
+        raise AssertionError(f"unexpected script {script!r}")
+
+
+def test_scrape_video_cards_maps_fields_and_skips_seen():
+    driver = FakeDriver(total=5, per_scroll=5)
+    videos = scrape_video_cards(driver, seen_urls=["https://rutube.ru/video/v0000/"], limit=10)
+
+    assert [v['video_id'] for v in videos] == ["v0001", "v0002", "v0003", "v0004"]
+    assert videos[0]['title'] == "Video 1" and videos[0]['views'] == "12"
+    assert driver.extract_calls == [1]
+
+
+def test_scrape_video_cards_survives_script_errors():
+    class BrokenDriver:
+        def execute_script(self, *args):
+            raise RuntimeError("javascript error")
+
+    assert scrape_video_cards(BrokenDriver()) == []
+
+
+def test_scrape_page_stops_scrolling_at_limit():
+    driver = FakeDriver(total=100, per_scroll=4)
+    videos = scrape_page(driver, "https://rutube.ru/channel/1/", scrape_limit=10)
+
+    urls = [v['url'] for v in videos]
+    assert len(urls) == len(set(urls)) == 10
+    assert urls == sorted(urls)
+    # 4 -> 8 -> 12 cards: two scrolls, and each extraction only asked for what was missing
+    assert driver.scrolls == 2
+    assert driver.extract_calls == [0, 4, 8]
+
+
+def test_scrape_page_stops_when_no_new_cards_appear():
+    driver = FakeDriver(total=6, per_scroll=4)
+    videos = scrape_page(driver, "https://rutube.ru/channel/1/", scrape_limit=50)
+
+    assert len(videos) == 6
+    assert driver.scrolls == 2
+    assert driver.waits == [0, 4, 6]
+
+
+def test_scrape_page_respects_max_scrolls():
+    driver = FakeDriver(total=100, per_scroll=4)
+    videos = scrape_page(driver, "https://rutube.ru/channel/1/", scrape_limit=50, max_scrolls=3)
+
+    assert len(videos) == 16
+    assert driver.scrolls == 3
+
+
+class FakeXhrDriver(FakeDriver):
+    """Channel 1000 page: the first screen is server-rendered, each scroll loads one API page."""
+
+    def __init__(self, total: int, per_scroll: int):
+        super().__init__(total, per_scroll)
+        self.bodies = {}
+        # Left in the pooled browser's log by a previous page
+        self.log = [self.response_events("stale", 900, 0, 3)]
+
+    def card(self, n: int) -> dict:
+        return {**super().card(n), 'url': f"https://rutube.ru/video/{make_video(1000, n)['id']}/"}
+
+    def response_events(self, request_id: str, channel_id: int, start: int, stop: int) -> list:
+        self.bodies[request_id] = {'results': [make_video(channel_id, n) for n in range(start, stop)]
+                                   + [make_video(2000, start)]}
+        url = f"https://rutube.ru/api/video/person/{channel_id}/?page={request_id}"
+        return [
+            {'message': json.dumps({'message': {'method': 'Network.responseReceived', 'params': {
+                'requestId': request_id,
+                'response': {'url': url, 'status': 200, 'mimeType': 'application/json'}}}})},
+            {'message': json.dumps({'message': {'method': 'Network.loadingFinished',
+                                                'params': {'requestId': request_id}}})},
+        ]
+
+    def get_log(self, kind):
+        assert kind == "performance"
+        entries = [entry for events in self.log for entry in events]
+        self.log = []
+        return entries
+
+    def execute_cdp_cmd(self, command, params):
+        assert command == "Network.getResponseBody"
+        return {'body': json.dumps(self.bodies[params['requestId']]), 'base64Encoded': False}
+
+    def execute_script(self, script, *args):
+        if script.startswith("window.scrollTo"):
+            start = self.loaded
+            result = super().execute_script(script, *args)
+            self.log.append(self.response_events(f"r{self.scrolls}", 1000, start, self.loaded))
+            return result
+        return super().execute_script(script, *args)
+
+
+def test_capture_page_takes_videos_from_page_requests():
+    driver = FakeXhrDriver(total=100, per_scroll=4)
+    api_videos, dom_videos = capture_page(driver, "https://rutube.ru/channel/1000/", scrape_limit=10,
+                                          channel_rutube_id="1000")
+
+    assert driver.scrolls == 2
+    # Scrolled-in videos come from the JSON, exactly as the API scraper would store them
+    assert [v['url'] for v in api_videos] == [driver.card(n)['url'] for n in range(4, 12)]
+    first = make_video(1000, 4)
+    assert api_videos[0]['views'] == first['hits'] and api_videos[0]['duration'] == first['duration']
+    assert api_videos[0]['publication_date'] == first['created_ts']
+    # Only the server-rendered first screen is read from the DOM; no stale or foreign videos
+    assert [v['url'] for v in dom_videos] == [driver.card(n)['url'] for n in range(2)]
+
+
+@pytest.mark.asyncio
+async def test_save_videos_without_channel_id_in_url_uses_configured_channel(session_local, monkeypatch):
+    monkeypatch.setattr(rutube_scraper, "AsyncSessionLocal", session_local)
+    monkeypatch.setattr(rutube_api_scraper, "CHANNEL_ID", "777")
+    videos = [{'url': f"https://rutube.ru/video/v{n}/", 'title': f"Video {n}", 'views': "12"} for n in range(3)]
+
+    # URL канала без числового ID: строки не должны уйти в БД с channel_id = NULL
+    counts = await save_videos_to_db(videos, channel_url="https://rutube.ru/u/somebody/")
+
+    assert counts['inserted'] == 3
+    async with session_local() as db:
+        channel = (await db.execute(select(Channel))).scalar_one()
+        assert channel.rutube_id == "777"
+        channel_ids = (await db.execute(select(Movie.channel_id))).scalars().all()
+        assert channel_ids == [channel.id] * 3
@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app import scheduler as scheduler_module
+from app.models import ScheduledRun
+from app.scheduler import CronSchedule, ScheduledJob, Scheduler
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("expression, after, expected", [
+    ("0 3 * * *", utc(2024, 5, 1, 2, 59), utc(2024, 5, 1, 3, 0)),
+    ("0 3 * * *", utc(2024, 5, 1, 3, 0), utc(2024, 5, 2, 3, 0)),
+    ("*/15 * * * *", utc(2024, 5, 1, 10, 7), utc(2024, 5, 1, 10, 15)),
+    ("30 4 1 * *", utc(2024, 5, 2, 0, 0), utc(2024, 6, 1, 4, 30)),
+    # Понедельник 6 мая 2024
+    ("0 9 * * 1", utc(2024, 5, 1, 0, 0), utc(2024, 5, 6, 9, 0)),
+    ("0 0 * * 7", utc(2024, 5, 1, 0, 0), utc(2024, 5, 5, 0, 0)),
+    ("0 0 29 2 *", utc(2024, 3, 1, 0, 0), utc(2028, 2, 29, 0, 0)),
+])
+def test_cron_next_after(expression, after, expected):
+    assert CronSchedule(expression).next_after(after) == expected
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "*/0 * * * *", "0 0 31 2 *"])
+def test_cron_rejects_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression).next_after(utc(2024, 1, 1))
+
+
+class MemoryLease:
+    """Аренда в памяти, общая для всех «реплик» в тесте."""
+    held: set = set()
+
+    def __init__(self, name, ttl):
+        self.name = name
+
+    async def acquire(self):
+        if self.name in self.held:
+            return False
+        self.held.add(self.name)
+        return True
+
+    async def release(self):
+        self.held.discard(self.name)
+
+
+@pytest.fixture(autouse=True)
+def free_leases():
+    MemoryLease.held = set()
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    current = {"now": utc(2024, 5, 1, 2, 0)}
+    monkeypatch.setattr(scheduler_module, "_now", lambda: current["now"])
+    return current
+
+
+def replica(job, session_local, clock) -> Scheduler:
+    scheduler = Scheduler([job], MemoryLease, session_factory=session_local, poll_interval=60)
+    scheduler._started_at = clock["now"]
+    return scheduler
+
+
+@pytest.mark.asyncio
+async def test_job_runs_once_across_replicas_and_restarts(session_local, clock):
+    runs = []
+
+    async def scrape():
+        runs.append(clock["now"])
+
+    job = ScheduledJob("scrape", CronSchedule("0 3 * * *"), scrape)
+    first, second = replica(job, session_local, clock), replica(job, session_local, clock)
+
+    # Старт приложения не запускает задачу сразу
+    assert await first.run_if_due(job) == 60
+    assert runs == []
+
+    clock["now"] = utc(2024, 5, 1, 3, 0, 30)
+    await first.run_if_due(job)
+    await second.run_if_due(job)
+    assert runs == [utc(2024, 5, 1, 3, 0, 30)]
+
+    # Перезапуск не повторяет уже выполненный запуск
+    clock["now"] = utc(2024, 5, 1, 3, 5)
+    restarted = replica(job, session_local, clock)
+    assert await restarted.run_if_due(job) > 0
+    assert len(runs) == 1
+
+    # Пропущенные за время простоя запуски выполняются один раз
+    clock["now"] = utc(2024, 5, 4, 10, 0)
+    await restarted.run_if_due(job)
+    await restarted.run_if_due(job)
+    assert len(runs) == 2
+
+    async with session_local() as db:
+        run = await db.get(ScheduledRun, "scrape")
+        assert run.last_status == "succeeded"
+
+
+@pytest.mark.asyncio
+async def test_held_lease_skips_run_and_failures_are_recorded(session_local, clock):
+    async def scrape():
+        raise RuntimeError("rutube down")
+
+    job = ScheduledJob("scrape", CronSchedule("0 3 * * *"), scrape)
+    scheduler = replica(job, session_local, clock)
+    clock["now"] = utc(2024, 5, 1, 3, 1)
+
+    MemoryLease.held.add("scrape")
+    assert await scheduler.run_if_due(job) == 60
+    MemoryLease.held.clear()
+
+    await scheduler.run_if_due(job)
+    async with session_local() as db:
+        run = await db.get(ScheduledRun, "scrape")
+        assert run.last_status == "failed"
+        assert run.last_error == "rutube down"
+    assert "scrape" not in MemoryLease.held
+
+
+def test_jitter_is_stable_for_one_due_time(clock):
+    job = ScheduledJob("scrape", CronSchedule("0 3 * * *"), None, jitter=600)
+    scheduler = Scheduler([job], MemoryLease)
+    due = utc(2024, 5, 1, 3, 0)
+    fire_at = scheduler._fire_at(job, due)
+    assert due <= fire_at <= utc(2024, 5, 1, 3, 10)
+    assert scheduler._fire_at(job, due) == fire_at
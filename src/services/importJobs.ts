@@ -0,0 +1,72 @@
+// Фоновые задачи импорта: POST /playlists/import и /channels/import возвращают задачу,
+// результат забирается опросом GET /jobs/{id}
+
+export type ImportJobStatus = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+
+export interface ImportJob<TResult = Record<string, any>> {
+  id: string
+  kind: 'playlist' | 'channel'
+  status: ImportJobStatus
+  params: Record<string, any>
+  progress: Record<string, number> | null
+  result: TResult | null
+  error: string | null
+  created_at: string | null
+  started_at: string | null
+  finished_at: string | null
+}
+
+const FINISHED: ImportJobStatus[] = ['succeeded', 'failed', 'cancelled']
+
+// Ставит импорт в очередь. Один Idempotency-Key на вызов: если ответ потерялся
+// из-за сетевой ошибки, повтор с тем же ключом вернёт ту же задачу, а не создаст вторую
+export const submitImportJob = async (path: string, params: URLSearchParams): Promise<ImportJob> => {
+  const init = { method: 'POST', headers: { 'Idempotency-Key': crypto.randomUUID() } }
+  const url = `${path}?${params.toString()}`
+  let response: Response
+  try {
+    response = await fetch(url, init)
+  } catch {
+    response = await fetch(url, init)
+  }
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}))
+    throw new Error(errorData.detail || `HTTP ${response.status}`)
+  }
+  return response.json()
+}
+
+export const getImportJob = async (jobId: string): Promise<ImportJob> => {
+  const response = await fetch(`/api/jobs/${jobId}`)
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+  return response.json()
+}
+
+export const cancelImportJob = async (jobId: string): Promise<ImportJob> => {
+  const response = await fetch(`/api/jobs/${jobId}/cancel`, { method: 'POST' })
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+  return response.json()
+}
+
+// Ждёт завершения задачи и возвращает её результат; ошибка задачи превращается в исключение
+export const waitForImportJob = async <TResult = Record<string, any>>(
+  job: ImportJob,
+  options?: { intervalMs?: number; onProgress?: (job: ImportJob) => void }
+): Promise<TResult> => {
+  const intervalMs = options?.intervalMs ?? 1000
+  let current = job
+  while (!FINISHED.includes(current.status)) {
+    options?.onProgress?.(current)
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+    current = await getImportJob(current.id)
+  }
+  options?.onProgress?.(current)
+  if (current.status !== 'succeeded') {
+    throw new Error(current.error || `Import ${current.status}`)
+  }
+  return current.result as TResult
+}
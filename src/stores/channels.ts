@@ -1,5 +1,6 @@
 import { defineStore } from 'pinia'
 import { ref } from 'vue'
+import { submitImportJob, waitForImportJob, type ImportJob } from '@/services/importJobs'
 
 export interface Channel {
   id: number
@@ -17,6 +18,7 @@ export const useChannelsStore = defineStore('channels', () => {
   const selectedChannelId = ref<number | null>(null)
   const loading = ref(false)
   const error = ref<string | null>(null)
+  const importJob = ref<ImportJob | null>(null)
 
   const fetchChannels = async () => {
     loading.value = true
@@ -49,12 +51,11 @@ export const useChannelsStore = defineStore('channels', () => {
       if (options?.scan_playlists !== undefined) params.set('scan_playlists', String(options.scan_playlists))
       if (options?.per_playlist_limit !== undefined) params.set('per_playlist_limit', String(options.per_playlist_limit))
 
-      const response = await fetch(`/api/channels/import?${params.toString()}`, { method: 'POST' })
-      if (!response.ok) {
-        const err = await response.json().catch(() => ({}))
-        throw new Error(err.detail || `HTTP ${response.status}`)
-      }
-      const result = await response.json()
+      const job = await submitImportJob('/api/channels/import', params)
+      // Импорт выполняется в фоне: ждём завершения задачи
+      const result = await waitForImportJob(job, {
+        onProgress: (job) => { importJob.value = job }
+      })
       await fetchChannels()
       return result
     } catch (err) {
@@ -71,6 +72,7 @@ export const useChannelsStore = defineStore('channels', () => {
     selectedChannelId,
     loading,
     error,
+    importJob,
     fetchChannels,
     selectChannel,
     importChannel
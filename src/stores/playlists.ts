@@ -1,5 +1,6 @@
 import { defineStore } from 'pinia'
 import { ref } from 'vue'
+import { submitImportJob, waitForImportJob, type ImportJob } from '@/services/importJobs'
 
 export interface Playlist {
   id: number
@@ -17,6 +18,7 @@ export const usePlaylistsStore = defineStore('playlists', () => {
   const selectedPlaylistId = ref<number | null>(null)
   const loading = ref(false)
   const error = ref<string | null>(null)
+  const importJob = ref<ImportJob | null>(null)
 
   const fetchPlaylists = async () => {
     loading.value = true
@@ -43,24 +45,16 @@ export const usePlaylistsStore = defineStore('playlists', () => {
     loading.value = true
     error.value = null
     try {
-      const response = await fetch('/api/playlists/import', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          rutube_playlist_url: url,
-          limit
-        })
+      const params = new URLSearchParams()
+      params.set('rutube_playlist_url', url)
+      params.set('limit', String(limit))
+      const job = await submitImportJob('/api/playlists/import', params)
+
+      // Импорт выполняется в фоне: ждём завершения задачи
+      const result = await waitForImportJob(job, {
+        onProgress: (job) => { importJob.value = job }
       })
       
-      if (!response.ok) {
-        const errorData = await response.json()
-        throw new Error(errorData.detail || 'Import failed')
-      }
-      
-      const result = await response.json()
-      
       // Refresh playlists after successful import
       await fetchPlaylists()
       
@@ -84,6 +78,7 @@ export const usePlaylistsStore = defineStore('playlists', () => {
     selectedPlaylistId,
     loading,
     error,
+    importJob,
     fetchPlaylists,
     selectPlaylist,
     importPlaylist